@@ -1,43 +1,20 @@
-import csv
 import random
+from app.catalog import ActionCatalog, Record, load_action_catalog
 
 class ActionManager:
-    def __init__(self, actions_file="data/actions.csv"):
-        self.actions = []
+    def __init__(self, actions_file="data/actions.csv", rng=None):
+        self.rng = rng if rng is not None else random  # random/choice/sampleを持つ乱数源
         self.cooldowns = {}  # アクションID: 残りクールダウン
         self.load_actions(actions_file)
 
     def load_actions(self, file_path):
-        """CSVファイルからアクションデータを読み込む"""
+        """アクションファイルのカタログを読み込む（同じファイルはプロセス内で共有）"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # 数値型の変換
-                    for field in ['cpu_effect', 'memory_effect', 'disk_effect',
-                                 'network_effect', 'service_effect', 'alert_effect',
-                                 'base_success_rate', 'cooldown']:
-                        if field in row and row[field]:
-                            try:
-                                if field == 'base_success_rate':
-                                    row[field] = float(row[field])
-                                else:
-                                    row[field] = int(row[field])
-                            except (ValueError, TypeError):
-                                if field == 'base_success_rate':
-                                    row[field] = 0.7
-                                else:
-                                    row[field] = 0
-
-                    # 失敗時の影響はデフォルトは未設定
-                    if 'failure_effects' not in row:
-                        row['failure_effects'] = {}
-
-                    self.actions.append(row)
+            self.catalog = load_action_catalog(file_path)
         except Exception as e:
             print(f"アクションデータの読み込みに失敗しました: {e}")
             # デフォルトのアクションを追加
-            self.actions = [{
+            self.catalog = ActionCatalog([Record({
                 "id": "A001",
                 "name": "サーバ再起動",
                 "category": "システム操作",
@@ -51,7 +28,7 @@ class ActionManager:
                 "base_success_rate": 0.8,
                 "cooldown": 2,
                 "skill_tag": "運用/Linux"
-            }, {
+            }), Record({
                 "id": "A002",
                 "name": "ログローテーション実行",
                 "category": "メンテナンス",
@@ -65,14 +42,20 @@ class ActionManager:
                 "base_success_rate": 0.95,
                 "cooldown": 1,
                 "skill_tag": "運用/ログ管理"
-            }]
+            })])
+        self.actions = self.catalog.actions.records
 
     def get_action_by_id(self, action_id):
         """IDによるアクションの取得"""
-        for action in self.actions:
-            if action['id'] == action_id:
-                return action
-        return None
+        return self.catalog.actions.get(action_id)
+
+    def get_actions_by_category(self, category):
+        """カテゴリによるアクションの取得"""
+        return list(self.catalog.actions.find("category", category))
+
+    def get_actions_by_skill_tag(self, skill_tag):
+        """スキルタグによるアクションの取得"""
+        return list(self.catalog.actions.find("skill_tag", skill_tag))
 
     def get_available_actions(self, max_actions=5):
         """現在選択可能なアクションのリストを取得"""
@@ -88,7 +71,7 @@ class ActionManager:
 
         # ランダム選択（実際の実装では全て選べるようにするか、状況に応じて選びやすくする）
         if len(available) > max_actions:
-            return random.sample(available, max_actions)
+            return self.rng.sample(available, max_actions)
         return available
 
     def set_cooldown(self, action_id, cooldown_turns):
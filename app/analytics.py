@@ -0,0 +1,487 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from app.columnar_log import COLUMNAR_SUFFIX, RAW_LINE, ColumnarLog
+from app.history import ACTION
+from app.log_segments import INDEX_FILE, SegmentStore, segment_dir_for
+from app.probability import CPU_LEVELS, rate_bucket, rate_buckets
+from app.state import STATE_FIELDS, SystemState, SystemStateBatch
+
+INDEX_VERSION = 1
+# 予測成功率の区間数（0.1刻み）
+CALIBRATION_BINS = 10
+# エピソードの終わり方
+CRITICAL, COMPLETED, ABANDONED = "critical", "completed", "abandoned"
+# 列指向のログからエピソードの集計のために読む項目（アクションの集計は列のまま行う）
+EPISODE_FIELDS = ("scenario_id", "turn", "state_after", "state")
+
+
+def episode_score(state, turn):
+    """InfraRiskSimulator.calculate_scoreと同じ式でスコアを計算"""
+    stability_bonus = 50 if state["cpu"] < 60 and state["memory"] < 60 else 0
+    speed_bonus = max(0, (10 - turn) * 30)
+    return state["services"] * 100 + stability_bonus + speed_bonus - state["sla_risk"] * 5
+
+
+def bucket_label(bucket):
+    """成功率補正のバケット番号を読める形に変換"""
+    labels = [("cpu=通常", "cpu>80", "cpu<40")[bucket % CPU_LEVELS]]
+    for divisor, label in ((3, "memory>85"), (6, "disk>90"), (12, "services<3"), (24, "alerts>7")):
+        if bucket // divisor % 2:
+            labels.append(label)
+    return ", ".join(labels)
+
+
+def _to_state(values):
+    """状態の辞書をSystemStateに変換（項目が欠けていればNone）"""
+    state = SystemState()
+    try:
+        for field in STATE_FIELDS:
+            setattr(state, field, values[field])
+    except (KeyError, TypeError):
+        return None
+    return state
+
+
+def _add(counts, key, amount=1):
+    counts[key] = counts.get(key, 0) + amount
+
+
+def _percentile(counts, q):
+    """{値: 度数} の分布のパーセンタイル（最近傍順位）"""
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank = max(1, -(-total * q // 100))
+    running = 0
+    for value in sorted(counts):
+        running += counts[value]
+        if running >= rank:
+            return value
+
+
+class LogAggregates:
+    """セッションログの集計値
+
+    値ごとの度数で持つため、ログの量によらず大きさは一定（アクション数・シナリオ数・スコアの値域程度）。
+    ファイルごとの部分集計はmergeで足し合わせられる。
+    """
+
+    def __init__(self):
+        self.lines = 0  # 読み込んだ行数
+        self.bad_lines = 0  # JSONとして読めなかった行数
+        self.actions = {}  # アクションID: [試行, 成功, 予測成功率の合計]
+        self.calibration = {}  # 予測成功率の区間: [試行, 成功, 予測成功率の合計]
+        self.choices = {}  # 実行前の状態のバケット: {アクションID: 回数}
+        self.outcomes = {}  # シナリオID: {終わり方: 回数}
+        self.scores = {}  # シナリオID: {スコア: 回数}
+        self.turns = {}  # シナリオID: {生存ターン数: 回数}
+
+    def add_action(self, action_id, success, success_rate, bucket):
+        stats = self.actions.setdefault(action_id, [0, 0, 0.0])
+        calibration = self.calibration.setdefault(
+            min(int(success_rate * CALIBRATION_BINS), CALIBRATION_BINS - 1), [0, 0, 0.0])
+        for row in (stats, calibration):
+            row[0] += 1
+            row[1] += bool(success)
+            row[2] += success_rate
+        if bucket is not None:
+            _add(self.choices.setdefault(bucket, {}), action_id)
+
+    def add_episode(self, scenario_id, outcome, turns, score):
+        _add(self.outcomes.setdefault(scenario_id, {}), outcome)
+        _add(self.turns.setdefault(scenario_id, {}), turns)
+        if score is not None:
+            _add(self.scores.setdefault(scenario_id, {}), score)
+
+    def merge(self, other):
+        """別の集計値を足し合わせる"""
+        self.lines += other.lines
+        self.bad_lines += other.bad_lines
+        for mine, theirs in ((self.actions, other.actions),
+                             (self.calibration, other.calibration)):
+            for key, row in theirs.items():
+                total = mine.setdefault(key, [0, 0, 0.0])
+                for i, value in enumerate(row):
+                    total[i] += value
+        for mine, theirs in ((self.choices, other.choices), (self.outcomes, other.outcomes),
+                             (self.scores, other.scores), (self.turns, other.turns)):
+            for key, counts in theirs.items():
+                total = mine.setdefault(key, {})
+                for value, count in counts.items():
+                    _add(total, value, count)
+        return self
+
+    def to_dict(self):
+        """JSONに変換できる辞書（キーは文字列）"""
+        def nested(table):
+            return {str(key): {str(k): v for k, v in counts.items()} for key, counts in table.items()}
+        return {
+            "lines": self.lines,
+            "bad_lines": self.bad_lines,
+            "actions": self.actions,
+            "calibration": {str(key): row for key, row in self.calibration.items()},
+            "choices": nested(self.choices),
+            "outcomes": nested(self.outcomes),
+            "scores": nested(self.scores),
+            "turns": nested(self.turns),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        def nested(table, key_type, value_type):
+            return {key_type(key): {value_type(k): v for k, v in counts.items()}
+                    for key, counts in table.items()}
+        aggregates = cls()
+        aggregates.lines = data["lines"]
+        aggregates.bad_lines = data["bad_lines"]
+        aggregates.actions = {key: list(row) for key, row in data["actions"].items()}
+        aggregates.calibration = {int(key): list(row) for key, row in data["calibration"].items()}
+        aggregates.choices = nested(data["choices"], int, str)
+        aggregates.outcomes = nested(data["outcomes"], str, str)
+        aggregates.scores = nested(data["scores"], str, int)
+        aggregates.turns = nested(data["turns"], str, int)
+        return aggregates
+
+    def summary(self):
+        """集計結果（実績成功率と予測の差、シナリオごとの分布、状態別の選択頻度）"""
+        actions = {}
+        for action_id, (attempts, successes, predicted) in sorted(self.actions.items()):
+            actions[action_id] = {
+                "attempts": attempts,
+                "successes": successes,
+                "success_rate": successes / attempts,
+                "predicted_rate": predicted / attempts,
+                "difference": (successes - predicted) / attempts,
+            }
+
+        calibration = [
+            {"range": [key / CALIBRATION_BINS, (key + 1) / CALIBRATION_BINS],
+             "attempts": attempts, "success_rate": successes / attempts,
+             "predicted_rate": predicted / attempts}
+            for key, (attempts, successes, predicted) in sorted(self.calibration.items())
+        ]
+
+        scenarios = {}
+        for scenario_id in sorted(self.outcomes):
+            scores = self.scores.get(scenario_id, {})
+            turns = self.turns.get(scenario_id, {})
+            scored = sum(scores.values())
+            scenarios[scenario_id] = {
+                "episodes": sum(self.outcomes[scenario_id].values()),
+                "outcomes": dict(sorted(self.outcomes[scenario_id].items())),
+                "score_mean": sum(s * n for s, n in scores.items()) / scored if scored else None,
+                "score_percentiles": {f"p{q}": _percentile(scores, q) for q in (10, 50, 90)},
+                "score_histogram": dict(sorted(scores.items())),
+                "turns_histogram": dict(sorted(turns.items())),
+            }
+
+        choices = {}
+        for bucket, counts in sorted(self.choices.items()):
+            total = sum(counts.values())
+            choices[bucket] = {
+                "label": bucket_label(bucket),
+                "actions": {action_id: {"count": count, "share": count / total}
+                            for action_id, count in sorted(counts.items(),
+                                                           key=lambda item: -item[1])},
+            }
+
+        return {
+            "lines": self.lines,
+            "bad_lines": self.bad_lines,
+            "actions": actions,
+            "calibration": calibration,
+            "scenarios": scenarios,
+            "choices": choices,
+        }
+
+
+class _EpisodeTracker:
+    """1ファイル分のログを先頭から順に読み、エピソード単位の集計を行う
+
+    エピソードはscenario_startから始まり、危機的状態・最終ターンのアクション・
+    次のscenario_startで終わる。ファイル末尾で終わっていないエピソードはopenとして残し、
+    続きのログを読むときに引き継ぐ。
+    """
+
+    def __init__(self, aggregates, max_turns, episode=None):
+        self.aggregates = aggregates
+        self.max_turns = max_turns
+        self.episode = episode  # {"scenario_id", "turn", "state", "critical"}
+
+    def feed(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        self.feed_entry(entry)
+
+    def feed_entry(self, entry, count_action=True):
+        """1行分の辞書を集計する（読めなかった行はNone）
+
+        count_action: Falseならアクションの成功率・選択頻度は集計しない（別にまとめて集計する場合）
+        """
+        self.aggregates.lines += 1
+        if not isinstance(entry, dict):
+            self.aggregates.bad_lines += 1
+            return
+        kind = entry.get("type")
+
+        if kind == "scenario_start":
+            self.close()
+            self.episode = {"scenario_id": str(entry.get("scenario_id")), "turn": 0,
+                            "state": None, "critical": False}
+            return
+        if kind == "action" and count_action:
+            self._action(entry)
+        episode = self.episode
+        if episode is None or kind not in ("event", "action", "critical_state"):
+            return
+
+        episode["turn"] = max(episode["turn"], entry.get("turn", 0))
+        if kind == "critical_state":
+            episode["state"] = entry.get("state") or episode["state"]
+            episode["critical"] = True
+        elif kind == "action":
+            state = _to_state(entry.get("state_after"))
+            if state is not None:
+                episode["state"] = entry["state_after"]
+                episode["critical"] = state.is_critical()
+        if episode["critical"] or (kind == "action" and episode["turn"] >= self.max_turns):
+            self.close()
+
+    def _action(self, entry):
+        action_id, success_rate = entry.get("action_id"), entry.get("success_rate")
+        if not isinstance(action_id, str) or not isinstance(success_rate, (int, float)):
+            return
+        # 実行前の状態 = 実行後の状態 - 変化量
+        after, changes = _to_state(entry.get("state_after")), entry.get("state_changes") or {}
+        bucket = None
+        if after is not None:
+            for field, change in changes.items():
+                if field in STATE_FIELDS and isinstance(change, int):
+                    setattr(after, field, getattr(after, field) - change)
+            bucket = rate_bucket(after)
+        self.aggregates.add_action(action_id, entry.get("success"), success_rate, bucket)
+
+    def close(self):
+        """進行中のエピソードを終わったものとして集計する"""
+        episode, self.episode = self.episode, None
+        if episode is None:
+            return
+        if episode["critical"]:
+            outcome = CRITICAL
+        elif episode["turn"] >= self.max_turns:
+            outcome = COMPLETED
+        else:
+            outcome = ABANDONED
+        state = episode["state"]
+        score = None if state is None else episode_score(state, episode["turn"])
+        self.aggregates.add_episode(episode["scenario_id"], outcome, episode["turn"], score)
+
+
+def _add_columnar_actions(aggregates, log, start):
+    """列指向のログのアクション（RAW_LINE以外）の成功率・選択頻度を配列演算でまとめて集計する"""
+    rows = np.flatnonzero(log.column("kind")[start:] == ACTION) + start
+    if not len(rows):
+        return
+    labels = log.column("label")[rows]
+    success = log.column("success")[rows]
+    rates = log.column("success_rate")[rows]
+    action_ids = {label: log.labels[label][0] for label in np.unique(labels).tolist()}
+    valid = np.array([isinstance(action_ids[label], str) for label in labels.tolist()], dtype=bool)
+
+    for label, action_id in action_ids.items():
+        mask = valid & (labels == label)
+        if mask.any():
+            stats = aggregates.actions.setdefault(action_id, [0, 0, 0.0])
+            stats[0] += int(mask.sum())
+            stats[1] += int(success[mask].sum())
+            stats[2] += float(rates[mask].sum())
+    bins = np.minimum((rates * CALIBRATION_BINS).astype(np.int64), CALIBRATION_BINS - 1)
+    for key in np.unique(bins[valid]).tolist():
+        mask = valid & (bins == key)
+        calibration = aggregates.calibration.setdefault(key, [0, 0, 0.0])
+        calibration[0] += int(mask.sum())
+        calibration[1] += int(success[mask].sum())
+        calibration[2] += float(rates[mask].sum())
+
+    # 実行前の状態 = 実行後の状態 - 変化量（実行後の状態に全項目があるものだけ）
+    full = np.array([set(keys) == set(STATE_FIELDS) for keys in log.key_orders] or [False])
+    chosen = valid & full[log.column("state_keys")[rows]]
+    before = log.column("state")[rows[chosen]].astype(np.int32) - log.column("delta")[rows[chosen]]
+    buckets = rate_buckets(SystemStateBatch(before.T))
+    pairs, counts = np.unique(np.stack([buckets, labels[chosen]]), axis=1, return_counts=True)
+    for (bucket, label), count in zip(pairs.T.tolist(), counts.tolist()):
+        choices = aggregates.choices.setdefault(bucket, {})
+        _add(choices, action_ids[label], count)
+
+
+def _process_file(path, offset, episode, close, max_turns, end=None):
+    """ログファイルのoffset以降を読み、(読み終えた位置, 開いたときの大きさ, 続きのエピソード,
+    集計値の辞書) を返す
+
+    JSONLは書き込み途中の行を読まないよう、改行で終わる行までを読む（位置はバイト数）。
+    endを指定するとその位置までを読む（セグメント内の1セッション分）。
+    列指向のログは集計に使う列だけを読む（位置は件数）。
+    """
+    aggregates = LogAggregates()
+    tracker = _EpisodeTracker(aggregates, max_turns, episode)
+    if path.endswith(COLUMNAR_SUFFIX):
+        size = os.path.getsize(path)
+        with ColumnarLog(path) as log:
+            if len(log) < offset:
+                print(f"ログファイルが短くなったため最初から読みます: {path}")
+                offset, tracker.episode = 0, None
+            _add_columnar_actions(aggregates, log, offset)
+            kinds = log.column("kind")[offset:].tolist()
+            labels = log.column("label")[offset:].tolist()
+            for kind, label, entry in zip(kinds, labels, log.records(EPISODE_FIELDS, start=offset)):
+                if kind == RAW_LINE:
+                    tracker.feed(log.raw_lines[label])
+                else:
+                    tracker.feed_entry(entry, count_action=False)
+            offset = len(log)
+        if close:
+            tracker.close()
+        return offset, size, tracker.episode, aggregates.to_dict()
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n") or (end is not None and offset >= end):
+                break
+            offset += len(line)
+            if line.strip():
+                tracker.feed(line)
+    if close:
+        tracker.close()
+    return offset, size, tracker.episode, aggregates.to_dict()
+
+
+class LogAnalyzer:
+    """セッションログ（data/logs/*.json と列指向の *.irl）を1行ずつ読んで集計する
+
+    ファイルごとに読み終えた位置と集計値をindex_fileに保存し、
+    次回以降は追記された分と新しいファイルだけを読む。
+    最終更新からidle_timeout秒たったファイルの未完了のエピソードは途中終了として集計する。
+    """
+
+    def __init__(self, log_dir="data/logs", index_file="data/reports/log_index.json",
+                 max_turns=10, idle_timeout=7200):
+        self.log_dir = log_dir
+        self.index_file = index_file
+        self.max_turns = max_turns
+        self.idle_timeout = idle_timeout
+        self.files = {}  # ファイル名: {"offset", "size", "episode"}
+        self.last_chunk = 0  # 読み終えたセグメントのチャンクID
+        self.aggregates = LogAggregates()
+        self._load_index()
+
+    def _load_index(self):
+        if not self.index_file or not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") != INDEX_VERSION or index.get("max_turns") != self.max_turns:
+                print(f"インデックスの形式が異なるため最初から集計します: {self.index_file}")
+                return
+            self.files = index["files"]
+            self.last_chunk = index.get("last_chunk", 0)
+            self.aggregates = LogAggregates.from_dict(index["aggregates"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"インデックスの読み込みに失敗したため最初から集計します: {e}")
+            self.files, self.aggregates = {}, LogAggregates()
+
+    def save_index(self):
+        if not self.index_file:
+            return
+        directory = os.path.dirname(self.index_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "max_turns": self.max_turns,
+                       "files": self.files, "last_chunk": self.last_chunk,
+                       "aggregates": self.aggregates.to_dict()}, f)
+        os.replace(tmp_path, self.index_file)
+
+    def pending_files(self, now=None):
+        """読む必要のあるファイルの (ファイル名, 読み始める位置, 続きのエピソード, 閉じるか) のリスト"""
+        now = time.time() if now is None else now
+        pending = []
+        with os.scandir(self.log_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith((".json", COLUMNAR_SUFFIX)) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                known = self.files.get(entry.name, {"offset": 0, "size": 0, "episode": None})
+                offset, episode = known["offset"], known["episode"]
+                # 書き込み途中の行で止まったファイルは、大きさが変わるまで読み直さない
+                grown = stat.st_size > offset and stat.st_size != known["size"]
+                if stat.st_size < offset and not entry.name.endswith(COLUMNAR_SUFFIX):
+                    # 作り直されたファイルは最初から読み直す（以前の分は集計に残る）
+                    print(f"ログファイルが短くなったため最初から読みます: {entry.name}")
+                    offset, episode, grown = 0, None, True
+                close = now - stat.st_mtime >= self.idle_timeout
+                if grown or (close and episode is not None):
+                    pending.append((entry.name, offset, episode, close))
+        return sorted(pending)
+
+    def update(self, workers=1, now=None):
+        """新しいログを読み込んで集計値とインデックスを更新し、読んだファイル数を返す
+
+        workers: 2以上ならファイル単位でワーカープロセスに分けて読む
+        """
+        chunks = self._update_segments()
+        pending = self.pending_files(now)
+        tasks = [(os.path.join(self.log_dir, name), offset, episode, close, self.max_turns)
+                 for name, offset, episode, close in pending]
+        if workers and workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_process_file, *task): name
+                           for task, (name, *_) in zip(tasks, pending)}
+                for future in as_completed(futures):
+                    self._record(futures[future], *future.result())
+        else:
+            for task, (name, *_) in zip(tasks, pending):
+                self._record(name, *_process_file(*task))
+        if pending or chunks:
+            self.save_index()
+        return len(pending) + chunks
+
+    def _update_segments(self):
+        """前回以降にセグメントへ移されたセッションログのうち、まだ読んでいない部分を読む
+
+        元のファイルを途中まで読んでいた場合はその続きから読み、同じ名前のファイルが
+        新しく作られたときのために読み終えた位置を0に戻す。
+        """
+        segment_dir = segment_dir_for(self.log_dir)
+        if not os.path.exists(os.path.join(segment_dir, INDEX_FILE)):
+            return 0
+        store = SegmentStore(segment_dir)
+        try:
+            chunks = store.new_chunks(self.last_chunk)
+        finally:
+            store.close()
+        for chunk_id, session_id, segment, offset, length in chunks:
+            name = f"{session_id}.json"
+            known = self.files.get(name, {"offset": 0, "episode": None})
+            close = not os.path.exists(os.path.join(self.log_dir, name))
+            _, _, episode, aggregates = _process_file(
+                os.path.join(segment_dir, segment), offset + min(known["offset"], length),
+                known["episode"], close, self.max_turns, end=offset + length)
+            self._record(name, 0, 0, episode, aggregates)
+            self.last_chunk = chunk_id
+        return len(chunks)
+
+    def _record(self, name, offset, size, episode, aggregates):
+        self.files[name] = {"offset": offset, "size": size, "episode": episode}
+        self.aggregates.merge(LogAggregates.from_dict(aggregates))
+
+    def summary(self):
+        return self.aggregates.summary()
@@ -0,0 +1,308 @@
+import numpy as np
+from app.events import EventManager
+from app.actions import ActionManager
+from app.probability import ProbabilityEngine, rate_buckets
+from app.rng import RandomStream
+from app.state import STATE_FIELDS, EFFECT_KEYS, FAILURE_FIELDS, SystemStateBatch
+
+# 選択なしを表すアクションインデックス
+NO_ACTION = -1
+
+
+def _effect_vector(record, fields=STATE_FIELDS):
+    """効果辞書をフィールド順の整数ベクトルに変換（未設定・不正値は0）"""
+    vector = []
+    for field in fields:
+        value = record.get(EFFECT_KEYS[field], 0)
+        vector.append(value if isinstance(value, int) else 0)
+    return vector
+
+
+# 効果行列の列インデックス（STATE_FIELDSの順）
+CPU, MEMORY, DISK, NETWORK, SERVICES, ALERTS, SLA_RISK = range(len(STATE_FIELDS))
+
+
+def calculate_scores(states, turns):
+    """InfraRiskSimulator.calculate_scoreのベクトル版"""
+    base_score = states.services * 100
+    stability_bonus = np.where((states.cpu < 60) & (states.memory < 60), 50, 0)
+    speed_bonus = np.maximum(0, (10 - turns) * 30)
+    sla_penalty = states.sla_risk * 5
+    return base_score + stability_bonus + speed_bonus - sla_penalty
+
+
+class BatchSimulator:
+    """同一シナリオのN本のエピソードをNumPy配列で並列に進めるエンジン
+
+    InfraRiskSimulatorのnext_turn/take_actionと同じ状態遷移を、
+    エピソード方向のベクトル演算としてまとめて実行する。
+    ログ出力は行わない。
+    """
+
+    def __init__(self, scenarios_file="data/scenarios.csv", actions_file="data/actions.csv"):
+        self.event_manager = EventManager(scenarios_file)
+        self.action_manager = ActionManager(actions_file)
+        self.actions = list(self.action_manager.actions)
+        self.action_ids = [action["id"] for action in self.actions]
+        self._compile_events()
+        self._compile_actions()
+
+    def _compile_events(self):
+        """イベント効果を (イベント数, フィールド数) の行列に変換"""
+        events = self.event_manager.events or [self.event_manager.get_random_event()]
+        self.event_effects = np.array([_effect_vector(event) for event in events], dtype=np.int32)
+        # 状態と同じ (フィールド数, 件数) の並びで引けるよう転置した表も持つ
+        self._event_columns = np.ascontiguousarray(self.event_effects.T)
+
+    def _compile_actions(self):
+        """アクションの効果・クールダウン・成功率表を配列に変換"""
+        actions = self.actions
+        self.success_effects = np.array([_effect_vector(a) for a in actions], dtype=np.int32)
+        self.cooldowns = np.array([a.get("cooldown", 0) or 0 for a in actions], dtype=np.int8)
+
+        # 失敗時の影響
+        self.has_failure_effects = np.array(["failure_effects" in a for a in actions])
+        self.failure_effects = np.array(
+            [_effect_vector(a.get("failure_effects", {}), FAILURE_FIELDS) for a in actions],
+            dtype=np.int32
+        ).reshape(len(actions), len(FAILURE_FIELDS))
+        self.failure_cpu_penalty = ~self.has_failure_effects & (self.success_effects[:, CPU] < 0)
+
+        # 成功時・失敗時の変化量をアクションごとの列 (フィールド数, A) にまとめておく。
+        # 失敗時のSLAリスク上昇・個別影響・デフォルトのCPU負荷増加はフィールドが重ならないので
+        # 1列で表せる（上限10のデフォルトのアラート増加だけは別に適用する）
+        failure_deltas = np.zeros_like(self.success_effects)
+        failure_deltas[:, SLA_RISK] = 15
+        for column, field in enumerate(FAILURE_FIELDS):
+            failure_deltas[:, STATE_FIELDS.index(field)] += np.where(
+                self.has_failure_effects, self.failure_effects[:, column], 0)
+        failure_deltas[:, CPU] += np.where(self.failure_cpu_penalty, 10, 0)
+        self._success_columns = np.ascontiguousarray(self.success_effects.T)
+        self._failure_columns = np.ascontiguousarray(failure_deltas.T)
+
+        # 成功率・リスク期待値は閾値バケットの事前計算表で引く
+        self.probability_engine = ProbabilityEngine(self.action_manager.catalog.rate_table)
+        self.rate_table = self.probability_engine.rate_table
+
+        # 貪欲ポリシー用に、バケットごとのリスク期待値の高い順（同値は番号順）の並びと各アクションの順位を持つ。
+        # 並びの末尾には、提示がないときのNO_ACTIONを置く
+        order = np.argsort(-self.rate_table.expectation_table.T, axis=1, kind="stable")
+        self._greedy_ranks = np.argsort(order, axis=1).astype(np.min_scalar_type(len(actions)))
+        self._greedy_order = np.hstack([order, np.full((len(order), 1), NO_ACTION)])
+
+    def success_rates(self, states, action_indices=None):
+        """成功確率（省略時は全エピソード×全アクション (N, A)、指定時は (N,)）"""
+        return self.rate_table.rates(states, action_indices)
+
+    def risk_expectations(self, states):
+        """全エピソード×全アクションのリスク期待値 (N, A)"""
+        return self.rate_table.expectations(states)
+
+    def initial_states(self, scenario, n_episodes):
+        """シナリオの初期状態をN個並べたバッチを生成"""
+        return SystemStateBatch.from_initial({
+            "cpu": scenario["initial_cpu"],
+            "memory": scenario["initial_memory"],
+            "disk": scenario["initial_disk"],
+            "network": scenario["initial_network"],
+            "services": scenario["initial_services"],
+            "alerts": 0,
+            "sla_risk": 10
+        }, n_episodes)
+
+    def apply_action(self, states, action_indices, success, mask):
+        """選択アクションの結果を適用し、フィールドごとの変化量配列を返す"""
+        chosen = np.maximum(action_indices, 0)
+        # SystemStateBatch.apply_actionと同じ結果を、事前にまとめた変化量の列から1回の加算で求める
+        deltas = np.where(success, np.take(self._success_columns, chosen, axis=1),
+                          np.take(self._failure_columns, chosen, axis=1))
+        changes = states.apply_effects(deltas.T, mask)
+        default = mask & ~success & ~self.has_failure_effects[chosen]
+        if default.any():
+            changes["alerts"] = changes["alerts"] + states.apply_effect("alerts", 1, default, upper=10)
+        return changes
+
+    def offer_actions(self, available, rng, max_actions=5):
+        """選択可能な（クールダウン中でない）アクションから最大max_actions件を無作為に提示
+
+        available: (N, A) の選択可能フラグ
+        下位ビットに列番号を埋めた乱数キーで順位を決め、行ごとに
+        max_actions番目のキー以下のアクションを提示対象とする。
+        """
+        n_actions = available.shape[1]
+        if n_actions <= max_actions:
+            return available
+        index_bits = (n_actions - 1).bit_length()
+        keys = rng.integers(0, 1 << 32, size=available.shape, dtype=np.uint32)
+        keys &= np.uint32(-1 << index_bits & 0xFFFFFFFF)
+        keys |= np.arange(n_actions, dtype=np.uint32)
+        # 選択できないアクションはキーを最大値にして順位の最後に回す（ブールの添字代入より速い）
+        keys |= np.negative((~available).astype(np.uint32))
+        threshold = np.sort(keys, axis=1)[:, max_actions - 1:max_actions]
+        return available & (keys <= threshold)
+
+    def run(self, scenario_id, n_episodes, policy="random", seed=None, max_turns=10,
+            max_actions=5, chunk_size=8192):
+        """N本のエピソードを実行し、エピソードごとの結果配列を返す
+
+        policy: "random" / "greedy" / callable(engine, states, offered, turn, rng)
+                callableはエピソードごとのアクションインデックス（NO_ACTIONで見送り）を返す
+        seed: シード、またはRandomStream（そのストリームから配列単位で乱数を生成）
+        chunk_size: 一度に配列で進めるエピソード数（キャッシュに収まる程度が速い）
+        戻り値: {"scores", "critical", "turns"} の配列辞書
+        """
+        scenario = self.event_manager.get_scenario_by_id(scenario_id)
+        if not scenario:
+            raise ValueError(f"シナリオが見つかりません: {scenario_id}")
+        choose = self._resolve_policy(policy)
+        rng = seed.generator if isinstance(seed, RandomStream) else np.random.default_rng(seed)
+
+        results = [
+            self._run_chunk(scenario, min(chunk_size, n_episodes - start), choose, rng,
+                            max_turns, max_actions)
+            for start in range(0, n_episodes, chunk_size)
+        ]
+        if not results:
+            results = [self._run_chunk(scenario, 0, choose, rng, max_turns, max_actions)]
+        return {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+    def _run_chunk(self, scenario, n_episodes, choose, rng, max_turns, max_actions):
+        """1チャンク分のエピソードをロックステップで実行
+
+        終了したエピソードが半分を超えたら結果を確定して配列から外し、残りだけを進める。
+        """
+        scores = np.zeros(n_episodes, dtype=np.int64)
+        critical_results = np.zeros(n_episodes, dtype=bool)
+        turn_results = np.full(n_episodes, max_turns, dtype=np.int32)
+        episode_ids = np.arange(n_episodes)  # 配列の各行がチャンク内の何番目のエピソードか
+
+        states = self.initial_states(scenario, n_episodes)
+        # クールダウンは毎ターン減らす代わりに、再び選択可能になるターンで持つ
+        ready_turns = np.zeros((n_episodes, len(self.actions)), dtype=np.int16)
+        done = np.zeros(n_episodes, dtype=bool)
+        turns = np.full(n_episodes, max_turns, dtype=np.int32)
+
+        for turn in range(1, max_turns + 1):
+            if done.sum() * 2 > len(done):
+                # 終了したエピソードの結果を確定して外す
+                finished = episode_ids[done]
+                scores[finished] = calculate_scores(SystemStateBatch(states.values[:, done]), turns[done])
+                critical_results[finished] = True
+                turn_results[finished] = turns[done]
+                keep = ~done
+                states = SystemStateBatch(states.values[:, keep])
+                ready_turns, turns, episode_ids = ready_turns[keep], turns[keep], episode_ids[keep]
+                done = done[keep]
+            size = len(done)
+            rows = np.arange(size)
+            active = ~done
+
+            # 自然変化とランダムイベント
+            states.natural_progression(active)
+            event_indices = self.event_manager.sample_event_indices(rng, size, scenario)
+            states.apply_event(np.take(self._event_columns, event_indices, axis=1).T, active)
+
+            critical = active & states.is_critical()
+            turns[critical] = turn
+            done |= critical
+            active &= ~critical
+            if not active.any():
+                break
+
+            # アクション提示（クールダウンの明けたもの）
+            available = ready_turns <= turn
+            if choose is random_policy:
+                # 提示された中から一様に選ぶのは、選択可能な全アクションから一様に選ぶのと同じ分布
+                # なので、提示の抽選を省く
+                choice = _uniform_available(available, rng)
+            else:
+                offered = self.offer_actions(available, rng, max_actions)
+                choice = np.asarray(choose(self, states, offered, turn, rng), dtype=np.int64)
+
+            # アクション選択と成功判定
+            acting = active & (choice != NO_ACTION)
+            chosen = np.maximum(choice, 0)
+            rates = self.success_rates(states, chosen)
+            success = rng.random(size) < rates
+            self.apply_action(states, choice, success, acting)
+
+            # クールダウン設定（cターンのクールダウンはturn + cターン目から選択可能）
+            new_cooldowns = self.cooldowns[chosen]
+            set_mask = acting & (new_cooldowns > 0)
+            ready_turns[rows[set_mask], chosen[set_mask]] = turn + new_cooldowns[set_mask]
+
+            critical = acting & states.is_critical()
+            turns[critical] = turn
+            done |= critical
+
+        scores[episode_ids] = calculate_scores(states, turns)
+        critical_results[episode_ids] = done
+        turn_results[episode_ids] = turns
+        return {
+            "scores": scores,
+            "critical": critical_results,
+            "turns": turn_results,
+        }
+
+    def _resolve_policy(self, policy):
+        """ポリシー指定を選択関数に変換"""
+        if callable(policy):
+            return policy
+        if policy == "random":
+            return random_policy
+        if policy == "greedy":
+            return greedy_policy
+        raise ValueError(f"不明なポリシーです: {policy}")
+
+
+def _uniform_available(available, rng):
+    """選択可能なアクションから一様に1つ選ぶ（選択可能なものがなければNO_ACTION）
+
+    列を一様に引き、選択可能でなかった行だけ引き直す（棄却法）。
+    """
+    n_episodes, n_actions = available.shape
+    choice = np.full(n_episodes, NO_ACTION, dtype=np.int64)
+    pending = np.flatnonzero(available.any(axis=1))
+    while pending.size:
+        candidates = rng.integers(0, n_actions, pending.size)
+        accepted = available[pending, candidates]
+        choice[pending[accepted]] = candidates[accepted]
+        pending = pending[~accepted]
+    return choice
+
+
+def random_policy(engine, states, offered, turn, rng):
+    """提示されたアクションから一様に選択"""
+    keys = np.where(offered, rng.random(offered.shape, dtype=np.float32), -1.0)
+    choice = keys.argmax(axis=1)
+    return np.where(offered.any(axis=1), choice, NO_ACTION)
+
+
+def greedy_policy(engine, states, offered, turn, rng):
+    """リスク期待値が最大のアクションを選択
+
+    期待値そのものではなく、バケットごとの期待値の順位表を引いて提示中で最上位のものを選ぶ。
+    """
+    buckets = rate_buckets(states)
+    ranks = np.take(engine._greedy_ranks, buckets, axis=0)
+    # 提示されていないアクションは順位を型の最大値にする
+    ranks |= np.negative((~offered).astype(ranks.dtype))
+    best = np.minimum(ranks.min(axis=1), offered.shape[1])
+    return engine._greedy_order[buckets, best]
+
+
+def playbook_policy(engine, action_ids):
+    """ターンごとのアクションID列（プレイブック）に従うポリシーを作成
+
+    提示されていないアクションのターンは見送る。
+    """
+    index = {action_id: i for i, action_id in enumerate(engine.action_ids)}
+    plan = [index.get(action_id, NO_ACTION) if action_id else NO_ACTION for action_id in action_ids]
+
+    def choose(engine, states, offered, turn, rng):
+        if turn > len(plan) or plan[turn - 1] == NO_ACTION:
+            return np.full(offered.shape[0], NO_ACTION)
+        planned = plan[turn - 1]
+        return np.where(offered[:, planned], planned, NO_ACTION)
+
+    return choose
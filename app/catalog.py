@@ -0,0 +1,222 @@
+import csv
+import hashlib
+import os
+import threading
+from functools import cached_property
+from app.probability import SuccessRateTable
+from app.rng import AliasTable
+
+# 型変換するCSVの列
+SCENARIO_INT_FIELDS = ("initial_cpu", "initial_memory", "initial_disk",
+                       "initial_network", "initial_services")
+EVENT_INT_FIELDS = ("cpu_effect", "memory_effect", "disk_effect", "network_effect",
+                    "service_effect", "alert_effect", "sla_risk_effect")
+ACTION_INT_FIELDS = ("cpu_effect", "memory_effect", "disk_effect", "network_effect",
+                     "service_effect", "alert_effect", "cooldown")
+DEFAULT_SUCCESS_RATE = 0.7
+DEFAULT_EVENT_WEIGHT = 1.0
+
+
+class Record(dict):
+    """読み取り専用のレコード
+
+    dictのサブクラスなので、そのままJSON化やdict(record)でのコピーができる。
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("カタログのレコードは変更できません")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return Record, (dict(self),)
+
+
+class Catalog:
+    """レコードの一覧とID・フィールド値による索引"""
+
+    def __init__(self, records, index_fields=()):
+        self.records = tuple(records)
+        self.by_id = {record["id"]: record for record in self.records}
+        self.positions = {record["id"]: i for i, record in enumerate(self.records)}
+        self.indexes = {}
+        for field in index_fields:
+            index = {}
+            for record in self.records:
+                index.setdefault(record.get(field), []).append(record)
+            self.indexes[field] = {value: tuple(group) for value, group in index.items()}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, record_id):
+        """IDによるレコードの取得（存在しなければNone）"""
+        return self.by_id.get(record_id)
+
+    def find(self, field, value):
+        """索引フィールドの値が一致するレコードを返す"""
+        return self.indexes[field].get(value, ())
+
+
+class ScenarioCatalog:
+    """シナリオファイルの内容（IDがSで始まる行がシナリオ、それ以外がイベント）
+
+    イベントの発生確率は、イベントのweight列（省略時1）に、シナリオのevent_weights列
+    （"カテゴリ:倍率;..." の形式、省略時はすべて1）の倍率を掛けた重みに比例する。
+    """
+
+    def __init__(self, scenarios, events):
+        self.scenarios = Catalog(scenarios, ("category", "difficulty"))
+        self.events = Catalog(events, ("category",))
+        self._event_tables = {}  # シナリオID: AliasTable
+        self._lock = threading.Lock()
+
+    def event_weights(self, scenario=None):
+        """シナリオでの各イベントの重み（イベントの並び順）"""
+        multipliers = (scenario or {}).get("event_weights") or {}
+        return [
+            event.get("weight", DEFAULT_EVENT_WEIGHT) * multipliers.get(event.get("category"), 1.0)
+            for event in self.events
+        ]
+
+    def event_table(self, scenario=None):
+        """シナリオのイベント分布のエイリアス表（シナリオごとに1度だけ作成）"""
+        key = scenario.get("id") if scenario else None
+        table = self._event_tables.get(key)
+        if table is None:
+            table = AliasTable(self.event_weights(scenario))
+            with self._lock:
+                self._event_tables[key] = table
+        return table
+
+    @classmethod
+    def parse(cls, file_path):
+        """CSVファイルを解析"""
+        scenarios, events = [], []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('id', '').startswith('S'):
+                    for field in SCENARIO_INT_FIELDS:
+                        if field in row:
+                            row[field] = int(row[field])
+                    if 'event_weights' in row:
+                        row['event_weights'] = _parse_weights(row['event_weights'])
+                    scenarios.append(Record(row))
+                else:
+                    for field in EVENT_INT_FIELDS:
+                        if field in row:
+                            row[field] = _to_int(row[field])
+                    if 'weight' in row:
+                        row['weight'] = _to_weight(row['weight'])
+                    events.append(Record(row))
+        return cls(scenarios, events)
+
+
+class ActionCatalog:
+    """アクションファイルの内容"""
+
+    def __init__(self, actions):
+        self.actions = Catalog(actions, ("category", "skill_tag"))
+
+    @cached_property
+    def rate_table(self):
+        """全アクションの成功率表（初回参照時に作成し、カタログの利用者で共有）"""
+        return SuccessRateTable(self.actions.records)
+
+    @classmethod
+    def parse(cls, file_path):
+        """CSVファイルを解析"""
+        actions = []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                for field in ACTION_INT_FIELDS:
+                    if field in row:
+                        row[field] = _to_int(row[field])
+                if 'base_success_rate' in row:
+                    try:
+                        row['base_success_rate'] = float(row['base_success_rate'])
+                    except (ValueError, TypeError):
+                        row['base_success_rate'] = DEFAULT_SUCCESS_RATE
+                # 失敗時の影響はデフォルトは未設定
+                row['failure_effects'] = Record(row.get('failure_effects') or {})
+                actions.append(Record(row))
+        return cls(actions)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return 0
+
+
+def _to_weight(value):
+    """重みを非負の数値に変換（空・不正値は既定値）"""
+    try:
+        return max(0.0, float(value))
+    except (ValueError, TypeError):
+        return DEFAULT_EVENT_WEIGHT
+
+
+def _parse_weights(value):
+    """"カテゴリ:倍率;カテゴリ:倍率" 形式をカテゴリごとの倍率に変換"""
+    weights = {}
+    for item in (value or "").split(';'):
+        category, _, weight = item.rpartition(':')
+        if category.strip():
+            weights[category.strip()] = _to_weight(weight)
+    return Record(weights)
+
+
+class CatalogCache:
+    """ファイルごとの解析結果をプロセス内で共有するキャッシュ
+
+    参照のたびにファイルの更新時刻とサイズを確認し、変わっていれば内容のハッシュを比較して、
+    内容が変わった場合だけ解析し直す。
+    """
+
+    def __init__(self):
+        self._entries = {}  # (絶対パス, 解析クラス): [stat, ハッシュ, 解析結果]
+        self._lock = threading.Lock()
+
+    def load(self, file_path, catalog_class):
+        key = (os.path.abspath(file_path), catalog_class)
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == signature:
+                return entry[2]
+
+            with open(file_path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            if entry and entry[1] == digest:
+                entry[0] = signature
+                return entry[2]
+
+            catalog = catalog_class.parse(file_path)
+            self._entries[key] = [signature, digest, catalog]
+            return catalog
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 全シミュレータで共有するキャッシュ
+catalog_cache = CatalogCache()
+
+
+def load_scenario_catalog(file_path="data/scenarios.csv"):
+    """シナリオファイルのカタログを取得（キャッシュ済みなら再解析しない）"""
+    return catalog_cache.load(file_path, ScenarioCatalog)
+
+
+def load_action_catalog(file_path="data/actions.csv"):
+    """アクションファイルのカタログを取得（キャッシュ済みなら再解析しない）"""
+    return catalog_cache.load(file_path, ActionCatalog)
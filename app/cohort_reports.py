@@ -0,0 +1,196 @@
+import csv
+import functools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from app.analytics import episode_score
+from app.catalog import load_action_catalog, load_scenario_catalog
+from app.log_segments import SegmentStore, INDEX_FILE, read_session_log, segment_dir_for
+from app.report import ReportGenerator
+from app.score_ranks import ScoreRanks
+from app.session_summary import SessionSummary
+from app.state import STATE_FIELDS, SystemState
+
+# コホート（研修の受講グループ）ごとの参加セッションIDの一覧（1行1件）
+COHORT_DIR = "data/cohorts"
+_COHORT_NAME = re.compile(r"[\w-]+")
+
+# 結果一覧の列
+INDEX_FIELDS = ("session_id", "scenario", "turns_played", "score", "result", "actions",
+                "success_rate", "score_top_percent", "turns_top_percent", "pdf")
+
+
+def _cohort_file(cohort_dir, cohort):
+    if not isinstance(cohort, str) or not _COHORT_NAME.fullmatch(cohort):
+        raise ValueError(f"コホート名には英数字・_・-のみ使えます: {cohort!r}")
+    return os.path.join(cohort_dir, f"{cohort}.txt")
+
+
+def record_cohort_member(cohort, session_id, cohort_dir=COHORT_DIR):
+    """セッションをコホートの参加者として記録する"""
+    path = _cohort_file(cohort_dir, cohort)
+    os.makedirs(cohort_dir, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(session_id + "\n")
+
+
+def cohort_members(cohort, cohort_dir=COHORT_DIR):
+    """コホートの参加セッションID（記録順、重複なし）"""
+    with open(_cohort_file(cohort_dir, cohort), encoding="utf-8") as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+
+def logged_sessions(log_dir="data/logs", prefix=""):
+    """ログのあるセッションID（セグメントに移した分を含む）をprefixで絞り込んで返す"""
+    sessions = set()
+    with os.scandir(log_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                sessions.add(entry.name[:-len(".json")])
+    segment_dir = segment_dir_for(log_dir)
+    if os.path.exists(os.path.join(segment_dir, INDEX_FILE)):
+        store = SegmentStore(segment_dir)
+        try:
+            sessions.update(store.sessions())
+        finally:
+            store.close()
+    return sorted(s for s in sessions if s.startswith(prefix))
+
+
+def rebuild_summary(entries, scenario_catalog, action_catalog):
+    """セッションログの最後のシナリオからレポートのサマリーを復元する（シナリオがなければNone）
+
+    ターン経過による自然変化は決まった規則なので、初期状態にイベントの変化量を重ねて再現し、
+    アクション・危機的状態の行では記録された状態を使う。
+    最大ターン数に達して終了した場合、終了時に進めたターンはログに残らないため数えない。
+    """
+    start = None
+    for i, entry in enumerate(entries):
+        if isinstance(entry, dict) and entry.get("type") == "scenario_start":
+            start = i
+    if start is None:
+        return None
+
+    first = entries[start]
+    scenario = scenario_catalog.scenarios.get(first.get("scenario_id")) or {
+        "name": first.get("scenario_name"), "description": first.get("description")}
+    state = SystemState()
+    for field in ("cpu", "memory", "disk", "network", "services"):
+        state_value = scenario.get(f"initial_{field}")
+        if state_value is not None:
+            setattr(state, field, state_value)
+    state.alerts, state.sla_risk = 0, 10
+
+    running = SessionSummary()
+    turn, game_over = 0, False
+    for entry in entries[start:]:
+        if not isinstance(entry, dict):
+            continue
+        kind = entry.get("type")
+        category = None
+        if kind == "event":
+            turn = entry.get("turn", turn)
+            state.natural_progression()
+            for field, delta in (entry.get("effect") or {}).items():
+                if field in STATE_FIELDS:
+                    setattr(state, field, getattr(state, field) + delta)
+        elif kind in ("action", "critical_state"):
+            turn = entry.get("turn", turn)
+            values = entry.get("state_after" if kind == "action" else "state") or {}
+            for field in STATE_FIELDS:
+                if field in values:
+                    setattr(state, field, values[field])
+            game_over = kind == "critical_state" or state.is_critical()
+            if kind == "action":
+                action = action_catalog.actions.get(entry.get("action_id"))
+                category = action.get("category") if action else None
+        current = state.get_state_dict()
+        running.observe(entry, current, episode_score(current, turn), category)
+
+    current = state.get_state_dict()
+    return ReportGenerator.build_summary(scenario, turn, current, episode_score(current, turn),
+                                         game_over, running)
+
+
+def _parse_lines(data):
+    entries = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            entries.append(None)
+    return entries
+
+
+@functools.lru_cache(maxsize=None)
+def _score_ranks(path):
+    return ScoreRanks(path)
+
+
+def render_session_report(session_id, log_dir, out_dir, scenarios_file="data/scenarios.csv",
+                          actions_file="data/actions.csv", ranks_file=None):
+    """1セッションのログからPDFを作成し、結果一覧の行を返す（シナリオのないログはNone）
+
+    ワーカープロセスで実行する。カタログ・スタイル・順位の分布はプロセス内で使い回す。
+    ranks_file: 指定時はScoreRanksのファイルから同じシナリオの全プレイの中での順位を載せる
+    """
+    summary = rebuild_summary(_parse_lines(read_session_log(log_dir, session_id)),
+                              load_scenario_catalog(scenarios_file),
+                              load_action_catalog(actions_file))
+    if summary is None:
+        return None
+    if ranks_file is not None:
+        summary["ranking"] = _score_ranks(ranks_file).ranks(
+            summary["scenario_id"], summary["score"], summary["turns_played"])
+    ranking = summary.get("ranking") or {}
+    pdf_path = ReportGenerator.write_pdf(summary, ReportGenerator.generate_improvement_tips(summary),
+                                         os.path.join(out_dir, f"{session_id}.pdf"))
+    return {
+        "session_id": session_id,
+        "scenario": summary["scenario"],
+        "turns_played": summary["turns_played"],
+        "score": summary["score"],
+        "result": summary["game_over_reason"],
+        "actions": summary["action_count"],
+        "success_rate": round(summary["success_count"] / summary["action_count"], 3)
+        if summary["action_count"] else "",
+        "score_top_percent": ranking.get("score", {}).get("top_percent", ""),
+        "turns_top_percent": ranking.get("turns", {}).get("top_percent", ""),
+        "pdf": os.path.basename(pdf_path) if pdf_path else "",
+    }
+
+
+def _render_chunk(session_ids, log_dir, out_dir, scenarios_file, actions_file, ranks_file):
+    return [render_session_report(session_id, log_dir, out_dir, scenarios_file, actions_file,
+                                  ranks_file)
+            for session_id in session_ids]
+
+
+def render_cohort_reports(session_ids, log_dir="data/logs", out_dir="data/reports/cohort",
+                          scenarios_file="data/scenarios.csv", actions_file="data/actions.csv",
+                          workers=None, chunk_size=8, ranks_file=None):
+    """セッションごとのPDFをプロセスプールで並列に作成し、結果一覧（index.csv）を書き出す
+
+    戻り値: 結果一覧の行のリスト（セッションIDの順、シナリオのないログは含まない）
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = [session_ids[i:i + chunk_size] for i in range(0, len(session_ids), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        results = [_render_chunk(chunk, log_dir, out_dir, scenarios_file, actions_file, ranks_file)
+                   for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_render_chunk, chunk, log_dir, out_dir, scenarios_file,
+                                       actions_file, ranks_file) for chunk in chunks]
+            results = [future.result() for future in futures]
+    rows = [row for chunk in results for row in chunk if row is not None]
+
+    index_path = os.path.join(out_dir, "index.csv")
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, index_path)
+    return rows
@@ -0,0 +1,312 @@
+import datetime
+import json
+import os
+import struct
+from array import array
+import numpy as np
+from app.history import ACTION, CRITICAL_STATE, EVENT, RECORD_FIELDS, RECORD_KINDS, SCENARIO_START
+from app.state import STATE_FIELDS
+
+# 列指向のバイナリ形式のセッションログ
+#
+#   先頭: マジック, バージョン（8バイト）
+#   列データ: 各列を8バイト境界に揃えて順に並べる（リトルエンディアン）
+#   フッタ: 件数・列の位置・ID表などのJSON
+#   末尾: フッタの長さ, マジック（8バイト）
+#
+# id・名前・説明の組と状態項目のキーの並びは表に登録して番号で持つ。
+# 元の行と同じJSONに戻せない行（種類・項目・値の形式が異なるもの）は元の行の文字列のまま持つ。
+COLUMNAR_SUFFIX = ".irl"
+MAGIC = b"IRLC"
+VERSION = 1
+HEADER = struct.Struct("<4sB3x")
+TRAILER = struct.Struct("<I4s")
+
+# 行の種類（0-3はhistoryのレコード種類と同じ）
+RAW_LINE = 5
+
+# 列名: (dtype, 1件あたりの要素数)
+COLUMNS = {
+    "kind": ("<u1", 1),
+    "turn": ("<u2", 1),
+    "timestamp": ("<i8", 1),  # エポックからのマイクロ秒（RAW_LINEは0）
+    "label": ("<u4", 1),  # ID表の位置（RAW_LINEは元の行の位置）
+    "success": ("<u1", 1),
+    "success_rate": ("<f8", 1),
+    "delta_keys": ("<u2", 1),  # state_changes・effectのキーの並びの番号
+    "delta": ("<i2", len(STATE_FIELDS)),
+    "state_keys": ("<u2", 1),  # state_after・stateのキーの並びの番号
+    "state": ("<i2", len(STATE_FIELDS)),
+}
+_TYPECODES = {"<u1": "B", "<u2": "H", "<u4": "I", "<i8": "q", "<f8": "d", "<i2": "h"}
+
+# 種類ごとのID表の項目・状態項目の辞書の項目
+_LABEL_FIELDS = {
+    SCENARIO_START: ("scenario_id", "scenario_name", "description"),
+    EVENT: ("event_id", "event_name", "description"),
+    ACTION: ("action_id", "action_name"),
+}
+_DELTA_FIELD = {EVENT: "effect", ACTION: "state_changes"}
+_STATE_FIELD = {ACTION: "state_after", CRITICAL_STATE: "state"}
+_KIND_NAMES = {kind: name for name, kind in RECORD_KINDS.items()}
+
+# 列の投影: 返す項目ごとに必要な列
+_FIELD_COLUMNS = {
+    "turn": ("turn",), "timestamp": ("timestamp",), "success": ("success",),
+    "success_rate": ("success_rate",), "effect": ("delta_keys", "delta"),
+    "state_changes": ("delta_keys", "delta"), "state_after": ("state_keys", "state"),
+    "state": ("state_keys", "state"),
+}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_SHORT_RANGE = range(-32768, 32768)
+_FIELD_INDEX = {field: i for i, field in enumerate(STATE_FIELDS)}
+
+
+def _timestamp(micros):
+    return (_EPOCH + micros * _MICROSECOND).isoformat()
+
+
+class _Encoder:
+    """行を列に追加していく"""
+
+    def __init__(self):
+        self.columns = {name: array(_TYPECODES[dtype]) for name, (dtype, _) in COLUMNS.items()}
+        self.labels, self._label_index = [], {}
+        self.key_orders, self._key_index = [], {}
+        self.raw_lines = []
+        self.count = 0
+
+    def add(self, line):
+        values = self._encode(line)
+        if values is None:
+            self.raw_lines.append(line)
+            values = {"kind": RAW_LINE, "label": len(self.raw_lines) - 1}
+        for name, (_, width) in COLUMNS.items():
+            value = values.get(name, 0)
+            if width == 1:
+                self.columns[name].append(value)
+            else:
+                self.columns[name].extend(value or (0,) * width)
+        self.count += 1
+
+    def _encode(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict):
+            return None
+        kind = RECORD_KINDS.get(entry.get("type"))
+        if kind is None or tuple(entry) != RECORD_FIELDS[kind]:
+            return None
+
+        values = {"kind": kind}
+        try:
+            micros = (datetime.datetime.fromisoformat(entry["timestamp"]) - _EPOCH) // _MICROSECOND
+        except (TypeError, ValueError):
+            return None
+        values["timestamp"] = micros
+        if kind != SCENARIO_START:
+            turn = entry["turn"]
+            if type(turn) is not int or not 0 <= turn < 65536:
+                return None
+            values["turn"] = turn
+        if kind in _LABEL_FIELDS:
+            values["label"] = self._index(self._label_index, self.labels,
+                                          tuple(entry[field] for field in _LABEL_FIELDS[kind]))
+        if kind == ACTION:
+            if type(entry["success"]) is not bool or type(entry["success_rate"]) is not float:
+                return None
+            values["success"], values["success_rate"] = int(entry["success"]), entry["success_rate"]
+        for field, keys_column, column in ((_DELTA_FIELD.get(kind), "delta_keys", "delta"),
+                                           (_STATE_FIELD.get(kind), "state_keys", "state")):
+            if field is None:
+                continue
+            packed = self._pack_state(entry[field])
+            if packed is None:
+                return None
+            values[keys_column], values[column] = packed
+
+        # 元の行と同じJSONに戻せる場合だけ列で持つ
+        if _timestamp(micros) != entry["timestamp"] or json.dumps(entry) != line:
+            return None
+        return values
+
+    def _pack_state(self, state):
+        if not isinstance(state, dict):
+            return None
+        packed = [0] * len(STATE_FIELDS)
+        for field, value in state.items():
+            index = _FIELD_INDEX.get(field)
+            if index is None or type(value) is not int or value not in _SHORT_RANGE:
+                return None
+            packed[index] = value
+        return self._index(self._key_index, self.key_orders, tuple(state)), packed
+
+    @staticmethod
+    def _index(index, table, key):
+        position = index.get(key)
+        if position is None:
+            position = index[key] = len(table)
+            table.append(list(key))
+        return position
+
+
+def write_columnar_log(path, lines):
+    """JSONLの行（改行なしの文字列）を列指向のバイナリ形式で書き込み、件数を返す"""
+    encoder = _Encoder()
+    for line in lines:
+        encoder.add(line)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION))
+        offsets = {}
+        for name, column in encoder.columns.items():
+            offsets[name] = f.tell()
+            f.write(column.tobytes())
+            f.write(b"\0" * (-f.tell() % 8))
+        footer = json.dumps({
+            "count": encoder.count,
+            "columns": offsets,
+            "labels": encoder.labels,
+            "key_orders": encoder.key_orders,
+            "raw_lines": encoder.raw_lines,
+        }, ensure_ascii=False).encode("utf-8")
+        f.write(footer)
+        f.write(TRAILER.pack(len(footer), MAGIC))
+    os.replace(tmp_path, path)
+    return encoder.count
+
+
+def convert_jsonl(src, dst):
+    """JSONLのセッションログを列指向の形式に変換し、件数を返す
+
+    to_jsonlで元のファイルと同じバイト列に戻せる（末尾の改行の有無を除く）。
+    """
+    with open(src, encoding="utf-8", newline="") as f:
+        return write_columnar_log(dst, (line.rstrip("\n") for line in f))
+
+
+def convert_log_dir(log_dir="data/logs", out_dir="data/logs_columnar"):
+    """ディレクトリ内のJSONLログのうち、変換後のファイルより新しいものを変換し、変換した件数を返す"""
+    os.makedirs(out_dir, exist_ok=True)
+    converted = 0
+    with os.scandir(log_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") or not entry.is_file():
+                continue
+            dst = os.path.join(out_dir, entry.name[:-len(".json")] + COLUMNAR_SUFFIX)
+            if os.path.exists(dst) and os.path.getmtime(dst) >= entry.stat().st_mtime:
+                continue
+            convert_jsonl(entry.path, dst)
+            converted += 1
+    return converted
+
+
+class ColumnarLog:
+    """列指向形式のセッションログを読む
+
+    ファイルはメモリマップし、列はコピーせずにNumPy配列として参照する。
+    records()は指定した項目だけを辞書に展開するので、使わない列は読まれない。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version = HEADER.unpack_from(self._data)
+        footer_length, trailer_magic = TRAILER.unpack_from(self._data, len(self._data) - TRAILER.size)
+        if magic != MAGIC or trailer_magic != MAGIC or version != VERSION:
+            raise ValueError(f"列指向のセッションログではありません: {path}")
+        end = len(self._data) - TRAILER.size
+        footer = json.loads(bytes(self._data[end - footer_length:end]).decode("utf-8"))
+        self.count = footer["count"]
+        self.labels = footer["labels"]
+        self.key_orders = [tuple(keys) for keys in footer["key_orders"]]
+        self.raw_lines = footer["raw_lines"]
+        self._offsets = footer["columns"]
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._data = None
+
+    def column(self, name):
+        """列をNumPy配列で返す（状態の列は (件数, 状態項目数)）"""
+        dtype, width = COLUMNS[name]
+        start = self._offsets[name]
+        values = self._data[start:start + self.count * width * np.dtype(dtype).itemsize].view(dtype)
+        return values.reshape(self.count, width) if width > 1 else values
+
+    def columns(self, names):
+        return {name: self.column(name) for name in names}
+
+    def records(self, fields=None, start=0):
+        """start件目以降を辞書で返す
+
+        RAW_LINEの行は元の行をJSONとして読み、JSONとして読めない行はNoneを返す。
+        fields: 返す項目（省略時はすべて）。typeは常に含む
+        """
+        needed = {"kind", "label"}
+        for field in fields if fields is not None else _FIELD_COLUMNS:
+            needed.update(_FIELD_COLUMNS.get(field, ()))
+        columns = {name: self.column(name)[start:].tolist() for name in needed}
+        for i in range(self.count - start):
+            yield self._record(columns, i, fields)
+
+    def _record(self, columns, i, fields):
+        kind = columns["kind"][i]
+        if kind == RAW_LINE:
+            try:
+                entry = json.loads(self.raw_lines[columns["label"][i]])
+            except ValueError:
+                return None
+            if fields is not None and isinstance(entry, dict):
+                entry = {k: v for k, v in entry.items() if k == "type" or k in fields}
+            return entry
+
+        entry = {}
+        label = self.labels[columns["label"][i]] if kind in _LABEL_FIELDS else None
+        for field in RECORD_FIELDS[kind]:
+            if fields is not None and field != "type" and field not in fields:
+                continue
+            if field == "type":
+                entry[field] = _KIND_NAMES[kind]
+            elif field == "timestamp":
+                entry[field] = _timestamp(columns["timestamp"][i])
+            elif field in ("turn", "success_rate"):
+                entry[field] = columns[field][i]
+            elif field == "success":
+                entry[field] = bool(columns["success"][i])
+            elif field in ("effect", "state_changes"):
+                entry[field] = self._state(columns["delta_keys"][i], columns["delta"][i])
+            elif field in ("state_after", "state"):
+                entry[field] = self._state(columns["state_keys"][i], columns["state"][i])
+            else:
+                entry[field] = label[_LABEL_FIELDS[kind].index(field)]
+        return entry
+
+    def _state(self, keys, values):
+        return {field: values[_FIELD_INDEX[field]] for field in self.key_orders[keys]}
+
+    def lines(self):
+        """元のJSONLの行（改行なし）を順に返す"""
+        kinds = self.column("kind").tolist()
+        labels = self.column("label").tolist()
+        records = self.records()
+        for kind, label, record in zip(kinds, labels, records):
+            yield self.raw_lines[label] if kind == RAW_LINE else json.dumps(record)
+
+    def to_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for line in self.lines():
+                f.write(line + "\n")
@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def session_topic(session_id):
+    return f"session:{session_id}"
+
+
+def cohort_topic(cohort):
+    return f"cohort:{cohort}"
+
+
+class Subscription:
+    """購読者ごとの上限付き受信キュー
+
+    publish側を待たせないよう、キューが満杯なら最も古いイベントを捨てて数を記録する。
+    次のget()で捨てた件数を {"type": "dropped", "count": n} として先頭に返す。
+    """
+
+    def __init__(self, bus, topics, max_queue=256):
+        self.bus = bus
+        self.topics = tuple(topics)
+        self.max_queue = max_queue
+        self._items = deque()
+        self._dropped = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, topic, event):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._items) >= self.max_queue:
+                self._items.popleft()
+                self._dropped += 1
+            self._items.append((topic, event))
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """溜まったイベントを (トピック, イベント) のリストでまとめて返す（タイムアウト時は空）"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._dropped or self._closed, timeout)
+            items = list(self._items)
+            self._items.clear()
+            if self._dropped:
+                items.insert(0, (None, {"type": "dropped", "count": self._dropped}))
+                self._dropped = 0
+            return items
+
+    def close(self):
+        """購読を解除する（待機中のget()は空で戻る）"""
+        self.bus.unsubscribe(self)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class EventBus:
+    """トピックごとにイベントを購読者へ配信するプロセス内のバス
+
+    トピックはセッション単位（session:<ID>）とコホート単位（cohort:<名前>）。
+    複数のトピックに一致する購読者にも1回だけ配信する。
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # トピック: 購読者の集合
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, max_queue=256):
+        subscription = Subscription(self, topics, max_queue)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topics, event):
+        """イベントを配信し、配信した購読者数を返す"""
+        delivered = {}
+        with self._lock:
+            for topic in topics:
+                for subscription in self._subscribers.get(topic, ()):
+                    delivered.setdefault(subscription, topic)
+        for subscription, topic in delivered.items():
+            subscription.put(topic, event)
+        return len(delivered)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "topics": len(self._subscribers),
+                "subscriptions": len(set().union(*self._subscribers.values())),
+            }
+
+
+class PublishingLogSink:
+    """ログシンクへの書き込みをそのままイベントバスにも配信するシンク
+
+    セッションのトピックに加え、set_cohortで登録したコホートのトピックにも配信する。
+    コホートはシミュレータのスナップショットにも保存し、別のワーカーで再開したときに登録し直す。
+    登録はclose_sessionのほか、ttl秒配信がなければ削除する
+    （close_sessionが呼ばれないまま期限切れになったセッションの分が残らないようにする）。
+    sinkがNoneならファイルには書き込まず配信のみ行う。
+    """
+
+    def __init__(self, sink, bus, ttl=7200, clock=time.monotonic):
+        self.sink = sink
+        self.bus = bus
+        self.ttl = ttl
+        self.clock = clock
+        self._cohorts = OrderedDict()  # セッションID: [コホート, 最後に使った時刻]（古い順）
+        self._lock = threading.Lock()
+
+    def set_cohort(self, session_id, cohort):
+        with self._lock:
+            if cohort:
+                self._cohorts[session_id] = [cohort, self.clock()]
+                self._cohorts.move_to_end(session_id)
+            else:
+                self._cohorts.pop(session_id, None)
+            self._expire()
+
+    def topics(self, session_id):
+        with self._lock:
+            self._expire()
+            entry = self._cohorts.get(session_id)
+            if entry is not None:
+                entry[1] = self.clock()
+                self._cohorts.move_to_end(session_id)
+        if entry is None:
+            return [session_topic(session_id)]
+        return [session_topic(session_id), cohort_topic(entry[0])]
+
+    def _expire(self):
+        deadline = self.clock() - self.ttl
+        while self._cohorts:
+            session_id, (_, last_used) = next(iter(self._cohorts.items()))
+            if last_used > deadline:
+                break
+            del self._cohorts[session_id]
+
+    def write(self, session_id, event_data):
+        if self.sink is not None:
+            self.sink.write(session_id, event_data)
+        self.bus.publish(self.topics(session_id), dict(event_data, session_id=session_id))
+
+    def flush(self, session_id=None, wait=True):
+        if self.sink is not None:
+            self.sink.flush(session_id, wait=wait)
+
+    def close_session(self, session_id, wait=True):
+        with self._lock:
+            self._cohorts.pop(session_id, None)
+        if self.sink is not None:
+            self.sink.close_session(session_id, wait=wait)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+def format_sse(topic, event):
+    """Server-Sent Eventsの1件分の文字列（トピックはtopicキーに入れる）"""
+    if topic:
+        event = dict(event, topic=topic)
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
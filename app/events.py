@@ -1,33 +1,35 @@
-import csv
 import random
+import numpy as np
+from app.catalog import Record, ScenarioCatalog, load_scenario_catalog
+
+# イベントがない場合のデフォルトイベント（全セッションで共有する読み取り専用レコード）
+DEFAULT_EVENT = Record({
+    "id": "E000",
+    "name": "Default Event",
+    "category": "Default",
+    "description": "Default event due to loading failure",
+    "cpu_effect": 10,
+    "memory_effect": 10,
+    "disk_effect": 0,
+    "network_effect": 0,
+    "service_effect": 0,
+    "alert_effect": 1,
+    "sla_risk_effect": 5
+})
 
 class EventManager:
-    def __init__(self, scenarios_file="data/scenarios.csv"):
-        self.scenarios = []
-        self.events = []
+    def __init__(self, scenarios_file="data/scenarios.csv", rng=None):
+        self.rng = rng if rng is not None else random  # random/choice/sampleを持つ乱数源
         self.load_scenarios(scenarios_file)
 
     def load_scenarios(self, file_path):
-        """CSVファイルからシナリオデータを読み込む"""
+        """シナリオファイルのカタログを読み込む（同じファイルはプロセス内で共有）"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # 数値型の変換
-                    for field in ['initial_cpu', 'initial_memory', 'initial_disk',
-                                 'initial_network', 'initial_services']:
-                        if field in row:
-                            row[field] = int(row[field])
-
-                    # シナリオとイベントを分ける
-                    if row.get('id', '').startswith('S'):
-                        self.scenarios.append(row)
-                    else:
-                        self.events.append(row)
+            self.catalog = load_scenario_catalog(file_path)
         except Exception as e:
             print(f"シナリオデータの読み込みに失敗しました: {e}")
             # デフォルトのシナリオを追加
-            self.scenarios = [{
+            self.catalog = ScenarioCatalog([Record({
                 "id": "S001",
                 "name": "Webサーバ過負荷",
                 "category": "アプリケーション障害",
@@ -38,8 +40,7 @@ class EventManager:
                 "initial_network": 75,
                 "initial_services": 5,
                 "difficulty": "NORMAL"
-            }]
-            self.events = [{
+            })], [Record({
                 "id": "E001",
                 "name": "メモリリーク検知",
                 "category": "アプリケーション障害",
@@ -51,14 +52,17 @@ class EventManager:
                 "service_effect": 0,
                 "alert_effect": 2,
                 "sla_risk_effect": 10
-            }]
+            })])
+        self.scenarios = self.catalog.scenarios.records
+        self.events = self.catalog.events.records
 
     def get_scenario_by_id(self, scenario_id):
         """IDによるシナリオの取得"""
-        for scenario in self.scenarios:
-            if scenario['id'] == scenario_id:
-                return scenario
-        return None
+        return self.catalog.scenarios.get(scenario_id)
+
+    def get_scenarios_by_category(self, category):
+        """カテゴリによるシナリオの取得"""
+        return list(self.catalog.scenarios.find("category", category))
 
     def get_random_scenario(self):
         """ランダムなシナリオを取得"""
@@ -75,37 +79,25 @@ class EventManager:
                 "initial_services": 5,
                 "difficulty": "NORMAL"
             }
-        return random.choice(self.scenarios)
+        return self.rng.choice(self.scenarios)
 
-    def get_random_event(self):
-        """ランダムなイベントを取得"""
+    def event_probabilities(self, scenario=None):
+        """シナリオでの各イベントの発生確率（イベントがなければデフォルトイベントのみ）"""
         if not self.events:
-            # イベントがない場合、デフォルトイベントを返す
-            return {
-                "id": "E000",
-                "name": "Default Event",
-                "category": "Default",
-                "description": "Default event due to loading failure",
-                "cpu_effect": 10,
-                "memory_effect": 10,
-                "disk_effect": 0,
-                "network_effect": 0,
-                "service_effect": 0,
-                "alert_effect": 1,
-                "sla_risk_effect": 5
-            }
+            return np.ones(1)
+        return self.catalog.event_table(scenario).probabilities
 
-        # 実際のイベントからランダム選択
-        event = random.choice(self.events)
+    def sample_event_indices(self, rng, size, scenario=None):
+        """イベントのインデックスを配列でまとめて引く（rngはRandomStreamまたはGenerator）"""
+        if not self.events:
+            return np.zeros(size, dtype=np.int64)
+        return self.catalog.event_table(scenario).sample_indices(rng, size)
 
-        # 数値型の変換
-        for field in ['cpu_effect', 'memory_effect', 'disk_effect',
-                     'network_effect', 'service_effect', 'alert_effect',
-                     'sla_risk_effect']:
-            if field in event and event[field]:
-                try:
-                    event[field] = int(event[field])
-                except (ValueError, TypeError):
-                    event[field] = 0
+    def get_random_event(self, scenario=None):
+        """ランダムなイベントを取得（scenarioを渡すとそのシナリオのイベント重みで選ぶ）"""
+        if not self.events:
+            # イベントがない場合、デフォルトイベントを返す
+            return DEFAULT_EVENT
 
-        return event
\ No newline at end of file
+        # 実際のイベントから重み付きで選択（効果はカタログ読み込み時に数値化済み）
+        return self.events[self.catalog.event_table(scenario).sample(self.rng)]
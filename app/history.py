@@ -0,0 +1,189 @@
+import base64
+import datetime
+import struct
+from app.events import DEFAULT_EVENT
+from app.state import STATE_FIELDS
+
+# 1件分の固定長レコード:
+# 種類, 成否, ターン, カタログ上の位置（RAWは退避先の位置）, a・bの項目マスク,
+# 時刻（エポックからのマイクロ秒）, 成功確率, 状態項目a×7, 状態項目b×7
+RECORD = struct.Struct("<BBHHBBqd7h7h")
+SCENARIO_START, EVENT, ACTION, CRITICAL_STATE, RAW = range(5)
+DEFAULT_EVENT_REF = 0xFFFF  # カタログ外のデフォルトイベント
+
+ALL_FIELDS = (1 << len(STATE_FIELDS)) - 1
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_SHORT_RANGE = range(-32768, 32768)
+
+# シミュレータが記録するイベントの種類と項目（記録される順）
+RECORD_FIELDS = {
+    SCENARIO_START: ("type", "scenario_id", "scenario_name", "description", "timestamp"),
+    EVENT: ("type", "turn", "event_id", "event_name", "description", "effect", "timestamp"),
+    ACTION: ("type", "turn", "action_id", "action_name", "success", "success_rate",
+             "state_changes", "state_after", "timestamp"),
+    CRITICAL_STATE: ("type", "turn", "state", "timestamp"),
+}
+RECORD_KINDS = {"scenario_start": SCENARIO_START, "event": EVENT, "action": ACTION,
+                "critical_state": CRITICAL_STATE}
+_KEYS = {kind: set(fields) for kind, fields in RECORD_FIELDS.items()}
+
+
+def _pack_fields(values):
+    """状態項目の辞書を (マスク, 7項目の値) に変換（表せなければNone）"""
+    mask, packed = 0, [0] * len(STATE_FIELDS)
+    for i, field in enumerate(STATE_FIELDS):
+        if field in values:
+            value = values[field]
+            if type(value) is not int or value not in _SHORT_RANGE:
+                return None
+            mask |= 1 << i
+            packed[i] = value
+    if len(values) != bin(mask).count("1"):
+        return None
+    return mask, packed
+
+
+def _unpack_fields(mask, packed):
+    return {field: packed[i] for i, field in enumerate(STATE_FIELDS) if mask >> i & 1}
+
+
+class CompactHistory:
+    """イベント履歴を固定長のバイナリレコードで保持するリスト互換のコンテナ
+
+    シナリオ・イベント・アクションはカタログ上の位置、状態は16bit整数、時刻は整数で持ち、
+    参照したときだけ元の辞書に展開する。カタログにない・形式の異なるイベントはそのまま保持する。
+    状態項目の辞書は展開時にSTATE_FIELDSの順になる。
+    """
+
+    def __init__(self, scenario_catalog, action_catalog, events=()):
+        self.scenario_catalog = scenario_catalog
+        self.action_catalog = action_catalog
+        self._data = bytearray()
+        self._raw = []  # RAWレコードの辞書
+        for event_data in events:
+            self.append(event_data)
+
+    def __len__(self):
+        return len(self._data) // RECORD.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("履歴の範囲外です")
+        return self._expand(RECORD.unpack_from(self._data, index * RECORD.size))
+
+    def __iter__(self):
+        for values in RECORD.iter_unpack(self._data):
+            yield self._expand(values)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactHistory, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CompactHistory({list(self)!r})"
+
+    def append(self, event_data):
+        record = self._pack(event_data)
+        if record is None:
+            self._raw.append(event_data)
+            record = (RAW, 0, 0, len(self._raw) - 1, 0, 0, 0, 0.0) + (0,) * 14
+        self._data += RECORD.pack(*record)
+
+    def clear(self):
+        self._data = bytearray()
+        self._raw = []
+
+    def dump(self):
+        """スナップショットに埋め込む形式（レコード列のBase64とRAWレコード）に変換"""
+        return {"records": base64.b64encode(self._data).decode("ascii"), "raw": self._raw}
+
+    @classmethod
+    def load(cls, scenario_catalog, action_catalog, data):
+        """dumpの結果から復元"""
+        history = cls(scenario_catalog, action_catalog)
+        history._data = bytearray(base64.b64decode(data["records"]))
+        history._raw = list(data["raw"])
+        return history
+
+    def _pack(self, event_data):
+        kind = RECORD_KINDS.get(event_data.get("type"))
+        if kind is None or set(event_data) != _KEYS[kind]:
+            return None
+        try:
+            timestamp = datetime.datetime.fromisoformat(event_data["timestamp"])
+        except (TypeError, ValueError):
+            return None
+        if timestamp.tzinfo is not None:
+            return None
+        micros = (timestamp - _EPOCH) // _MICROSECOND
+        turn = event_data.get("turn", 0)
+        if type(turn) is not int or not 0 <= turn < 65536:
+            return None
+
+        success, rate, ref = 0, 0.0, 0
+        a, b = (0, [0] * len(STATE_FIELDS)), (0, [0] * len(STATE_FIELDS))
+        if kind == SCENARIO_START:
+            ref = self._position(self.scenario_catalog.scenarios, event_data["scenario_id"],
+                                 event_data["scenario_name"], event_data["description"])
+        elif kind == EVENT:
+            ref = self._position(self.scenario_catalog.events, event_data["event_id"],
+                                 event_data["event_name"], event_data["description"])
+            a = _pack_fields(event_data["effect"])
+        elif kind == ACTION:
+            ref = self._position(self.action_catalog.actions, event_data["action_id"],
+                                 event_data["action_name"])
+            if type(event_data["success"]) is not bool or type(event_data["success_rate"]) is not float:
+                return None
+            success, rate = int(event_data["success"]), event_data["success_rate"]
+            a = _pack_fields(event_data["state_changes"])
+            b = _pack_fields(event_data["state_after"])
+        else:
+            b = _pack_fields(event_data["state"])
+        if ref is None or a is None or b is None:
+            return None
+        return (kind, success, turn, ref, a[0], b[0], micros, rate, *a[1], *b[1])
+
+    def _position(self, catalog, record_id, name, description=None):
+        # カタログと名前・説明が一致する場合だけ位置で持つ
+        position = catalog.positions.get(record_id)
+        if position is not None:
+            record = catalog.records[position]
+        elif catalog is self.scenario_catalog.events and record_id == DEFAULT_EVENT["id"]:
+            position, record = DEFAULT_EVENT_REF, DEFAULT_EVENT
+        else:
+            return None
+        if record.get("name") != name or (description is not None and
+                                          record.get("description") != description):
+            return None
+        return position
+
+    def _expand(self, values):
+        kind, success, turn, ref, mask_a, mask_b, micros, rate = values[:8]
+        if kind == RAW:
+            return self._raw[ref]
+        a, b = values[8:15], values[15:]
+        timestamp = (_EPOCH + micros * _MICROSECOND).isoformat()
+        if kind == SCENARIO_START:
+            scenario = self.scenario_catalog.scenarios.records[ref]
+            return {"type": "scenario_start", "scenario_id": scenario["id"],
+                    "scenario_name": scenario["name"], "description": scenario["description"],
+                    "timestamp": timestamp}
+        if kind == EVENT:
+            event = DEFAULT_EVENT if ref == DEFAULT_EVENT_REF else self.scenario_catalog.events.records[ref]
+            return {"type": "event", "turn": turn, "event_id": event["id"],
+                    "event_name": event["name"], "description": event["description"],
+                    "effect": _unpack_fields(mask_a, a), "timestamp": timestamp}
+        if kind == ACTION:
+            action = self.action_catalog.actions.records[ref]
+            return {"type": "action", "turn": turn, "action_id": action["id"],
+                    "action_name": action["name"], "success": bool(success),
+                    "success_rate": rate, "state_changes": _unpack_fields(mask_a, a),
+                    "state_after": _unpack_fields(mask_b, b), "timestamp": timestamp}
+        return {"type": "critical_state", "turn": turn, "state": _unpack_fields(mask_b, b),
+                "timestamp": timestamp}
@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import threading
+import time
+
+# セグメントはログディレクトリの下に置く（ログの集計は直下の *.json だけを読む）
+SEGMENT_DIR = "segments"
+INDEX_FILE = "index.sqlite3"
+
+
+def segment_dir_for(log_dir):
+    return os.path.join(log_dir, SEGMENT_DIR)
+
+
+class SegmentStore:
+    """セッションごとのログファイルを時間単位のセグメントファイルにまとめて保存する
+
+    セグメントはセッションログの行をそのまま連結したJSONLで、
+    索引（SQLite）にセッションIDごとの (セグメント, 位置, 長さ) を持つので任意のセッションを直接読める。
+    セッションの最終更新時刻の日（bucket_format）ごとにまとめ、max_segment_bytesを超えたら次のファイルにする。
+
+    compactは最終更新からidle_seconds秒たったファイルだけを移すので、Webサーバの実行中でもよい
+    （セッションの有効期限以上にしておけば、書き込み中のファイルは対象にならない）。
+    索引の更新はSQLiteの書き込みロックの中で行い、索引に登録してから元のファイルを消すため、
+    途中で止まっても、同時に複数実行しても、ログが失われたり二重に登録されたりしない。
+    """
+
+    def __init__(self, segment_dir="data/logs/segments", max_segment_bytes=64 * 1024 * 1024,
+                 bucket_format="%Y%m%d"):
+        self.segment_dir = segment_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.bucket_format = bucket_format
+        self._local = threading.local()  # スレッドごとの接続
+        os.makedirs(segment_dir, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS segments "
+            "(name TEXT PRIMARY KEY, bucket TEXT NOT NULL, size INTEGER NOT NULL, "
+            "newest REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS chunks "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+            "segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, "
+            "source_size INTEGER NOT NULL, source_mtime_ns INTEGER NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS chunks_session ON chunks (session_id)")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self.segment_dir, INDEX_FILE), timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def locate(self, session_id):
+        """セッションのログの場所 [(セグメント, 位置, 長さ)]（古い順）"""
+        return self._connection().execute(
+            "SELECT segment, offset, length FROM chunks WHERE session_id = ? ORDER BY id",
+            (session_id,)
+        ).fetchall()
+
+    def read_session(self, session_id):
+        """セグメントに移したセッションのログをバイト列で返す（なければ空）"""
+        parts = []
+        for segment, offset, length in self.locate(session_id):
+            with open(os.path.join(self.segment_dir, segment), "rb") as f:
+                f.seek(offset)
+                parts.append(f.read(length))
+        return b"".join(parts)
+
+    def new_chunks(self, after=0):
+        """チャンクIDがafterより大きい登録 [(チャンクID, セッションID, セグメント, 位置, 長さ)]"""
+        return self._connection().execute(
+            "SELECT id, session_id, segment, offset, length FROM chunks WHERE id > ? ORDER BY id",
+            (after,)
+        ).fetchall()
+
+    def sessions(self):
+        return [row[0] for row in self._connection().execute(
+            "SELECT DISTINCT session_id FROM chunks ORDER BY session_id")]
+
+    def stats(self):
+        segments, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM segments").fetchone()
+        sessions = self._connection().execute(
+            "SELECT COUNT(DISTINCT session_id) FROM chunks").fetchone()[0]
+        return {"segments": segments, "bytes": total, "sessions": sessions}
+
+    def compact(self, log_dir="data/logs", idle_seconds=7200, batch_size=500, now=None):
+        """最終更新からidle_seconds秒たったセッションログをセグメントに移し、移したファイル数を返す"""
+        now = time.time() if now is None else now
+        candidates = []
+        with os.scandir(log_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                mtime = entry.stat().st_mtime
+                if now - mtime >= idle_seconds:
+                    candidates.append((mtime, entry.name))
+        candidates.sort()
+
+        moved = 0
+        for start in range(0, len(candidates), batch_size):
+            names = [name for _, name in candidates[start:start + batch_size]]
+            moved += self._compact_batch(log_dir, names)
+        return moved
+
+    def _compact_batch(self, log_dir, names):
+        connection = self._connection()
+        handles = {}  # セグメント名: ファイル
+        registered = []  # (元のファイル, 登録時のstat, チャンクID)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for name in names:
+                path = os.path.join(log_dir, name)
+                try:
+                    before = os.stat(path)
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    if _changed(before, os.stat(path)):
+                        continue  # 読んでいる間に書き込まれた
+                except FileNotFoundError:
+                    continue  # 別の実行が移した
+
+                session_id = name[:-len(".json")]
+                row = connection.execute(
+                    "SELECT id FROM chunks WHERE session_id = ? AND source_size = ? "
+                    "AND source_mtime_ns = ?", (session_id, before.st_size, before.st_mtime_ns)
+                ).fetchone()
+                if row is not None:
+                    registered.append((path, before, row[0]))  # 登録済みで消す前に止まった
+                    continue
+                if data and not data.endswith(b"\n"):
+                    data += b"\n"
+
+                bucket = time.strftime(self.bucket_format, time.localtime(before.st_mtime))
+                segment, offset = self._segment_for(bucket, len(data))
+                f = handles.get(segment)
+                if f is None:
+                    f = handles[segment] = self._open_segment(segment, offset)
+                f.seek(offset)
+                f.write(data)
+                connection.execute(
+                    "UPDATE segments SET size = size + ?, newest = MAX(newest, ?) WHERE name = ?",
+                    (len(data), before.st_mtime, segment)
+                )
+                cursor = connection.execute(
+                    "INSERT INTO chunks (session_id, segment, offset, length, source_size, "
+                    "source_mtime_ns) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, segment, offset, len(data), before.st_size, before.st_mtime_ns)
+                )
+                registered.append((path, before, cursor.lastrowid))
+
+            for f in handles.values():
+                f.flush()
+                os.fsync(f.fileno())
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            for f in handles.values():
+                f.close()
+
+        # 索引に登録した後で書き込まれたファイルは消さず、登録を取り消す（次回まとめて移す）
+        moved = 0
+        for path, before, chunk_id in registered:
+            try:
+                if _changed(before, os.stat(path)):
+                    connection.execute("DELETE FROM chunks WHERE id = ?", (chunk_id,))
+                    continue
+                os.remove(path)
+                moved += 1
+            except FileNotFoundError:
+                pass
+        return moved
+
+    def _segment_for(self, bucket, length):
+        """書き込み先のセグメントと位置（上限を超えるなら次のセグメントを作る）"""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT name, size FROM segments WHERE bucket = ? ORDER BY name DESC LIMIT 1", (bucket,)
+        ).fetchone()
+        if row is not None and (row[1] == 0 or row[1] + length <= self.max_segment_bytes):
+            return row
+        number = 0 if row is None else int(row[0].rsplit("-", 1)[1].split(".")[0]) + 1
+        name = f"{bucket}-{number:04d}.jsonl"
+        connection.execute("INSERT INTO segments (name, bucket, size, newest) VALUES (?, ?, 0, 0)",
+                           (name, bucket))
+        return name, 0
+
+    def _open_segment(self, segment, size):
+        # 前回の実行が索引の更新前に止まった場合の書きかけを切り詰める
+        path = os.path.join(self.segment_dir, segment)
+        f = open(path, "r+b" if os.path.exists(path) else "w+b")
+        f.truncate(size)
+        return f
+
+    def apply_retention(self, retention_days=None, max_total_bytes=None, now=None):
+        """保存期間を過ぎたセグメントと、合計がmax_total_bytesを超えた分の古いセグメントを削除し、
+        削除したセグメント数を返す"""
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            segments = connection.execute(
+                "SELECT name, size, newest FROM segments ORDER BY newest, name").fetchall()
+            total = sum(size for _, size, _ in segments)
+            removed = []
+            for name, size, newest in segments:
+                expired = retention_days is not None and newest < now - retention_days * 86400
+                if not expired and (max_total_bytes is None or total <= max_total_bytes):
+                    break
+                removed.append(name)
+                total -= size
+            for name in removed:
+                connection.execute("DELETE FROM chunks WHERE segment = ?", (name,))
+                connection.execute("DELETE FROM segments WHERE name = ?", (name,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        for name in removed:
+            try:
+                os.remove(os.path.join(self.segment_dir, name))
+            except FileNotFoundError:
+                pass
+        return len(removed)
+
+
+def _changed(before, after):
+    return (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns)
+
+
+def read_session_log(log_dir, session_id):
+    """セッションのログ全体（セグメントに移した分 + 個別のファイルに残っている分）をバイト列で返す"""
+    data = b""
+    segment_dir = segment_dir_for(log_dir)
+    if os.path.exists(os.path.join(segment_dir, INDEX_FILE)):
+        store = SegmentStore(segment_dir)
+        try:
+            data = store.read_session(session_id)
+        finally:
+            store.close()
+    try:
+        with open(os.path.join(log_dir, f"{session_id}.json"), "rb") as f:
+            data += f.read()
+    except FileNotFoundError:
+        pass
+    return data
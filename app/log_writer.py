@@ -0,0 +1,208 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.metrics import LOG_WRITE_SECONDS
+
+# flush時にどこまで書き出すか
+# none: Pythonのバッファに任せる / flush: OSに渡す / fsync: ディスクまで同期する
+DURABILITY_POLICIES = ("none", "flush", "fsync")
+
+# キューに積む要素の種類
+_WRITE, _FLUSH, _CLOSE_SESSION, _STOP = range(4)
+
+# 完了を待つ間に書き込みスレッドの生存を確認する間隔（秒）
+_WAIT_INTERVAL = 1.0
+
+
+def new_session_id(now=None):
+    """衝突しないセッションIDを作成（日時 + ランダムな接尾辞）"""
+    now = now or datetime.datetime.now()
+    return f"{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+class BufferedLogSink:
+    """セッションログをバックグラウンドスレッドでまとめて書き込むシンク
+
+    write()はJSONに変換して上限付きキューに積むだけで戻る（満杯なら空くまで待つ）。
+    書き込みスレッドは溜まった分をまとめて取り出し、セッションごとに1回の書き込みにする。
+    ファイルはセッションごとに開いたままにし、max_open_filesを超えたら古いものから閉じる。
+    flush()の時点でdurabilityに従って書き出す。
+
+    シンクとして使うオブジェクトは write / flush / close_session / close を持てばよい。
+    """
+
+    def __init__(self, log_dir="data/logs", durability="flush", max_queue=10000,
+                 max_open_files=64):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"不明なdurabilityです: {durability}")
+        self.log_dir = log_dir
+        self.durability = durability
+        self.max_open_files = max_open_files
+        self._queue = queue.Queue(max_queue)
+        self._files = OrderedDict()  # セッションID: ファイル（最近使った順）
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, session_id, event_data):
+        """イベントをセッションのログに追記する（書き込みは非同期）"""
+        self._queue.put((_WRITE, session_id, json.dumps(event_data)))
+
+    def flush(self, session_id=None, wait=True):
+        """キューに積まれた分を書き込み、durabilityを適用（session_id省略時は全セッション）"""
+        self._request(_FLUSH, session_id, wait)
+
+    def close_session(self, session_id, wait=True):
+        """セッションのログを書き出してファイルを閉じる"""
+        self._request(_CLOSE_SESSION, session_id, wait)
+
+    def close(self):
+        """すべて書き出して書き込みスレッドを終了する"""
+        if self._closed:
+            return
+        self._closed = True
+        self._request(_STOP, None, True)
+        self._thread.join()
+
+    def _request(self, kind, session_id, wait):
+        done = threading.Event()
+        self._queue.put((kind, session_id, done))
+        if not wait:
+            return
+        # 書き込みスレッドが止まっていれば完了を待たない
+        while not done.wait(_WAIT_INTERVAL):
+            if not self._thread.is_alive():
+                return
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._process(items)
+            except Exception as e:
+                print(f"ログの書き込みに失敗しました: {e}")
+            finally:
+                # 途中で失敗したまとまりでも、完了を待っている呼び出し元を起こす
+                for kind, _, payload in items:
+                    if kind != _WRITE:
+                        payload.set()
+            if any(kind == _STOP for kind, _, _ in items):
+                return
+
+    def _process(self, items):
+        pending = {}  # セッションID: 行のリスト
+        for kind, session_id, payload in items:
+            if kind == _WRITE:
+                pending.setdefault(session_id, []).append(payload)
+                continue
+
+            self._write_pending(pending)
+            pending = {}
+            if kind == _FLUSH:
+                self._sync(session_id)
+            elif kind == _CLOSE_SESSION:
+                self._close_file(session_id)
+            else:
+                for open_session in list(self._files):
+                    self._close_file(open_session)
+                return
+            payload.set()
+        self._write_pending(pending)
+
+    def _write_pending(self, pending):
+        if not pending:
+            return
+        started = time.perf_counter()
+        for session_id, lines in pending.items():
+            try:
+                self._file(session_id).write("\n".join(lines) + "\n")
+            except Exception as e:
+                print(f"ログの書き込みに失敗しました: {e}")
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - started, "write")
+
+    def _file(self, session_id):
+        f = self._files.get(session_id)
+        if f is not None:
+            self._files.move_to_end(session_id)
+            return f
+        if len(self._files) >= self.max_open_files:
+            self._close_file(next(iter(self._files)))
+        f = open(os.path.join(self.log_dir, f"{session_id}.json"), 'a', encoding='utf-8')
+        self._files[session_id] = f
+        return f
+
+    def _sync(self, session_id=None):
+        if self.durability == "none":
+            return
+        sessions = list(self._files) if session_id is None else [session_id]
+        started = time.perf_counter()
+        for session in sessions:
+            f = self._files.get(session)
+            if f is None:
+                continue
+            try:
+                f.flush()
+                if self.durability == "fsync":
+                    os.fsync(f.fileno())
+            except Exception as e:
+                print(f"ログの書き込みに失敗しました: {e}")
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - started, self.durability)
+
+    def _close_file(self, session_id):
+        f = self._files.pop(session_id, None)
+        if f is None:
+            return
+        try:
+            if self.durability == "fsync":
+                f.flush()
+                os.fsync(f.fileno())
+            f.close()
+        except Exception as e:
+            print(f"ログの書き込みに失敗しました: {e}")
+
+
+# ログディレクトリごとに共有するシンク
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_log_sink(log_dir="data/logs"):
+    """ログディレクトリの共有シンクを取得（初回に作成）"""
+    with _sinks_lock:
+        sink = _sinks.get(log_dir)
+        if sink is None:
+            sink = _sinks[log_dir] = BufferedLogSink(log_dir)
+        return sink
+
+
+@atexit.register
+def close_log_sinks():
+    """共有シンクをすべて書き出して閉じる"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
+
+
+def _reset_after_fork():
+    # 子プロセスには書き込みスレッドが引き継がれないため作り直させる
+    global _sinks_lock
+    _sinks.clear()
+    _sinks_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
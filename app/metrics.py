@@ -0,0 +1,283 @@
+import functools
+import itertools
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+# レイテンシ用のバケット（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FAST_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 0.1, 1)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+class _ShardOwner:
+    """スレッドローカルに置き、スレッドの終了時に破棄されるオブジェクト"""
+
+
+class _ThreadShards:
+    """スレッドごとの集計用dict
+
+    記録時は自スレッドのdictだけを更新するためロックを取らない。
+    スレッドが終了するとスレッドローカルが破棄されるので、そのdictを終了済みの合計に畳み込んで外す
+    （リクエストごとにスレッドを作るサーバでもdictの数は生存中のスレッド数に収まる）。
+    収集時は終了済みの合計と生存中のスレッドのdictを合算する。
+    merge(合計のdict, ラベルの組, 値): 値を合計に加える（合計の値は置き換え、書き換えない）
+    """
+
+    def __init__(self, merge):
+        self._merge = merge
+        self._local = threading.local()
+        self._shards = {}  # 生存中のスレッドのdict（登録順の番号: dict）
+        self._ids = itertools.count()
+        self._finished = {}  # 終了したスレッドの合計
+        self._lock = threading.Lock()  # 登録・畳み込み・収集時のみ使う
+
+    def get(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard, owner = {}, _ShardOwner()
+            with self._lock:
+                shard_id = next(self._ids)
+                self._shards[shard_id] = shard
+            weakref.finalize(owner, self._fold, shard_id)
+            self._local.owner = owner
+            self._local.shard = shard
+        return shard
+
+    def _fold(self, shard_id):
+        with self._lock:
+            shard = self._shards.pop(shard_id)
+            for labels, value in shard.items():
+                self._merge(self._finished, labels, value)
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(self._finished)] + [dict(shard) for shard in self._shards.values()]
+
+    def clear(self):
+        with self._lock:
+            self._finished.clear()
+            for shard in self._shards.values():
+                shard.clear()
+
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        for _, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加するカウンタ"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._shards = _ThreadShards(self._merge)
+
+    @staticmethod
+    def _merge(totals, labels, value):
+        totals[labels] = totals.get(labels, 0) + value
+
+    def inc(self, *labels, amount=1):
+        shard = self._shards.get()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self):
+        """ラベルの組: 合計値"""
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, value in shard.items():
+                self._merge(totals, labels, value)
+        return totals
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self.values().items())]
+
+    def clear(self):
+        self._shards.clear()
+
+
+class Histogram:
+    """上限値を固定したバケットごとの度数を数えるヒストグラム"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _ThreadShards(self._merge)
+
+    @staticmethod
+    def _merge(totals, labels, counts):
+        total = totals.get(labels)
+        totals[labels] = list(counts) if total is None else [a + b for a, b in zip(total, counts)]
+
+    def observe(self, value, *labels):
+        shard = self._shards.get()
+        counts = shard.get(labels)
+        if counts is None:
+            # バケットごとの度数（最後は+Inf）, 合計
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, *labels):
+        """with文のブロックの実行時間を記録する"""
+        return _Timer(self, labels)
+
+    def values(self):
+        """ラベルの組: (累積度数のリスト, 合計)"""
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, counts in shard.items():
+                self._merge(totals, labels, counts)
+        result = {}
+        for labels, counts in totals.items():
+            cumulative, running = [], 0
+            for count in counts[:-1]:
+                running += count
+                cumulative.append(running)
+            result[labels] = (cumulative, counts[-1])
+        return result
+
+    def render(self):
+        lines = []
+        for labels, (cumulative, total) in sorted(self.values().items()):
+            for bound, count in zip(self.buckets + (float("inf"),), cumulative):
+                label_text = _format_labels(self.labelnames, labels, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{label_text} {count}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative[-1]}")
+        return lines
+
+    def clear(self):
+        self._shards.clear()
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def timed(histogram):
+    """関数の実行時間をヒストグラムに記録するデコレータ"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class CallbackMetric:
+    """収集時に関数を呼んで値を得るメトリクス（セッション数など既存の統計の公開用）
+
+    関数は {ラベルの組: 値} か単一の数値を返す。
+    """
+
+    def __init__(self, name, help, kind="gauge", labelnames=(), callback=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self):
+        values = self.callback() if self.callback is not None else {}
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items()) if value is not None]
+
+
+class Registry:
+    """メトリクスをまとめてPrometheusのテキスト形式で出力する"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, callback, kind="gauge", labelnames=()):
+        return self.register(CallbackMetric(name, help, kind, labelnames, callback))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                print(f"メトリクスの収集に失敗しました: {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# プロセス全体で共有するレジストリとシミュレータのメトリクス
+registry = Registry()
+
+TURNS = registry.counter(
+    "simulator_turns_total", "進行したターン数")
+ACTIONS = registry.counter(
+    "simulator_actions_total", "実行したアクション数")
+ACTION_ROLLS = registry.counter(
+    "simulator_action_rolls_total", "アクションの成功判定の回数", ("action_id", "result"))
+NEXT_TURN_SECONDS = registry.histogram(
+    "simulator_next_turn_seconds", "next_turnの処理時間", buckets=FAST_BUCKETS)
+TAKE_ACTION_SECONDS = registry.histogram(
+    "simulator_take_action_seconds", "take_actionの処理時間", buckets=FAST_BUCKETS)
+LOG_EVENT_SECONDS = registry.histogram(
+    "simulator_log_event_seconds", "log_eventでシンクに渡すまでの時間", buckets=FAST_BUCKETS)
+LOG_WRITE_SECONDS = registry.histogram(
+    "log_writer_write_seconds", "書き込みスレッドがまとめてファイルに書き込む時間（同期を含む）",
+    ("operation",))
+PDF_SECONDS = registry.histogram(
+    "report_pdf_seconds", "PDFレポートの作成時間", buckets=SLOW_BUCKETS)
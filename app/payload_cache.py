@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotliがなければgzipのみ
+    brotli = None
+
+# 優先する圧縮方式の順
+ENCODINGS = ("br", "gzip")
+
+
+class SerializedPayload:
+    """シリアライズ済みの応答本文と、そのETag・圧縮版"""
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(body)
+
+    @property
+    def etags(self):
+        """全表現のETag（圧縮版は本文が異なるため別のETagにする）"""
+        return [self.etag] + [f"{self.etag}-{encoding}" for encoding in self.encoded]
+
+    def variant(self, accepted_encodings=()):
+        """受け付け可能な圧縮方式から (圧縮方式またはNone, 本文, ETag) を選ぶ"""
+        for encoding in ENCODINGS:
+            data = self.encoded.get(encoding)
+            if encoding in accepted_encodings and data is not None and len(data) < len(self.body):
+                return encoding, data, f"{self.etag}-{encoding}"
+        return None, self.body, self.etag
+
+
+class PayloadCache:
+    """元データのオブジェクトごとにシリアライズ結果を保持するキャッシュ
+
+    カタログは内容が変わったときだけ別のオブジェクトに置き換わるため、
+    同じオブジェクトである間は前回の結果を返し、変わったら作り直す。
+    """
+
+    def __init__(self):
+        self._entries = {}  # キー: (元データ, SerializedPayload)
+        self._lock = threading.Lock()
+
+    def get(self, key, source, serialize):
+        """sourceをserialize(source)でバイト列にした結果を取得"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is source:
+                return entry[1]
+        payload = SerializedPayload(serialize(source))
+        with self._lock:
+            self._entries[key] = (source, payload)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
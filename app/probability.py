@@ -1,6 +1,125 @@
 import random
+import numpy as np
+from app.state import SystemState
+
+# 成功率補正の閾値バケット
+# cpu: 0=通常, 1=高負荷(>80), 2=低負荷(<40) / memory>85 / disk>90 / services<3 / alerts>7
+CPU_LEVELS = 3
+RATE_BUCKET_COUNT = CPU_LEVELS * 2 * 2 * 2 * 2
+
+
+def rate_bucket(state):
+    """システム状態を成功率補正のバケット番号に変換"""
+    cpu = state.cpu
+    bucket = 1 if cpu > 80 else (2 if cpu < 40 else 0)
+    if state.memory > 85:
+        bucket += 3
+    if state.disk > 90:
+        bucket += 6
+    if state.services < 3:
+        bucket += 12
+    if state.alerts > 7:
+        bucket += 24
+    return bucket
+
+
+def rate_buckets(states):
+    """状態バッチ（SystemStateBatch）のバケット番号を配列で取得"""
+    buckets = np.where(states.cpu > 80, 1, np.where(states.cpu < 40, 2, 0))
+    buckets += (states.memory > 85) * 3
+    buckets += (states.disk > 90) * 6
+    buckets += (states.services < 3) * 12
+    buckets += (states.alerts > 7) * 24
+    return buckets
+
+
+def bucket_state(bucket):
+    """バケットを代表するSystemStateを生成"""
+    state = SystemState()
+    state.cpu = (60, 90, 30)[bucket % CPU_LEVELS]
+    state.memory = 90 if bucket // 3 % 2 else 50
+    state.disk = 95 if bucket // 6 % 2 else 50
+    state.services = 2 if bucket // 12 % 2 else 5
+    state.alerts = 8 if bucket // 24 % 2 else 0
+    return state
+
+
+class SuccessRateTable:
+    """アクションごとの成功率・リスク期待値をバケット単位で事前計算した表
+
+    補正はすべて閾値ベースのため、成功率は状態空間上で区分的に一定となる。
+    各バケットの代表状態でProbabilityEngineを評価して表を作るので、
+    結果は元の計算と完全に一致する。アクションはIDで引く。
+    """
+
+    def __init__(self, actions):
+        self.action_ids = [action["id"] for action in actions]
+        self.index = {action_id: i for i, action_id in enumerate(self.action_ids)}
+        states = [bucket_state(bucket) for bucket in range(RATE_BUCKET_COUNT)]
+        self.rate_table = np.array([
+            [ProbabilityEngine.calculate_success_rate(action, state) for state in states]
+            for action in actions
+        ], dtype=np.float64).reshape(len(actions), RATE_BUCKET_COUNT)
+        self.expectation_table = np.array([
+            [ProbabilityEngine.calculate_risk_expectation(action, state) for state in states]
+            for action in actions
+        ], dtype=np.float64).reshape(len(actions), RATE_BUCKET_COUNT)
+        # スカラー参照用（NumPyのスカラー生成を避ける）
+        self.rates_by_id = {
+            action_id: tuple(self.rate_table[i].tolist())
+            for i, action_id in enumerate(self.action_ids)
+        }
+
+    def __contains__(self, action_id):
+        return action_id in self.rates_by_id
+
+    def rate(self, action_id, state):
+        """1アクション・1状態の成功確率"""
+        return self.rates_by_id[action_id][rate_bucket(state)]
+
+    def rates(self, states, action_indices=None):
+        """状態バッチの成功確率
+
+        action_indicesを省略すると (N, A)、指定すると (N,) を返す。
+        """
+        buckets = rate_buckets(states)
+        if action_indices is None:
+            return self.rate_table[:, buckets].T
+        return self.rate_table[action_indices, buckets]
+
+    def expectations(self, states, action_indices=None):
+        """状態バッチのリスク期待値（形状はratesと同じ）"""
+        buckets = rate_buckets(states)
+        if action_indices is None:
+            return self.expectation_table[:, buckets].T
+        return self.expectation_table[action_indices, buckets]
+
 
 class ProbabilityEngine:
+    def __init__(self, actions=None):
+        """actions（またはSuccessRateTable）を渡すとsuccess_rateが事前計算した表で引くようになる"""
+        self.rate_table = None
+        if actions is not None:
+            self.compile(actions)
+
+    def compile(self, actions):
+        """アクション一覧から成功率表（rate_table）を作成する
+
+        作成済みのSuccessRateTableを渡すとそれを共有する。
+        """
+        if not isinstance(actions, SuccessRateTable):
+            actions = SuccessRateTable(actions)
+        self.rate_table = actions
+        return self.rate_table
+
+    def success_rate(self, action, system_state):
+        """成功確率（成功率表があれば表で引き、表にないアクションは通常計算）"""
+        if self.rate_table is not None:
+            action_id = action.get("id")
+            if action_id in self.rate_table:
+                return self.rate_table.rate(action_id, system_state)
+        return ProbabilityEngine.calculate_success_rate(action, system_state)
+
     @staticmethod
     def calculate_success_rate(action, system_state):
         """システム状態に基づく成功確率計算"""
@@ -47,12 +166,13 @@ class ProbabilityEngine:
         return max(0.1, min(0.99, final_rate))
 
     @staticmethod
-    def roll_success(rate):
+    def roll_success(rate, rng=None):
         """成功判定ロール
         rate: 成功確率 (0.0〜1.0)
+        rng: 乱数源（省略時はrandomモジュール）
         戻り値: 成功(True)または失敗(False)
         """
-        return random.random() < rate
+        return (rng if rng is not None else random).random() < rate
 
     @staticmethod
     def calculate_risk_expectation(action, system_state):
@@ -1,39 +1,98 @@
 import json
 import datetime
+import functools
 import os
+import time
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from app.metrics import PDF_SECONDS
+
+# 表の見出し行と罫線（全レポートで共有する）
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+@functools.lru_cache(maxsize=None)
+def report_styles():
+    """レポートの段落スタイル（プロセスごとに1度だけ作成する）"""
+    styles = getSampleStyleSheet()
+
+    # カスタムスタイル（組み込みの'Title'と衝突しない名前にする）
+    styles.add(ParagraphStyle(
+        name='ReportTitle',
+        fontName='Helvetica-Bold',
+        fontSize=14,
+        alignment=1,
+        spaceAfter=10
+    ))
+    return styles
+
+
+# 順位の表示名
+RANK_LABELS = {"score": "スコア", "turns": "生存ターン数"}
+
 
 class ReportGenerator:
-    def __init__(self, simulator):
+    def __init__(self, simulator, ranks=None):
         self.simulator = simulator
+        self.ranks = ranks  # ScoreRanks（指定時は同じシナリオの全プレイの中での順位を含める）
 
     def generate_summary(self):
         """プレイログからサマリーを生成"""
+        # アクション履歴と集計はシミュレータが記録時に更新したものを使う（履歴は走査しない）
+        summary = self.build_summary(
+            self.simulator.current_scenario, self.simulator.turn,
+            self.simulator.system_state.get_state_dict(), self.simulator.calculate_score(),
+            self.simulator.game_over, self.simulator.running_summary
+        )
+        if self.ranks is not None:
+            summary["ranking"] = self.ranks.ranks(
+                summary["scenario_id"], summary["score"],
+                min(self.simulator.turn, self.simulator.max_turns)
+            )
+        return summary
+
+    @staticmethod
+    def build_summary(scenario, turns_played, final_state, score, game_over, running):
+        """シナリオ・最終状態とSessionSummaryからサマリーを作成（ログから復元する場合も使う）"""
         summary = {
-            "scenario": self.simulator.current_scenario["name"],
-            "scenario_description": self.simulator.current_scenario["description"],
-            "turns_played": self.simulator.turn,
-            "final_state": self.simulator.system_state.get_state_dict(),
-            "score": self.simulator.calculate_score(),
-            "game_over_reason": "完了" if not self.simulator.game_over else "システムクリティカル",
-            "actions_taken": []
+            "scenario_id": scenario.get("id"),
+            "scenario": scenario["name"],
+            "scenario_description": scenario["description"],
+            "turns_played": turns_played,
+            "final_state": final_state,
+            "score": score,
+            "game_over_reason": "完了" if not game_over else "システムクリティカル",
+            "actions_taken": list(running.actions_taken),
+            "action_count": running.action_count,
+            "success_count": running.success_count,
+            "category_counts": {category: list(counts) for category, counts in running.by_category.items()},
+            "state_min": dict(running.state_min),
+            "state_max": dict(running.state_max),
+            "score_history": [list(point) for point in running.scores]
         }
 
-        # アクション履歴の抽出
-        for event in self.simulator.history:
-            if event.get("type") == "action":
-                summary["actions_taken"].append({
-                    "turn": event["turn"],
-                    "action": event["action_name"],
-                    "success": event["success"]
-                })
-
         return summary
 
+    @staticmethod
+    def rank_lines(summary):
+        """順位の表示行（例: スコア: S014で上位12%（340件中））"""
+        return [
+            f"{RANK_LABELS[metric]}: {summary['scenario_id']}で上位{rank['top_percent']:g}%"
+            f"（{rank['count']}件中）"
+            for metric, rank in (summary.get("ranking") or {}).items()
+        ]
+
     def generate_text_report(self, filename=None):
         """テキスト形式のレポート生成"""
         summary = self.generate_summary()
@@ -46,6 +105,7 @@ class ReportGenerator:
             f"プレイターン数: {summary['turns_played']}",
             f"最終スコア: {summary['score']}",
             f"結果: {summary['game_over_reason']}",
+            *self.rank_lines(summary),
             "",
             "--- 最終システム状態 ---",
             f"CPU使用率: {summary['final_state']['cpu']}%",
@@ -90,22 +150,40 @@ class ReportGenerator:
         pdf_path = f"data/reports/{filename}.pdf"
 
         summary = self.generate_summary()
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
+        started = time.perf_counter()
+        pdf_path = self.render_pdf(summary, self.generate_improvement_tips(summary), pdf_path)
+        PDF_SECONDS.observe(time.perf_counter() - started)
+        return pdf_path
+
+    @staticmethod
+    def write_pdf(summary, improvement_tips, pdf_path):
+        """render_pdfで一時ファイルに作成してからpdf_pathに置き換える（失敗時はNone）
+
+        書きかけのファイルが見えないようにし、失敗・例外時も一時ファイルを残さない。
+        """
+        tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+        try:
+            if ReportGenerator.render_pdf(summary, improvement_tips, tmp_path) is None:
+                return None
+            os.replace(tmp_path, pdf_path)
+            return pdf_path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-        # カスタムスタイル
-        styles.add(ParagraphStyle(
-            name='Title',
-            fontName='Helvetica-Bold',
-            fontSize=14,
-            alignment=1,
-            spaceAfter=10
-        ))
+    @staticmethod
+    def render_pdf(summary, improvement_tips, pdf_path):
+        """サマリーと改善提案からPDFを作成し、パスを返す（失敗時はNone）
+
+        シミュレータに依存しないため、別プロセスのワーカーでも実行できる。
+        """
+        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+        styles = report_styles()
 
         story = []
 
         # タイトル
-        story.append(Paragraph("インフラリスク管理シミュレータ - 対応レポート", styles['Title']))
+        story.append(Paragraph("インフラリスク管理シミュレータ - 対応レポート", styles['ReportTitle']))
         story.append(Spacer(1, 12))
 
         # 基本情報
@@ -115,6 +193,8 @@ class ReportGenerator:
         story.append(Paragraph(f"プレイターン数: {summary['turns_played']}", styles['Normal']))
         story.append(Paragraph(f"最終スコア: {summary['score']}", styles['Normal']))
         story.append(Paragraph(f"結果: {summary['game_over_reason']}", styles['Normal']))
+        for line in ReportGenerator.rank_lines(summary):
+            story.append(Paragraph(line, styles['Normal']))
         story.append(Spacer(1, 12))
 
         # 最終システム状態
@@ -130,15 +210,7 @@ class ReportGenerator:
             ["SLAリスク値", f"{summary['final_state']['sla_risk']}%"]
         ]
         state_table = Table(state_data, colWidths=[200, 100])
-        state_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (1, 0), 12),
-            ('BACKGROUND', (0, 1), (1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
+        state_table.setStyle(TABLE_STYLE)
         story.append(state_table)
         story.append(Spacer(1, 12))
 
@@ -152,15 +224,7 @@ class ReportGenerator:
                 action_data.append([str(action["turn"]), action["action"], result])
 
             action_table = Table(action_data, colWidths=[50, 250, 50])
-            action_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (2, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (2, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (2, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (2, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (2, 0), 12),
-                ('BACKGROUND', (0, 1), (2, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
+            action_table.setStyle(TABLE_STYLE)
             story.append(action_table)
         else:
             story.append(Paragraph("アクション履歴なし", styles['Normal']))
@@ -170,7 +234,6 @@ class ReportGenerator:
         # 分析と改善提案
         story.append(Paragraph("分析と改善提案", styles['Heading2']))
 
-        improvement_tips = self.generate_improvement_tips(summary)
         for tip in improvement_tips:
             story.append(Paragraph(f"・{tip}", styles['Normal']))
             story.append(Spacer(1, 6))
@@ -182,7 +245,8 @@ class ReportGenerator:
             print(f"PDFの生成に失敗しました: {e}")
             return None
 
-    def generate_improvement_tips(self, summary):
+    @staticmethod
+    def generate_improvement_tips(summary):
         """改善提案の生成"""
         tips = []
         final_state = summary["final_state"]
@@ -209,9 +273,8 @@ class ReportGenerator:
 
         # アクション分析
         action_success_rate = 0
-        if summary["actions_taken"]:
-            success_count = sum(1 for a in summary["actions_taken"] if a["success"])
-            action_success_rate = success_count / len(summary["actions_taken"])
+        if summary["action_count"]:
+            action_success_rate = summary["success_count"] / summary["action_count"]
 
             if action_success_rate < 0.7:
                 tips.append(f"アクション成功率が低いです ({action_success_rate:.0%})。システム状態に応じた適切なアクション選択の訓練が必要です。")
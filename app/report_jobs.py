@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from app.metrics import PDF_SECONDS
+from app.report import ReportGenerator
+
+# ジョブの状態
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# キャッシュのレポートのファイル名の接頭辞（CLIの infra_report_*.pdf とは分け、削除対象をこれに限る）
+CACHE_PREFIX = "report_cache_"
+
+
+class QueueFullError(Exception):
+    """待機中のジョブ数が上限に達している"""
+
+
+def report_key(summary, improvement_tips):
+    """レポート内容のハッシュ（同じプレイ履歴・最終状態なら同じキー）
+
+    順位（ranking）はほかのプレイが終わるたびに変わるためキーに含めない。
+    キャッシュされたPDFの順位は最初に作成した時点のもの。
+    """
+    content = {key: value for key, value in summary.items() if key != "ranking"}
+    content = json.dumps([content, improvement_tips], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def _render_report(summary, improvement_tips, pdf_path):
+    # 作成時間は呼び出し元のプロセスで記録するため一緒に返す
+    started = time.perf_counter()
+    pdf_path = ReportGenerator.write_pdf(summary, improvement_tips, pdf_path)
+    return pdf_path, time.perf_counter() - started
+
+
+class ReportJobQueue:
+    """PDFレポートをワーカープールで非同期に作成するジョブキュー
+
+    ジョブIDはレポート内容のハッシュで、同じ内容のレポートは一度だけ作成し
+    report_dirのファイルをキャッシュとして返す。
+    実行中・待機中のジョブがmax_pendingに達したらQueueFullErrorを送出する。
+    キャッシュの合計サイズがmax_bytesを超えたら、最も古く使われたものから削除する。
+    """
+
+    def __init__(self, report_dir="data/reports", max_workers=2, max_pending=32,
+                 max_bytes=200 * 1024 * 1024, executor=None):
+        self.report_dir = report_dir
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self._executor = executor
+        self._max_workers = max_workers
+        self._jobs = {}  # ジョブID: Future（完了まで保持）
+        self._failed = OrderedDict()  # ジョブID: エラーメッセージ（直近のみ）
+        self._lock = threading.Lock()
+
+    def submit(self, simulator, ranks=None):
+        """シミュレータの結果からレポート作成を依頼し、ジョブIDを返す（ranks: 順位を載せるScoreRanks）"""
+        generator = ReportGenerator(simulator, ranks=ranks)
+        summary = generator.generate_summary()
+        improvement_tips = generator.generate_improvement_tips(summary)
+        job_id = report_key(summary, improvement_tips)
+
+        with self._lock:
+            if job_id in self._jobs:
+                return job_id
+            pdf_path = self.pdf_path(job_id)
+            if os.path.exists(pdf_path):
+                self._touch(pdf_path)
+                return job_id
+            if len(self._jobs) >= self.max_pending:
+                raise QueueFullError("レポート作成の待機数が上限に達しています")
+
+            os.makedirs(self.report_dir, exist_ok=True)
+            self._failed.pop(job_id, None)
+            future = self._get_executor().submit(
+                _render_report, summary, improvement_tips, pdf_path
+            )
+            self._jobs[job_id] = future
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        return job_id
+
+    def status(self, job_id):
+        """ジョブの状態を返す（不明なジョブはNone）"""
+        with self._lock:
+            future = self._jobs.get(job_id)
+            error = self._failed.get(job_id)
+        if future is not None:
+            return {"job_id": job_id, "status": RUNNING if future.running() else PENDING}
+        if error is not None:
+            return {"job_id": job_id, "status": FAILED, "error": error}
+        pdf_path = self.pdf_path(job_id)
+        if os.path.exists(pdf_path):
+            return {"job_id": job_id, "status": DONE, "filename": os.path.basename(pdf_path)}
+        return None
+
+    def pdf_path(self, job_id):
+        return os.path.join(self.report_dir, f"{CACHE_PREFIX}{job_id}.pdf")
+
+    def evict(self):
+        """キャッシュの合計サイズがmax_bytes以下になるまで古いレポートを削除し、削除数を返す
+
+        キャッシュが作成したファイル（CACHE_PREFIX）だけを対象にする。
+        """
+        reports = []
+        for entry in os.scandir(self.report_dir):
+            if entry.name.startswith(CACHE_PREFIX) and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                reports.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in reports)
+        removed = 0
+        for _, size, path in sorted(reports):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """待機・実行中と失敗したジョブの数"""
+        with self._lock:
+            return {"pending": len(self._jobs), "failed": len(self._failed)}
+
+    def shutdown(self, wait=True):
+        """ワーカープールを停止する"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _get_executor(self):
+        # 最初のジョブでプールを起動する
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+        return self._executor
+
+    def _touch(self, pdf_path):
+        # キャッシュヒットを最近使ったものとして扱う
+        try:
+            os.utime(pdf_path)
+        except OSError:
+            pass
+
+    def _finished(self, job_id, future):
+        error = None
+        if future.cancelled():
+            error = "キャンセルされました"
+        elif future.exception() is not None:
+            error = str(future.exception())
+        elif future.result()[0] is None:
+            error = "PDFの生成に失敗しました"
+        else:
+            PDF_SECONDS.observe(future.result()[1])
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            if error is not None:
+                self._failed[job_id] = error
+                while len(self._failed) > 1000:
+                    self._failed.popitem(last=False)
+        if error is None:
+            try:
+                self.evict()
+            except OSError as e:
+                print(f"レポートの削除に失敗しました: {e}")
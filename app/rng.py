@@ -0,0 +1,174 @@
+import numpy as np
+
+
+class RandomStream:
+    """シミュレータごとの乱数ストリーム
+
+    シードからPCG64を作成し、stream番目の部分ストリーム（jumpedで2^127ずつ離れた位置）を使う。
+    同じシード・streamなら実行環境によらずビット単位で同じ乱数列になるため、
+    streamを分けてワーカーに配れば並列実行でも再現できる。
+    スカラー乱数はblock_size個ずつまとめて生成し、バッファから返す。
+    randomモジュールと同じ random / choice / sample で呼び出せる。
+    """
+
+    def __init__(self, seed=None, stream=0, block_size=1024):
+        self.block_size = block_size
+        self.seed(seed, stream)
+
+    def seed(self, seed=None, stream=0):
+        """シード（整数・整数列・None）とstream番号でストリームを初期化"""
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.stream = stream
+        bit_generator = np.random.PCG64(self.seed_sequence)
+        if stream:
+            bit_generator = bit_generator.jumped(stream)
+        self.generator = np.random.Generator(bit_generator)
+        self._block = np.empty(0)
+        self._block_state = None  # バッファを生成する直前の状態
+        self._position = 0
+        self._rewindable = True  # バッファ生成後にジェネレータを直接使っていないか
+
+    def substream(self, stream):
+        """同じシードのstream番目の部分ストリームを作成"""
+        return RandomStream(self.seed_sequence.entropy, stream, self.block_size)
+
+    def random(self, size=None):
+        """[0, 1) の一様乱数（sizeを指定すると配列でまとめて生成）"""
+        if size is not None:
+            self._rewindable = False
+            return self.generator.random(size)
+        if self._position >= len(self._block):
+            self._block_state = self.generator.bit_generator.state
+            self._block = self.generator.random(self.block_size)
+            self._position = 0
+            self._rewindable = True
+        value = self._block[self._position]
+        self._position += 1
+        return float(value)
+
+    def trim(self):
+        """未読のバッファを捨ててメモリを解放する（以降の乱数列は変わらない）
+
+        ジェネレータをバッファ生成前の状態に戻し、読み出した個数だけ進める。
+        バッファ生成後にジェネレータを直接使った場合は巻き戻せないため何もしない。
+        """
+        if not len(self._block):
+            return
+        if self._position < len(self._block):
+            if not self._rewindable or self._block_state["has_uint32"]:
+                return
+            bit_generator = self.generator.bit_generator
+            bit_generator.state = self._block_state
+            bit_generator.advance(self._position)
+        self._block = np.empty(0)
+        self._block_state = None
+        self._position = 0
+
+    def get_state(self):
+        """ストリームの状態をJSONに変換できる辞書で返す
+
+        バッファの中身は持たず、生成直前の状態と読み出し位置から復元する。
+        """
+        return {
+            "entropy": self.seed_sequence.entropy,
+            "stream": self.stream,
+            "block_size": self.block_size,
+            "state": self.generator.bit_generator.state,
+            "block_state": self._block_state if self._position < len(self._block) else None,
+            "position": self._position,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """get_stateの辞書からストリームを復元"""
+        stream = cls.__new__(cls)
+        stream.block_size = state["block_size"]
+        stream.seed_sequence = np.random.SeedSequence(state["entropy"])
+        stream.stream = state["stream"]
+        stream.generator = np.random.Generator(np.random.PCG64())
+        stream._block = np.empty(0)
+        stream._block_state = state["block_state"]
+        stream._position = 0
+        stream._rewindable = True
+        if stream._block_state is not None:
+            stream.generator.bit_generator.state = stream._block_state
+            stream._block = stream.generator.random(stream.block_size)
+            stream._position = state["position"]
+            stream._rewindable = stream.generator.bit_generator.state == state["state"]
+        stream.generator.bit_generator.state = state["state"]
+        return stream
+
+    def integers(self, low, high=None, size=None):
+        """整数乱数（Generator.integersと同じ）"""
+        self._rewindable = False
+        return self.generator.integers(low, high, size)
+
+    def _index(self, n):
+        return min(int(self.random() * n), n - 1)
+
+    def choice(self, seq):
+        """空でないシーケンスから1要素を選ぶ"""
+        if not seq:
+            raise IndexError("空のシーケンスからは選択できません")
+        return seq[self._index(len(seq))]
+
+    def sample(self, population, k):
+        """重複なしでk個を選ぶ（部分的なFisher-Yatesシャッフル）"""
+        pool = list(population)
+        n = len(pool)
+        if not 0 <= k <= n:
+            raise ValueError("サンプル数が母集団より大きいか負です")
+        for i in range(k):
+            j = i + self._index(n - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+
+class AliasTable:
+    """重み付き離散分布からO(1)で標本を引くエイリアス表（Voseの方法）
+
+    1つの一様乱数u∈[0, 1)から、列 i = floor(u*n) と列内の位置で
+    iそのものかalias[i]かを決める。
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        total = weights.sum()
+        if n == 0 or total <= 0 or (weights < 0).any():
+            raise ValueError("重みは非負で、合計が正である必要があります")
+
+        self.probabilities = weights / total
+        scaled = self.probabilities * n
+        self.prob = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 残りは丸め誤差のみなので確率1の列とする
+
+        # スカラー参照用（NumPyのスカラー生成を避ける）
+        self._prob = self.prob.tolist()
+        self._alias = self.alias.tolist()
+
+    def __len__(self):
+        return len(self._prob)
+
+    def sample(self, rng):
+        """1つのインデックスを引く（rngはrandom()を持つ乱数源）"""
+        n = len(self._prob)
+        x = rng.random() * n
+        i = min(int(x), n - 1)
+        return i if x - i < self._prob[i] else self._alias[i]
+
+    def sample_indices(self, rng, size):
+        """size個のインデックスを配列でまとめて引く（rngはRandomStreamまたはGenerator）"""
+        n = len(self.prob)
+        x = rng.random(size) * n
+        i = np.minimum(x.astype(np.int64), n - 1)
+        return np.where(x - i < self.prob[i], i, self.alias[i])
@@ -0,0 +1,183 @@
+import bisect
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# 分布を持つ値（スコアと生存ターン数、どちらも大きいほど上位）
+METRICS = ("score", "turns")
+
+
+class ScoreRanks:
+    """シナリオごとのスコア・生存ターン数の分布と、その中での順位
+
+    値はどちらも範囲の限られた整数なので、分布は (シナリオ, 項目, 値) ごとの件数表で持つ。
+    誤差がなく、足し合わせるだけでマージできる（t-digest等の近似は不要）。
+    件数表はSQLite（WAL）に保存し、複数のサーバプロセスが同じファイルに記録できる。
+    別ホストのファイルはmergeで取り込む（同じファイルは一度だけ）。
+
+    順位の参照はプロセス内にキャッシュした累積件数を二分探索するので、プレイ件数によらない。
+    キャッシュはrefresh_seconds秒ごと、または自身の記録時に読み直す。
+    """
+
+    def __init__(self, path="data/reports/score_ranks.sqlite3", refresh_seconds=5.0):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._local = threading.local()  # スレッドごとの接続
+        self._cache = {}  # (シナリオ, 項目): (読み込んだ時刻, 値の昇順, 値未満の件数, 合計)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS counts (scenario TEXT NOT NULL, metric TEXT NOT NULL, "
+            "value INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (scenario, metric, value))"
+        )
+        # 記録済みのプレイ（同じプレイを二重に数えない）と取り込み済みのファイル
+        connection.execute("CREATE TABLE IF NOT EXISTS finished (key TEXT PRIMARY KEY)")
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS merged (store_id TEXT PRIMARY KEY)")
+        connection.execute("INSERT OR IGNORE INTO meta VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @property
+    def store_id(self):
+        return self._connection().execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+    def record(self, scenario_id, score, turns, key=None):
+        """終了したプレイを分布に加える（keyを記録済みならFalse）"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if key is not None:
+                inserted = connection.execute("INSERT OR IGNORE INTO finished VALUES (?)", (key,))
+                if inserted.rowcount == 0:
+                    connection.execute("ROLLBACK")
+                    return False
+            for metric, value in zip(METRICS, (score, turns)):
+                connection.execute(
+                    "INSERT INTO counts VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (scenario, metric, value) DO UPDATE SET count = count + 1",
+                    (scenario_id, metric, int(value))
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        for metric in METRICS:
+            self._cache.pop((scenario_id, metric), None)
+        return True
+
+    def record_simulator(self, simulator):
+        """シミュレータのシナリオが終了していれば分布に加える（シナリオごとに一度だけ）
+
+        危機的状態で終了したか、最大ターン数に達したプレイを終了とみなす。
+        同じプレイは一度しか記録できないため、最終ターンのアクションの後（CLIはループの後、
+        Webはレポート作成時）に呼ぶ。
+        """
+        if simulator.current_scenario is None:
+            return False
+        if not simulator.game_over and simulator.turn < simulator.max_turns:
+            return False
+        return self.record(simulator.current_scenario["id"], simulator.calculate_score(),
+                           min(simulator.turn, simulator.max_turns),
+                           key=f"{simulator.session_id}:{simulator.history_start}")
+
+    def merge(self, path):
+        """別のファイルの件数表を足し合わせる（取り込み済みのファイルならFalse）
+
+        件数表は合計しか持たないため、取り込み済みの件数を含むファイルは取り込めない（ValueError）。
+        """
+        other = ScoreRanks(path)
+        try:
+            other_id = other.store_id
+            other_merged = {row[0] for row in other._connection().execute("SELECT store_id FROM merged")}
+        finally:
+            other.close()
+        connection = self._connection()
+        if other_id == self.store_id:
+            return False
+        merged = {row[0] for row in connection.execute("SELECT store_id FROM merged")}
+        if other_id in merged:
+            return False
+        if other_merged & (merged | {self.store_id}):
+            raise ValueError(f"取り込み済みの件数を含むため取り込めません: {path}")
+        connection.execute("ATTACH DATABASE ? AS other", (path,))
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                inserted = connection.execute("INSERT OR IGNORE INTO merged VALUES (?)", (other_id,))
+                if inserted.rowcount == 0:
+                    connection.execute("ROLLBACK")
+                    return False
+                connection.execute(
+                    "INSERT INTO counts SELECT scenario, metric, value, count FROM other.counts WHERE 1 "
+                    "ON CONFLICT (scenario, metric, value) DO UPDATE SET count = count + excluded.count"
+                )
+                connection.execute("INSERT OR IGNORE INTO finished SELECT key FROM other.finished")
+                connection.execute("INSERT OR IGNORE INTO merged SELECT store_id FROM other.merged")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.execute("DETACH DATABASE other")
+        self._cache.clear()
+        return True
+
+    def distribution(self, scenario_id, metric):
+        """値ごとの件数 {値: 件数}"""
+        return dict(self._connection().execute(
+            "SELECT value, count FROM counts WHERE scenario = ? AND metric = ? ORDER BY value",
+            (scenario_id, metric)
+        ))
+
+    def _cumulative(self, scenario_id, metric):
+        key = (scenario_id, metric)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached is None or now - cached[0] >= self.refresh_seconds:
+            values, below, total = [], [], 0
+            for value, count in self.distribution(scenario_id, metric).items():
+                values.append(value)
+                below.append(total)
+                total += count
+            cached = self._cache[key] = (now, values, below, total)
+        return cached[1:]
+
+    def rank(self, scenario_id, metric, value):
+        """分布の中での順位 {"count": 件数, "top_percent": 以上の割合(%), "percentile": 未満の割合(%)}
+
+        記録がなければNone。
+        """
+        values, below, total = self._cumulative(scenario_id, metric)
+        if not total:
+            return None
+        i = bisect.bisect_left(values, value)
+        lower = below[i] if i < len(values) else total
+        return {
+            "count": total,
+            "top_percent": round((total - lower) / total * 100, 1),
+            "percentile": round(lower / total * 100, 1),
+        }
+
+    def ranks(self, scenario_id, score, turns):
+        """スコアと生存ターン数の順位（記録のない項目は含めない）"""
+        ranking = {}
+        for metric, value in zip(METRICS, (score, turns)):
+            rank = self.rank(scenario_id, metric, value)
+            if rank is not None:
+                ranking[metric] = rank
+        return ranking
@@ -0,0 +1,236 @@
+import heapq
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.simulator import InfraRiskSimulator
+
+
+class SessionStore:
+    """容量上限とTTL付きのセッションストア
+
+    値は最近使った順のOrderedDictに保持し、get/putはO(1)。
+    最後のアクセスからttl秒経過したセッションは期限切れとして扱い、
+    期限のヒープを使うバックグラウンドスレッドがreap_interval秒ごとに削除する。
+    容量を超えたときは最も長く使われていないセッションを削除する。
+    削除時にはon_evict(キー, 値)を呼ぶ（ロックの外で呼ぶ）。
+    """
+
+    def __init__(self, ttl=7200, capacity=10000, reap_interval=60, on_evict=None,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.on_evict = on_evict
+        self.clock = clock
+        self._entries = OrderedDict()  # キー: [値, 期限]
+        self._expiry_heap = []  # (期限, キー)（期限が延びたものは取り出し時に積み直す）
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "removed": 0}
+        self._stop = threading.Event()
+        self._reaper = None
+        if reap_interval:
+            self._reaper = threading.Thread(target=self._run_reaper, args=(reap_interval,),
+                                            name="session-reaper", daemon=True)
+            self._reaper.start()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, touch=False) is not None
+
+    def get(self, key, touch=True):
+        """セッションを取得（存在しないか期限切れならNone）。touchで期限を延ばす"""
+        expired = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= self.clock():
+                expired = self._entries.pop(key)[0]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+                if touch:
+                    entry[1] = self.clock() + self.ttl
+                    self._entries.move_to_end(key)
+        if expired is not None:
+            self._evicted(key, expired)
+        return None if entry is None else entry[0]
+
+    def put(self, key, value):
+        """セッションを保存（容量を超えたら最も古いものを削除）"""
+        evicted = []
+        with self._lock:
+            expires_at = self.clock() + self.ttl
+            old = self._entries.pop(key, None)
+            if old is not None and old[0] is not value:
+                evicted.append((key, old[0]))
+            self._entries[key] = [value, expires_at]
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            while len(self._entries) > self.capacity:
+                oldest, (oldest_value, _) = self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+                evicted.append((oldest, oldest_value))
+        for evicted_key, evicted_value in evicted:
+            self._evicted(evicted_key, evicted_value)
+
+    def pop(self, key):
+        """セッションを削除して値を返す（存在しなければNone）"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._stats["removed"] += 1
+        if entry is None:
+            return None
+        self._evicted(key, entry[0])
+        return entry[0]
+
+    def reap(self):
+        """期限切れのセッションを削除し、削除した数を返す"""
+        expired = []
+        with self._lock:
+            now = self.clock()
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                _, key = heapq.heappop(heap)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] > now:
+                    # アクセスで期限が延びたものは新しい期限で積み直す
+                    heapq.heappush(heap, (entry[1], key))
+                    continue
+                del self._entries[key]
+                self._stats["expired"] += 1
+                expired.append((key, entry[0]))
+            # 削除済みのキーが溜まりすぎたらヒープを作り直す
+            if len(heap) > 2 * len(self._entries) + 64:
+                self._expiry_heap = [(entry[1], key) for key, entry in self._entries.items()]
+                heapq.heapify(self._expiry_heap)
+        for key, value in expired:
+            self._evicted(key, value)
+        return len(expired)
+
+    def stats(self):
+        """件数・ヒット数・削除数の統計"""
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), capacity=self.capacity)
+
+    def close(self):
+        """バックグラウンドの削除スレッドを止める"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+
+    def _run_reaper(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"セッションの削除に失敗しました: {e}")
+
+    def _evicted(self, key, value):
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+
+class MemorySessionBackend:
+    """シミュレータをプロセス内のSessionStoreにそのまま保持するバックエンド
+
+    単一プロセス用。保存時にシリアライズしないため最も速い。
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else SessionStore()
+
+    def load(self, session_id):
+        return self.store.get(session_id)
+
+    def save(self, session_id, simulator):
+        self.store.put(session_id, simulator)
+
+    def delete(self, session_id):
+        self.store.pop(session_id)
+
+    def stats(self):
+        return self.store.stats()
+
+
+class SQLiteSessionBackend:
+    """シミュレータのスナップショットをSQLiteファイルに保存するバックエンド
+
+    同じファイルを参照すれば、どのワーカープロセスでもどのセッションでも扱える。
+    最後の保存からttl秒経過したセッションは読み込まず、purge_interval秒ごとに削除する。
+    dumps/loadsでシミュレータとバイト列を相互変換する。
+    統計の削除数（expired/evicted/removed）はこのインスタンスで削除した分（容量の上限はないためevictedは常に0）。
+    """
+
+    def __init__(self, path="data/sessions.sqlite3", ttl=7200, purge_interval=60,
+                 dumps=None, loads=None, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.dumps = dumps or (lambda simulator: simulator.to_bytes())
+        self.loads = loads or InfraRiskSimulator.from_bytes
+        self.clock = clock
+        self._local = threading.local()  # スレッドごとの接続
+        self._last_purge = clock()
+        self._stats = {"expired": 0, "evicted": 0, "removed": 0}
+        self._stats_lock = threading.Lock()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, session_id):
+        if not session_id:
+            return None
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+            (session_id, self.clock() - self.ttl)
+        ).fetchone()
+        return None if row is None else self.loads(row[0])
+
+    def save(self, session_id, simulator):
+        now = self.clock()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session_id, self.dumps(simulator), now)
+        )
+        if now - self._last_purge >= self.purge_interval:
+            self._last_purge = now
+            self.purge()
+
+    def delete(self, session_id):
+        cursor = self._connection().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._count("removed", cursor.rowcount)
+
+    def purge(self):
+        """期限切れのセッションを削除し、削除した数を返す"""
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE updated_at <= ?", (self.clock() - self.ttl,)
+        )
+        self._count("expired", cursor.rowcount)
+        return cursor.rowcount
+
+    def _count(self, reason, count):
+        with self._stats_lock:
+            self._stats[reason] += max(count, 0)
+
+    def stats(self):
+        size, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+        ).fetchone()
+        with self._stats_lock:
+            return dict(self._stats, size=size, bytes=total_bytes)
@@ -0,0 +1,91 @@
+from app.state import STATE_FIELDS
+
+
+class SessionSummary:
+    """現在のシナリオの集計値（イベントを記録するたびに更新する）
+
+    レポートやダッシュボードは履歴を走査せずにこの集計値を参照する。
+    状態の最小・最大値とスコアの推移は、各イベントを記録した時点の値で数える。
+    """
+
+    def __init__(self):
+        self.action_count = 0
+        self.success_count = 0
+        self.event_count = 0
+        self.actions_taken = []  # [{"turn", "action", "success"}]（実行順）
+        self.by_action = {}  # アクションID: [実行数, 成功数]
+        self.by_category = {}  # カテゴリ: [実行数, 成功数]
+        self.state_min = {}
+        self.state_max = {}
+        self.scores = []  # [[ターン, スコア]]
+
+    def observe(self, event_data, state=None, score=None, category=None):
+        """記録したイベント1件と、その時点の状態・スコアを集計に加える"""
+        kind = event_data.get("type")
+        if kind == "action":
+            success = bool(event_data.get("success"))
+            self.action_count += 1
+            self.success_count += success
+            self.actions_taken.append({
+                "turn": event_data.get("turn"),
+                "action": event_data.get("action_name"),
+                "success": success
+            })
+            for key, table in ((event_data.get("action_id"), self.by_action),
+                               (category, self.by_category)):
+                if key is not None:
+                    counts = table.setdefault(key, [0, 0])
+                    counts[0] += 1
+                    counts[1] += success
+        elif kind == "event":
+            self.event_count += 1
+
+        if state:
+            for field in STATE_FIELDS:
+                value = state.get(field)
+                if value is None:
+                    continue
+                if field not in self.state_min or value < self.state_min[field]:
+                    self.state_min[field] = value
+                if field not in self.state_max or value > self.state_max[field]:
+                    self.state_max[field] = value
+        if score is not None:
+            self.scores.append([event_data.get("turn", 0), score])
+
+    @property
+    def success_rate(self):
+        return self.success_count / self.action_count if self.action_count else 0.0
+
+    def to_dict(self):
+        return {
+            "action_count": self.action_count,
+            "success_count": self.success_count,
+            "event_count": self.event_count,
+            "actions_taken": self.actions_taken,
+            "by_action": self.by_action,
+            "by_category": self.by_category,
+            "state_min": self.state_min,
+            "state_max": self.state_max,
+            "scores": self.scores,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        for key, value in data.items():
+            setattr(summary, key, value)
+        return summary
+
+    def snapshot(self):
+        """ダッシュボード向けの集計値（参照側で変更しても影響しないようコピーする）"""
+        return {
+            "action_count": self.action_count,
+            "success_count": self.success_count,
+            "success_rate": self.success_rate,
+            "event_count": self.event_count,
+            "by_action": {key: list(counts) for key, counts in self.by_action.items()},
+            "by_category": {key: list(counts) for key, counts in self.by_category.items()},
+            "state_min": dict(self.state_min),
+            "state_max": dict(self.state_max),
+            "scores": [list(point) for point in self.scores],
+        }
@@ -1,27 +1,80 @@
 import random
 import csv
-import json
 import datetime
-from app.state import SystemState
+import functools
+import json
+import struct
+import time
+import zlib
+from app.state import STATE_FIELDS, SystemState
 from app.probability import ProbabilityEngine
 from app.events import EventManager
 from app.actions import ActionManager
+from app.rng import RandomStream
+from app.history import CompactHistory
+from app.session_summary import SessionSummary
+from app.log_writer import get_log_sink, new_session_id
+from app.log_segments import read_session_log
+from app.metrics import (ACTION_ROLLS, ACTIONS, LOG_EVENT_SECONDS, NEXT_TURN_SECONDS,
+                         TAKE_ACTION_SECONDS, TURNS, timed)
+
+# スナップショットの固定長部分: 識別子, 版, フラグ, 状態7項目, ターン, 最大ターン, スコア, 可変部の長さ
+SNAPSHOT_MAGIC = b"IRS"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<3sBB7iHHiI")
+FLAG_GAME_OVER = 1
+FLAG_INLINE_HISTORY = 2  # 版1: 履歴本体を含む（なければセッションログ上の位置のみ）
+
+# コンパクトモードの乱数バッファの大きさ（アイドル時は解放する）
+COMPACT_BLOCK_SIZE = 64
+
+
+def _trim_when_idle(method):
+    """コンパクトモードでは処理の終了時に乱数のバッファを解放する"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if self.compact:
+                self.rng.trim()
+    return wrapper
 
 class InfraRiskSimulator:
-    def __init__(self, scenarios_file="data/scenarios.csv", actions_file="data/actions.csv"):
+    def __init__(self, scenarios_file="data/scenarios.csv", actions_file="data/actions.csv",
+                 log_dir="data/logs", seed=None, rng=None, log_sink=None, compact=False):
+        # compact: 大人数の研修向けに、履歴をバイナリレコードで持ちアイドル時の乱数バッファを解放する
+        # （乱数列・履歴の内容は通常モードと同じ）
+        self.compact = compact
         self.system_state = SystemState()
-        self.event_manager = EventManager(scenarios_file)
-        self.action_manager = ActionManager(actions_file)
-        self.probability_engine = ProbabilityEngine()
+        # イベント・アクション提示・成功判定はシミュレータ固有の乱数ストリームを共有する
+        if rng is None:
+            rng = RandomStream(seed, block_size=COMPACT_BLOCK_SIZE) if compact else RandomStream(seed)
+        self.rng = rng
+        self.event_manager = EventManager(scenarios_file, rng=self.rng)
+        self.action_manager = ActionManager(actions_file, rng=self.rng)
+        # 成功率はアクションごとの事前計算表で引く
+        self.probability_engine = ProbabilityEngine(self.action_manager.catalog.rate_table)
         self.turn = 0
         self.max_turns = 10
-        self.history = []
+        self.history = self._new_history()
+        self.history_start = 0  # 現在の履歴の先頭がセッションログの何行目か
+        self.running_summary = SessionSummary()  # 現在のシナリオの集計値（履歴を走査せずに参照する）
+        self.logged_events = 0  # セッションログに書き込んだ行数
         self.current_scenario = None
         self.current_event = None
         self.game_over = False
         self.score = 0
-        self.session_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
+        self.cohort = None  # 研修のコホート名（ライブ配信のトピックに使う）
+        self.created_at = datetime.datetime.now()
+        self.session_id = new_session_id(self.created_at)
+        self.log_dir = log_dir  # Noneならログファイルに書き込まない
+        # ログはシンクに渡し、バックグラウンドでまとめて書き込む
+        if log_sink is None and log_dir is not None:
+            log_sink = get_log_sink(log_dir)
+        self.log_sink = log_sink
+
+    @_trim_when_idle
     def start_scenario(self, scenario_id=None):
         """シナリオを開始し、初期状態を設定"""
         if scenario_id:
@@ -40,8 +93,11 @@ class InfraRiskSimulator:
 
         # 履歴初期化
         self.turn = 0
-        self.history = []
+        self.history = self._new_history()
+        self.history_start = self.logged_events
+        self.running_summary = SessionSummary()
         self.game_over = False
+        self.action_manager.cooldowns.clear()
 
         # 初期イベントの発生
         self.log_event({
@@ -53,6 +109,8 @@ class InfraRiskSimulator:
 
         return self.current_scenario
 
+    @timed(NEXT_TURN_SECONDS)
+    @_trim_when_idle
     def next_turn(self):
         """次のターンに進み、イベントを発生させる"""
         if self.game_over:
@@ -63,13 +121,15 @@ class InfraRiskSimulator:
         # 最大ターン数チェック
         if self.turn > self.max_turns:
             self.game_over = True
+            self.flush_log(wait=True)
             return {"game_over": True, "message": "最大ターン数に達しました"}
 
         # システム状態の自然変化（ターン経過による変化）
+        TURNS.inc()
         self.system_state.natural_progression()
 
         # ランダムイベントの発生
-        self.current_event = self.event_manager.get_random_event()
+        self.current_event = self.event_manager.get_random_event(self.current_scenario)
         event_effect = self.system_state.apply_event(self.current_event)
 
         # 危機的状態のチェック
@@ -80,6 +140,7 @@ class InfraRiskSimulator:
                 "turn": self.turn,
                 "state": self.system_state.get_state_dict()
             })
+            self.flush_log(wait=True)
             return {
                 "game_over": True,
                 "message": "システムが危機的状態になりました",
@@ -104,19 +165,23 @@ class InfraRiskSimulator:
             "state": self.system_state.get_state_dict()
         }
 
+    @_trim_when_idle
     def get_available_actions(self):
         """現在選択可能なアクションのリストを取得"""
-        available_actions = self.action_manager.get_available_actions()
+        # カタログのレコードは読み取り専用のため、成功確率はコピーに付与する
+        available_actions = [dict(a) for a in self.action_manager.get_available_actions()]
 
         # 各アクションの成功確率を計算
         for action in available_actions:
-            success_rate = self.probability_engine.calculate_success_rate(
+            success_rate = self.probability_engine.success_rate(
                 action, self.system_state
             )
             action["calculated_success_rate"] = success_rate
 
         return available_actions
 
+    @timed(TAKE_ACTION_SECONDS)
+    @_trim_when_idle
     def take_action(self, action_id):
         """指定されたアクションを実行し、結果を返す"""
         if self.game_over:
@@ -127,10 +192,12 @@ class InfraRiskSimulator:
             return {"success": False, "message": "指定されたアクションが見つかりません"}
 
         # 成功確率の計算と成功判定
-        success_rate = self.probability_engine.calculate_success_rate(
+        success_rate = self.probability_engine.success_rate(
             action, self.system_state
         )
-        is_success = self.probability_engine.roll_success(success_rate)
+        is_success = self.probability_engine.roll_success(success_rate, self.rng)
+        ACTIONS.inc()
+        ACTION_ROLLS.inc(action["id"], "success" if is_success else "failure")
 
         # アクションの結果をシステム状態に適用
         state_changes = self.system_state.apply_action(action, is_success)
@@ -154,6 +221,8 @@ class InfraRiskSimulator:
             "state_changes": state_changes,
             "state_after": self.system_state.get_state_dict()
         })
+        # ターンの区切りで書き出す（終了時は書き込み完了まで待つ）
+        self.flush_log(wait=critical)
 
         return {
             "success": is_success,
@@ -164,8 +233,30 @@ class InfraRiskSimulator:
             "critical_message": "システムが危機的状態になりました" if critical else None
         }
 
+    def next_turn_with_actions(self):
+        """次のターンに進み、選択可能なアクション（成功確率付き）も合わせて返す"""
+        turn_result = self.next_turn()
+        if not turn_result["game_over"]:
+            turn_result["actions"] = self.get_available_actions()
+        return turn_result
+
+    def take_action_and_advance(self, action_id):
+        """アクションを実行し、続けて次のターンに進む
+
+        アクションが実行できなかったとき、またはゲームが終了したときはnext_turnを含めない。
+        """
+        action_result = self.take_action(action_id)
+        response = {"action_result": action_result}
+        if "state" in action_result and not self.game_over:
+            response["next_turn"] = self.next_turn_with_actions()
+        return response
+
     def calculate_score(self):
         """現在のスコアを計算"""
+        self.score = self._current_score()
+        return self.score
+
+    def _current_score(self):
         # 基本スコア: サービス稼働数 x 100
         base_score = self.system_state.services * 100
 
@@ -180,22 +271,161 @@ class InfraRiskSimulator:
         # SLAリスクによるペナルティ
         sla_penalty = self.system_state.sla_risk * 5
 
-        self.score = base_score + stability_bonus + speed_bonus - sla_penalty
-        return self.score
+        return base_score + stability_bonus + speed_bonus - sla_penalty
 
     def log_event(self, event_data):
         """イベントをログに記録"""
         event_data["timestamp"] = datetime.datetime.now().isoformat()
         self.history.append(event_data)
+        self._observe(event_data)
 
-        # ログファイルに書き込み
-        log_file = f"data/logs/{self.session_id}.json"
+        # ログファイルへの書き込みはシンクに任せる
+        if self.log_sink is None:
+            return
         try:
-            with open(log_file, 'a') as f:
-                f.write(json.dumps(event_data) + "\n")
+            started = time.perf_counter()
+            self.log_sink.write(self.session_id, event_data)
+            LOG_EVENT_SECONDS.observe(time.perf_counter() - started)
+            self.logged_events += 1
         except Exception as e:
             print(f"ログの書き込みに失敗しました: {e}")
 
+    def _observe(self, event_data):
+        """記録したイベントを現在の状態・スコアとともに集計値に加える"""
+        self.running_summary.observe(event_data, self.system_state.get_state_dict(),
+                                     self._current_score(), self._action_category(event_data))
+
+    def _action_category(self, event_data):
+        if event_data.get("type") != "action":
+            return None
+        action = self.action_manager.get_action_by_id(event_data.get("action_id"))
+        return action.get("category") if action else None
+
+    def flush_log(self, wait=False):
+        """セッションログを書き出す（wait=Trueなら書き込み完了まで待つ）"""
+        if self.log_sink is not None:
+            self.log_sink.flush(self.session_id, wait=wait)
+
+    def close_log(self):
+        """セッションログを書き出してファイルを閉じる"""
+        if self.log_sink is not None:
+            self.log_sink.close_session(self.session_id)
+
+    @property
+    def history(self):
+        """現在のシナリオの履歴"""
+        return self._history
+
+    @history.setter
+    def history(self, value):
+        if self.compact and isinstance(value, list):
+            value = self._new_history(value)
+        self._history = value
+
+    def _new_history(self, events=()):
+        if self.compact:
+            return CompactHistory(self.event_manager.catalog, self.action_manager.catalog, events)
+        return list(events)
+
+    def _load_history(self, start, length):
+        # 版1のスナップショット（履歴はログ上の位置のみ）の履歴をセッションログから読む
+        self.flush_log(wait=True)
+        try:
+            lines = read_session_log(self.log_sink.log_dir, self.session_id).splitlines()
+            return [json.loads(line) for line in lines[start:start + length]]
+        except Exception as e:
+            print(f"ログの読み込みに失敗しました: {e}")
+            return []
+
+    def to_bytes(self):
+        """シミュレータの状態をバイト列に変換
+
+        状態・ターン・スコアは固定長、クールダウン・乱数状態・現在のイベントなどは圧縮JSONで持つ。
+        履歴は固定長レコード（CompactHistory）で含めるため、復元時にログを読まず、
+        ログの書き込み完了も待たない。
+        """
+        self.flush_log()
+        flags = FLAG_GAME_OVER if self.game_over else 0
+
+        event = self.current_event
+        if event is not None and self.event_manager.catalog.events.get(event.get("id")) is event:
+            event = {"id": event["id"]}  # カタログのイベントはIDのみ
+        payload = {
+            "session_id": self.session_id,
+            "created_at": self.created_at.isoformat(),
+            "cohort": self.cohort,
+            "scenario_id": self.current_scenario["id"] if self.current_scenario else None,
+            "event": event,
+            "cooldowns": self.action_manager.cooldowns,
+            "rng": self.rng.get_state(),
+            "logged_events": self.logged_events,
+            "history_start": self.history_start,
+            "summary": self.running_summary.to_dict(),
+        }
+        history = self.history
+        if not isinstance(history, CompactHistory):
+            history = CompactHistory(self.event_manager.catalog, self.action_manager.catalog, history)
+        payload["history"] = history.dump()
+        body = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+        state = [getattr(self.system_state, field) for field in STATE_FIELDS]
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, *state,
+                                      self.turn, self.max_turns, self.score, len(body))
+        return header + body
+
+    @classmethod
+    def from_bytes(cls, data, scenarios_file="data/scenarios.csv", actions_file="data/actions.csv",
+                   log_dir="data/logs", log_sink=None, compact=False):
+        """to_bytesのバイト列からシミュレータを復元"""
+        magic, version, flags, *values = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version not in (1, SNAPSHOT_VERSION):
+            raise ValueError("シミュレータのスナップショットではありません")
+        state, (turn, max_turns, score, length) = values[:len(STATE_FIELDS)], values[len(STATE_FIELDS):]
+        start = SNAPSHOT_HEADER.size
+        payload = json.loads(zlib.decompress(data[start:start + length]).decode('utf-8'))
+
+        simulator = cls(scenarios_file, actions_file, log_dir=log_dir,
+                        rng=RandomStream.from_state(payload["rng"]), log_sink=log_sink,
+                        compact=compact)
+        for field, value in zip(STATE_FIELDS, state):
+            setattr(simulator.system_state, field, value)
+        simulator.turn = turn
+        simulator.max_turns = max_turns
+        simulator.score = score
+        simulator.game_over = bool(flags & FLAG_GAME_OVER)
+        simulator.session_id = payload["session_id"]
+        simulator.created_at = datetime.datetime.fromisoformat(payload["created_at"])
+        simulator.cohort = payload.get("cohort")
+        if payload["scenario_id"] is not None:
+            simulator.current_scenario = simulator.event_manager.get_scenario_by_id(
+                payload["scenario_id"])
+        event = payload["event"]
+        if event is not None and set(event) == {"id"}:
+            event = simulator.event_manager.catalog.events.get(event["id"])
+        simulator.current_event = event
+        simulator.action_manager.cooldowns.update(payload["cooldowns"])
+        simulator.logged_events = payload["logged_events"]
+        simulator.history_start = payload["history_start"]
+        if version == 1 and flags & FLAG_INLINE_HISTORY:
+            simulator.history = payload["history"]
+        elif version == 1:
+            simulator.history = simulator._load_history(payload["history_start"], payload["history_length"])
+        else:
+            history = CompactHistory.load(simulator.event_manager.catalog,
+                                          simulator.action_manager.catalog, payload["history"])
+            simulator.history = history if compact else list(history)
+        if "summary" in payload:
+            simulator.running_summary = SessionSummary.from_dict(payload["summary"])
+        else:
+            # 集計値を持たない古いスナップショットは履歴から作り直す（各時点のスコアは分からない）
+            for event_data in simulator.history:
+                simulator.running_summary.observe(
+                    event_data, event_data.get("state_after") or event_data.get("state"),
+                    category=simulator._action_category(event_data))
+        if compact:
+            simulator.rng.trim()
+        return simulator
+
     def get_game_summary(self):
         """ゲームの要約を取得"""
         return {
@@ -0,0 +1,361 @@
+import numpy as np
+from math import comb
+from app.batch import BatchSimulator, calculate_scores
+from app.state import SystemStateBatch
+
+# 決定ノードの行レイアウト: 状態6フィールド + アクションごとの残りクールダウン
+# ネットワーク負荷は成功率・危機判定・スコアのいずれにも影響しないため持たない
+KEY_FIELDS = ("cpu", "memory", "disk", "services", "alerts", "sla_risk")
+ROUNDED_FIELDS = (0, 1, 2, 5)  # 離散化するパーセント系フィールド（cpu, memory, disk, sla_risk）
+# 丸めでまたがないフィールドごとの境界（各領域の先頭の値）。
+# 成功率（cpu >80・<40、memory >85、disk >90）、自然変化（cpu/memory >80、disk >80・>90）、
+# 危機判定（cpu/memory >=95、disk >=98、sla_risk >=90）、安定性ボーナス（cpu/memory <60）の閾値
+REGION_STARTS = {
+    0: (40, 60, 81, 95),
+    1: (60, 81, 86, 95),
+    2: (81, 91, 98),
+    5: (90,),
+}
+STATE_COLUMNS = len(KEY_FIELDS)
+# 行の型（状態値は100を超えうるためint8では溢れる）
+ROW_DTYPE = np.int16
+
+# 行の状態列をSystemStateBatchのフィールド順（network込み）に並べるための位置
+_BATCH_ORDER = (0, 1, 2, None, 3, 4, 5)
+
+
+def _unique_rows(rows):
+    """行単位で重複を除き、一意な行と各行の対応インデックスを返す"""
+    rows = np.ascontiguousarray(rows)
+    if len(rows) == 0:
+        return rows, np.zeros(0, dtype=np.int64)
+    view = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+    unique, inverse = np.unique(view, return_inverse=True)
+    return unique.view(rows.dtype).reshape(-1, rows.shape[1]), inverse
+
+
+def _to_batch(rows):
+    """行列の状態列からSystemStateBatchを作成"""
+    values = np.zeros((len(_BATCH_ORDER), len(rows)), dtype=np.int32)
+    for field, column in enumerate(_BATCH_ORDER):
+        if column is not None:
+            values[field] = rows[:, column]
+    return SystemStateBatch(values)
+
+
+def _from_batch(states):
+    """SystemStateBatchから行列の状態列を取得"""
+    return np.stack([states.values[field] for field, column in enumerate(_BATCH_ORDER)
+                     if column is not None], axis=1)
+
+
+def offer_weights(n_actions, max_actions):
+    """提示アクションの最良順位の分布
+
+    weights[k, j]: 選択可能なk件から最大max_actions件を無作為に提示したとき、
+    提示された中で最良のものが全体のj番目（0始まり）である確率
+    """
+    weights = np.zeros((n_actions + 1, n_actions))
+    for k in range(1, n_actions + 1):
+        m = min(max_actions, k)
+        total = comb(k, m)
+        for j in range(k - m + 1):
+            weights[k, j] = comb(k - 1 - j, m - 1) / total
+    return weights
+
+
+class OptimalPolicy:
+    """ソルバが求めた方策表
+
+    ターンごとに決定ノードの行（離散化した状態＋残りクールダウン）と、
+    各アクションの行動価値Q（選択不可は-inf）、見送りの価値を保持する。
+    状態からの参照は辞書によるO(1)検索。
+    """
+
+    def __init__(self, scenario_id, action_ids, resolution, layers, value=None):
+        self.scenario_id = scenario_id
+        self.action_ids = list(action_ids)
+        self.resolution = resolution
+        self.layers = layers  # {turn: (keys, q_values, skip_values)}
+        self.value = value
+        self._index = {}
+
+    def __len__(self):
+        return sum(len(keys) for keys, _, _ in self.layers.values())
+
+    def state_key(self, turn, system_state, cooldowns):
+        """状態と残りクールダウン（{アクションID: 残りターン}）から表のキーを作成"""
+        values = [getattr(system_state, field) for field in KEY_FIELDS]
+        for column in ROUNDED_FIELDS:
+            values[column] = _round_value(values[column], self.resolution, REGION_STARTS[column])
+        values += [cooldowns.get(action_id, 0) for action_id in self.action_ids]
+        return turn, np.array(values, dtype=ROW_DTYPE).tobytes()
+
+    def _lookup(self, key):
+        turn, row = key
+        if turn not in self.layers:
+            return None
+        if turn not in self._index:
+            keys = self.layers[turn][0]
+            self._index[turn] = {keys[i].tobytes(): i for i in range(len(keys))}
+        return self._index[turn].get(row)
+
+    def action_values(self, turn, system_state, cooldowns):
+        """各アクションの行動価値を辞書で返す（"skip"は見送り、未知の状態はNone）"""
+        key = self.state_key(turn, system_state, cooldowns)
+        row = self._lookup(key)
+        if row is None:
+            return None
+        _, q_values, skip_values = self.layers[turn]
+        values = {
+            action_id: float(q)
+            for action_id, q in zip(self.action_ids, q_values[row]) if np.isfinite(q)
+        }
+        values["skip"] = float(skip_values[row])
+        return values
+
+    def best_action(self, simulator, available_actions):
+        """提示されたアクションから期待スコア最大のものを選ぶ
+
+        見送りが最善ならNone、表にない状態ならリスク期待値が最大の候補を返す。
+        """
+        values = self.action_values(simulator.turn, simulator.system_state,
+                                    simulator.action_manager.cooldowns)
+        if values is None:
+            if not available_actions:
+                return None
+            engine = simulator.probability_engine
+            return max(available_actions, key=lambda action: engine.calculate_risk_expectation(
+                action, simulator.system_state))["id"]
+        best_id, best_value = None, values["skip"]
+        for action in available_actions:
+            value = values.get(action["id"])
+            if value is not None and value > best_value:
+                best_id, best_value = action["id"], value
+        return best_id
+
+    def save(self, file_path):
+        """方策表をファイルに保存（NumPyの圧縮アーカイブ）"""
+        arrays = {
+            "scenario_id": np.array(self.scenario_id),
+            "action_ids": np.array(self.action_ids),
+            "resolution": np.array(self.resolution),
+            "value": np.array(np.nan if self.value is None else self.value),
+        }
+        for turn, (keys, q_values, skip_values) in self.layers.items():
+            arrays[f"keys_{turn}"] = keys
+            arrays[f"q_{turn}"] = q_values
+            arrays[f"skip_{turn}"] = skip_values
+        with open(file_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, file_path):
+        """保存した方策表を読み込む"""
+        with np.load(file_path) as data:
+            turns = sorted(int(name[5:]) for name in data.files if name.startswith("keys_"))
+            layers = {
+                turn: (data[f"keys_{turn}"].astype(ROW_DTYPE), data[f"q_{turn}"], data[f"skip_{turn}"])
+                for turn in turns
+            }
+            value = float(data["value"])
+            return cls(str(data["scenario_id"]), [str(a) for a in data["action_ids"]],
+                       int(data["resolution"]), layers, None if np.isnan(value) else value)
+
+
+def _round_value(value, resolution, region_starts=()):
+    """最も近いresolutionの倍数に丸める（0.5は切り上げ）
+
+    region_starts（昇順の境界）を指定すると、丸めた値を元の値と同じ領域内に収める。
+    """
+    if resolution <= 1:
+        return value
+    rounded = (value + resolution // 2) // resolution * resolution
+    if not region_starts:
+        return rounded
+    starts = np.asarray(region_starts)
+    region = np.searchsorted(starts, value, side="right")
+    lower = np.concatenate([[0], starts])[region]
+    upper = np.concatenate([starts, [np.iinfo(np.int16).max + 1]])[region] - 1
+    return np.clip(rounded, lower, upper)
+
+
+class PolicySolver:
+    """シナリオの期待スコアを最大化する方策を求めるオフラインソルバ
+
+    到達可能な決定ノード（ターン・状態・残りクールダウン）を前向きに列挙し、
+    後ろ向き帰納法（有限ホライズンの価値反復）で各ノードの価値を求める。
+    ノードは離散化した状態をキーに一意化する（転置表）。
+    遷移は BatchSimulator と同じく EventManager のイベント分布、
+    ProbabilityEngine の成功率、ActionManager のクールダウンに従い、
+    毎ターン最大 max_actions 件が無作為に提示されることも期待値に含める。
+
+    resolution: cpu/memory/disk/sla_riskを丸める幅（既定の1で厳密）。
+                2以上は近似で、丸めはREGION_STARTSの閾値をまたがないが、同じ領域内の値を
+                まとめるため、その後のターンの推移やSLAリスクのペナルティは厳密には一致しない
+    allow_skip: アクションを見送る選択肢を含めるか
+    max_nodes: 1ターンあたりのノード数の上限（超えるとValueError。10万ノードあたり1GB弱のメモリを使う）
+    """
+
+    def __init__(self, scenarios_file="data/scenarios.csv", actions_file="data/actions.csv",
+                 resolution=1, max_turns=10, max_actions=5, allow_skip=True, max_nodes=400_000):
+        self.engine = BatchSimulator(scenarios_file, actions_file)
+        self.resolution = resolution
+        self.max_turns = max_turns
+        self.max_actions = max_actions
+        self.allow_skip = allow_skip
+        self.max_nodes = max_nodes
+        n_actions = len(self.engine.actions)
+        self.weights = offer_weights(n_actions, max_actions)
+        # クールダウン1以下のアクションは次のターンには選択可能に戻るため追跡しない
+        self.tracked_cooldowns = np.where(self.engine.cooldowns >= 2, self.engine.cooldowns, 0)
+        self.event_probabilities = self.engine.event_manager.event_probabilities()
+
+    def _discretize(self, rows):
+        if self.resolution > 1:
+            for column in ROUNDED_FIELDS:
+                rows[:, column] = _round_value(rows[:, column], self.resolution, REGION_STARTS[column])
+        return rows
+
+    def _advance(self, pre_rows, turn):
+        """ターン開始（自然変化＋イベント）を適用
+
+        戻り値: (決定ノード行, 各(前状態, イベント)の遷移先インデックス, 終端スコア)
+        遷移先が-1の組は危機的状態で終了し、終端スコアを使う。
+        """
+        n_pre, n_events = len(pre_rows), len(self.event_probabilities)
+        rows = np.repeat(pre_rows, n_events, axis=0)
+        states = _to_batch(rows)
+        states.natural_progression()
+        events = np.tile(np.arange(n_events), n_pre)
+        states.apply_event(self.engine.event_effects[events])
+
+        critical = states.is_critical()
+        terminal = np.where(critical, calculate_scores(states, np.full(len(rows), turn)), 0)
+        rows[:, :STATE_COLUMNS] = _from_batch(states)
+        rows[:, STATE_COLUMNS:] = np.maximum(rows[:, STATE_COLUMNS:] - 1, 0)
+
+        nodes, inverse = _unique_rows(self._discretize(rows[~critical]))
+        children = np.full(len(rows), -1, dtype=np.int64)
+        children[~critical] = inverse
+        return nodes, children.reshape(n_pre, n_events), terminal.reshape(n_pre, n_events)
+
+    def _expand(self, nodes, turn):
+        """決定ノードで各アクションを実行した結果を列挙
+
+        戻り値: (次ターン開始前の状態行, 選択肢の一覧)
+        選択肢は (ノード, アクション, 成功確率, 成功時と失敗時の(遷移先, 終端スコア)) の配列。
+        """
+        n_actions = len(self.engine.actions)
+        node_index, action_index = np.nonzero(nodes[:, STATE_COLUMNS:] == 0)
+        base = _to_batch(nodes[node_index])
+        rates = self.engine.success_rates(base, action_index)
+
+        outcomes = []
+        after_rows = []
+        for success in (True, False):
+            states = base.copy()
+            self.engine.apply_action(states, action_index, np.full(len(node_index), success),
+                                     np.ones(len(node_index), dtype=bool))
+            rows = nodes[node_index].copy()
+            rows[:, :STATE_COLUMNS] = _from_batch(states)
+            rows[np.arange(len(rows)), STATE_COLUMNS + action_index] = \
+                self.tracked_cooldowns[action_index]
+            ends = states.is_critical() | (turn >= self.max_turns)
+            terminal = np.where(ends, calculate_scores(states, np.full(len(rows), turn)), 0)
+            outcomes.append((ends, terminal))
+            after_rows.append(rows[~ends])
+
+        # 見送りはそのまま次のターンへ
+        skip_terminal = np.zeros(len(nodes))
+        skip_ends = np.full(len(nodes), turn >= self.max_turns)
+        if turn >= self.max_turns:
+            skip_terminal = calculate_scores(_to_batch(nodes), np.full(len(nodes), turn))
+        else:
+            after_rows.append(nodes)
+
+        pre_rows, inverse = _unique_rows(np.concatenate(after_rows))
+        offsets = np.cumsum([0] + [len(rows) for rows in after_rows])
+
+        def children(ends, part):
+            child = np.full(len(ends), -1, dtype=np.int64)
+            child[~ends] = inverse[offsets[part]:offsets[part + 1]]
+            return child
+
+        options = {
+            "node": node_index,
+            "action": action_index,
+            "rate": rates,
+            "success": (children(outcomes[0][0], 0), outcomes[0][1]),
+            "failure": (children(outcomes[1][0], 1), outcomes[1][1]),
+            "skip": (children(skip_ends, 2) if turn < self.max_turns
+                     else np.full(len(nodes), -1, dtype=np.int64), skip_terminal),
+            "n_actions": n_actions,
+        }
+        return pre_rows, options
+
+    def _node_values(self, n_nodes, options, next_values):
+        """行動価値Qと、無作為な提示を考慮した決定ノードの価値を計算"""
+        def outcome_value(outcome):
+            child, terminal = outcome
+            if next_values is None:
+                return terminal
+            return np.where(child >= 0, next_values[np.maximum(child, 0)], terminal)
+
+        q_values = np.full((n_nodes, options["n_actions"]), -np.inf)
+        rates = options["rate"]
+        q_values[options["node"], options["action"]] = (
+            rates * outcome_value(options["success"])
+            + (1 - rates) * outcome_value(options["failure"])
+        )
+        skip_values = outcome_value(options["skip"])
+
+        available = np.isfinite(q_values).sum(axis=1)
+        ranked = -np.sort(-q_values, axis=1)
+        if self.allow_skip:
+            ranked = np.maximum(ranked, skip_values[:, None])
+        ranked = np.where(np.isfinite(ranked), ranked, 0.0)
+        values = (self.weights[available] * ranked).sum(axis=1)
+        values = np.where(available > 0, values, skip_values)
+        return q_values.astype(np.float32), skip_values.astype(np.float32), values
+
+    def solve(self, scenario_id):
+        """シナリオの方策表を求める"""
+        scenario = self.engine.event_manager.get_scenario_by_id(scenario_id)
+        if not scenario:
+            raise ValueError(f"シナリオが見つかりません: {scenario_id}")
+        self.event_probabilities = self.engine.event_manager.event_probabilities(scenario)
+
+        initial = self.engine.initial_states(scenario, 1)
+        pre_rows = np.zeros((1, STATE_COLUMNS + len(self.engine.actions)), dtype=ROW_DTYPE)
+        pre_rows[:, :STATE_COLUMNS] = _from_batch(initial)
+
+        # 前向き: 到達可能なノードの列挙
+        stages = []
+        for turn in range(1, self.max_turns + 1):
+            nodes, children, terminal = self._advance(pre_rows, turn)
+            if len(nodes) > self.max_nodes:
+                raise ValueError(f"ターン{turn}のノード数が上限を超えました: {len(nodes)}"
+                                 "（max_turnsを減らすか、resolutionで近似してください）")
+            if len(nodes) == 0:
+                stages.append((nodes, children, terminal, None))
+                break
+            pre_rows, options = self._expand(nodes, turn)
+            stages.append((nodes, children, terminal, options))
+
+        # 後ろ向き: 終端から価値を伝播
+        layers = {}
+        next_values = None  # 次ターン開始前の状態の価値
+        for turn in range(len(stages), 0, -1):
+            nodes, children, terminal, options = stages[turn - 1]
+            if options is not None:
+                q_values, skip_values, node_values = self._node_values(len(nodes), options, next_values)
+                layers[turn] = (nodes, q_values, skip_values)
+            else:
+                node_values = np.zeros(0)
+            arrived = np.where(children >= 0, node_values[np.maximum(children, 0)] if len(node_values)
+                               else 0, terminal)
+            next_values = arrived @ self.event_probabilities
+
+        return OptimalPolicy(scenario_id, self.engine.action_ids, self.resolution, layers,
+                             float(next_values[0]))
@@ -1,4 +1,50 @@
+import numpy as np
+
+# 状態フィールドの並び順と、対応する効果キー・上限値（services・alertsは下限のみ）
+STATE_FIELDS = ("cpu", "memory", "disk", "network", "services", "alerts", "sla_risk")
+EFFECT_KEYS = {
+    "cpu": "cpu_effect",
+    "memory": "memory_effect",
+    "disk": "disk_effect",
+    "network": "network_effect",
+    "services": "service_effect",
+    "alerts": "alert_effect",
+    "sla_risk": "sla_risk_effect",
+}
+UPPER_BOUNDS = {
+    "cpu": 100,
+    "memory": 100,
+    "disk": 100,
+    "network": 100,
+    "services": None,
+    "alerts": None,
+    "sla_risk": 100,
+}
+
+# 失敗時の個別影響（failure_effects）で変化するフィールド
+FAILURE_FIELDS = ("cpu", "memory", "services")
+
+# SystemStateBatchで使う行番号と上限値の列（上限なしはint32の最大値）
+_ROWS = {field: i for i, field in enumerate(STATE_FIELDS)}
+_UPPER_COLUMN = np.array([[np.iinfo(np.int32).max if UPPER_BOUNDS[field] is None else UPPER_BOUNDS[field]]
+                          for field in STATE_FIELDS], dtype=np.int32)
+# 自然変化で悪化する負荷の閾値と増加量（cpu, memory, diskの順）
+_LOAD_THRESHOLDS = np.array([[80], [80], [90]], dtype=np.int32)
+_LOAD_STEPS = np.array([[3], [2], [1]], dtype=np.int32)
+
+
+def clamp(field, value):
+    """フィールドの範囲内に値を丸める"""
+    upper = UPPER_BOUNDS[field]
+    if upper is not None:
+        value = min(upper, value)
+    return max(0, value)
+
+
 class SystemState:
+    # 状態はスロットで持つ（インスタンスごとの__dict__は持たない）
+    __slots__ = STATE_FIELDS
+
     def __init__(self):
         # 基本状態
         self.cpu = 50        # CPU使用率 (%)
@@ -48,130 +94,186 @@ class SystemState:
         if self.cpu > 80 or self.memory > 80 or self.disk > 80:
             self.alerts = min(10, self.alerts + 1)
 
+    def apply_effect(self, field, delta):
+        """1フィールドに効果を加算して範囲内に丸め、変化量を返す"""
+        old_value = getattr(self, field)
+        setattr(self, field, clamp(field, old_value + delta))
+        return getattr(self, field) - old_value
+
+    def apply_effects(self, effects, fields=STATE_FIELDS):
+        """効果辞書に含まれるフィールドのみ適用し、変化量の辞書を返す"""
+        changes = {}
+        for field in fields:
+            key = EFFECT_KEYS[field]
+            if key in effects:
+                changes[field] = self.apply_effect(field, effects[key])
+        return changes
+
     def apply_event(self, event):
         """イベントの影響をシステム状態に適用"""
-        changes = {}
+        return self.apply_effects(event)
+
+    def apply_action(self, action, success=True):
+        """アクションの結果をシステム状態に適用"""
+        if success:
+            # 成功時の影響を適用
+            return self.apply_effects(action)
+
+        # 失敗時の影響を適用
+        # 失敗時はSLAリスクと負荷が増加する
+        changes = {"sla_risk": self.apply_effect("sla_risk", 15)}
+
+        # 特定のアクションに失敗すると状態が悪化する場合
+        if "failure_effects" in action:
+            changes.update(self.apply_effects(action["failure_effects"], FAILURE_FIELDS))
+        else:
+            # デフォルトの失敗影響
+            if "cpu_effect" in action and action["cpu_effect"] < 0:
+                # CPU負荷を軽減するアクションの失敗は、逆に負荷を増大させる可能性
+                changes["cpu"] = self.apply_effect("cpu", 10)
 
-        # CPUへの影響
-        if "cpu_effect" in event:
-            old_cpu = self.cpu
-            self.cpu = max(0, min(100, self.cpu + event["cpu_effect"]))
-            changes["cpu"] = self.cpu - old_cpu
-
-        # メモリへの影響
-        if "memory_effect" in event:
-            old_memory = self.memory
-            self.memory = max(0, min(100, self.memory + event["memory_effect"]))
-            changes["memory"] = self.memory - old_memory
-
-        # ディスクへの影響
-        if "disk_effect" in event:
-            old_disk = self.disk
-            self.disk = max(0, min(100, self.disk + event["disk_effect"]))
-            changes["disk"] = self.disk - old_disk
-
-        # ネットワークへの影響
-        if "network_effect" in event:
-            old_network = self.network
-            self.network = max(0, min(100, self.network + event["network_effect"]))
-            changes["network"] = self.network - old_network
-
-        # サービス数への影響
-        if "service_effect" in event:
-            old_services = self.services
-            self.services = max(0, self.services + event["service_effect"])
-            changes["services"] = self.services - old_services
-
-        # アラート数への影響
-        if "alert_effect" in event:
+            # アラート増加
             old_alerts = self.alerts
-            self.alerts = max(0, self.alerts + event["alert_effect"])
+            self.alerts = min(10, self.alerts + 1)
             changes["alerts"] = self.alerts - old_alerts
 
-        # SLAリスクへの影響
-        if "sla_risk_effect" in event:
-            old_sla_risk = self.sla_risk
-            self.sla_risk = max(0, min(100, self.sla_risk + event["sla_risk_effect"]))
-            changes["sla_risk"] = self.sla_risk - old_sla_risk
-
         return changes
 
-    def apply_action(self, action, success=True):
-        """アクションの結果をシステム状態に適用"""
-        changes = {}
 
-        if success:
-            # 成功時の影響を適用
-            if "cpu_effect" in action:
-                old_cpu = self.cpu
-                self.cpu = max(0, min(100, self.cpu + action["cpu_effect"]))
-                changes["cpu"] = self.cpu - old_cpu
-
-            if "memory_effect" in action:
-                old_memory = self.memory
-                self.memory = max(0, min(100, self.memory + action["memory_effect"]))
-                changes["memory"] = self.memory - old_memory
-
-            if "disk_effect" in action:
-                old_disk = self.disk
-                self.disk = max(0, min(100, self.disk + action["disk_effect"]))
-                changes["disk"] = self.disk - old_disk
-
-            if "network_effect" in action:
-                old_network = self.network
-                self.network = max(0, min(100, self.network + action["network_effect"]))
-                changes["network"] = self.network - old_network
-
-            if "service_effect" in action:
-                old_services = self.services
-                self.services = max(0, self.services + action["service_effect"])
-                changes["services"] = self.services - old_services
-
-            if "alert_effect" in action:
-                old_alerts = self.alerts
-                self.alerts = max(0, self.alerts + action["alert_effect"])
-                changes["alerts"] = self.alerts - old_alerts
-
-            if "sla_risk_effect" in action:
-                old_sla_risk = self.sla_risk
-                self.sla_risk = max(0, min(100, self.sla_risk + action["sla_risk_effect"]))
-                changes["sla_risk"] = self.sla_risk - old_sla_risk
+def _field_view(index):
+    """SystemStateBatchのフィールド行を返すプロパティ"""
+    return property(lambda self: self.values[index])
+
+
+class SystemStateBatch:
+    """SystemStateの構造体配列版
+
+    各フィールドを長さNの整数配列として (フィールド数, N) の行列に保持し、
+    効果適用・自然変化・危機判定をマスク付きの配列演算でまとめて行う。
+    効果はフィールド順 (STATE_FIELDS) に並んだ (N, フィールド数) の配列で渡す。
+    1回の適用で各フィールドに加わる効果は1つなので、全フィールド分を (フィールド数, N) の
+    変化量にまとめて一度に加算・丸めする（フィールドごとの順次適用と同じ結果になる）。
+    """
+
+    cpu = _field_view(0)
+    memory = _field_view(1)
+    disk = _field_view(2)
+    network = _field_view(3)
+    services = _field_view(4)
+    alerts = _field_view(5)
+    sla_risk = _field_view(6)
+
+    def __init__(self, values):
+        self.values = np.ascontiguousarray(values, dtype=np.int32)
+
+    @classmethod
+    def from_initial(cls, initial_state, size):
+        """同一の初期状態をsize個並べたバッチを作成"""
+        row = np.array([initial_state[field] for field in STATE_FIELDS], dtype=np.int32)
+        return cls(np.repeat(row[:, None], size, axis=1))
+
+    @classmethod
+    def from_states(cls, states):
+        """SystemStateのリストからバッチを作成"""
+        values = [[getattr(state, field) for state in states] for field in STATE_FIELDS]
+        return cls(np.array(values, dtype=np.int32).reshape(len(STATE_FIELDS), len(states)))
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def copy(self):
+        return SystemStateBatch(self.values.copy())
+
+    def get_state(self, index):
+        """index番目の状態をSystemStateとして取得"""
+        state = SystemState()
+        for field, value in zip(STATE_FIELDS, self.values[:, index]):
+            setattr(state, field, int(value))
+        return state
+
+    def _mask(self, mask):
+        if mask is None:
+            return np.ones(len(self), dtype=bool)
+        return mask
+
+    def apply_effect(self, field, delta, mask=None, upper=None):
+        """1フィールドに効果を加算して範囲内に丸め、変化量の配列を返す
+
+        upperを指定するとフィールド既定の上限の代わりに使う。
+        """
+        index = _ROWS[field]
+        upper = _UPPER_COLUMN[index] if upper is None else upper
+        return self._add(slice(index, index + 1), np.reshape(delta, (1, -1)), mask, upper)[0]
+
+    def _add(self, rows, deltas, mask, upper):
+        """rowsの行に (行数, N) の変化量を加えて範囲内に丸め、実際の変化量を返す"""
+        current = self.values[rows]
+        change = current + deltas
+        np.minimum(change, upper, out=change)
+        np.maximum(change, 0, out=change)
+        change -= current
+        if mask is not None:
+            change *= mask
+        self.values[rows] += change
+        return change
+
+    def apply_effects(self, effects, mask=None, fields=STATE_FIELDS):
+        """(N, フィールド数) の効果配列を適用し、フィールドごとの変化量配列を返す"""
+        if fields == STATE_FIELDS:
+            changes = self._add(slice(None), effects.T, mask, _UPPER_COLUMN)
         else:
-            # 失敗時の影響を適用
-            # 失敗時はSLAリスクと負荷が増加する
-            old_sla_risk = self.sla_risk
-            self.sla_risk = min(100, self.sla_risk + 15)
-            changes["sla_risk"] = self.sla_risk - old_sla_risk
-
-            # 特定のアクションに失敗すると状態が悪化する場合
-            if "failure_effects" in action:
-                failure = action["failure_effects"]
-
-                if "cpu_effect" in failure:
-                    old_cpu = self.cpu
-                    self.cpu = max(0, min(100, self.cpu + failure["cpu_effect"]))
-                    changes["cpu"] = self.cpu - old_cpu
-
-                if "memory_effect" in failure:
-                    old_memory = self.memory
-                    self.memory = max(0, min(100, self.memory + failure["memory_effect"]))
-                    changes["memory"] = self.memory - old_memory
-
-                if "service_effect" in failure:
-                    old_services = self.services
-                    self.services = max(0, self.services + failure["service_effect"])
-                    changes["services"] = self.services - old_services
-            else:
-                # デフォルトの失敗影響
-                if "cpu_effect" in action and action["cpu_effect"] < 0:
-                    # CPU負荷を軽減するアクションの失敗は、逆に負荷を増大させる可能性
-                    old_cpu = self.cpu
-                    self.cpu = min(100, self.cpu + 10)
-                    changes["cpu"] = self.cpu - old_cpu
-
-                # アラート増加
-                old_alerts = self.alerts
-                self.alerts = min(10, self.alerts + 1)
-                changes["alerts"] = self.alerts - old_alerts
-
-        return changes
\ No newline at end of file
+            rows = [_ROWS[field] for field in fields]
+            changes = self._add(rows, effects.T, mask, _UPPER_COLUMN[rows])
+        return dict(zip(fields, changes))
+
+    def apply_event(self, event_effects, mask=None):
+        """イベントの影響を適用（SystemState.apply_eventの配列版）"""
+        return self.apply_effects(event_effects, mask)
+
+    def apply_action(self, success_effects, success, failure_effects, has_failure_effects,
+                     failure_cpu_penalty, mask=None):
+        """アクションの結果を適用（SystemState.apply_actionの配列版）
+
+        success_effects: (N, フィールド数) 成功時の効果
+        failure_effects: (N, len(FAILURE_FIELDS)) 失敗時の個別影響
+        has_failure_effects: failure_effectsが定義されているか
+        failure_cpu_penalty: デフォルト失敗時にCPU負荷が増えるか（cpu_effect < 0）
+        """
+        mask = self._mask(mask)
+        failed = mask & ~success
+        with_effects = failed & has_failure_effects
+        default = failed & ~has_failure_effects
+
+        # 成功時の効果と、失敗時のSLAリスク上昇・個別影響・デフォルトのCPU負荷増加は
+        # どのエピソードでもフィールドが重ならないため、1つの変化量にまとめて適用する
+        deltas = np.where(success, success_effects.T, 0)
+        deltas[_ROWS["sla_risk"]] += np.where(failed, 15, 0)
+        for column, field in enumerate(FAILURE_FIELDS):
+            deltas[_ROWS[field]] += np.where(with_effects, failure_effects[:, column], 0)
+        deltas[_ROWS["cpu"]] += np.where(default & failure_cpu_penalty, 10, 0)
+        changes = dict(zip(STATE_FIELDS, self._add(slice(None), deltas, mask, _UPPER_COLUMN)))
+
+        # デフォルトの失敗影響のアラート増加（上限10）
+        changes["alerts"] = changes["alerts"] + self.apply_effect("alerts", 1, default, upper=10)
+        return changes
+
+    def natural_progression(self, mask=None):
+        """時間経過による自然な状態変化（SystemState.natural_progressionの配列版）"""
+        mask = self._mask(mask)
+
+        self.apply_effect("sla_risk", 5, mask)
+
+        # 負荷の高いリソースはさらに悪化する傾向（CPU・メモリ・ディスクの行をまとめて適用）
+        loads = self.values[_ROWS["cpu"]:_ROWS["disk"] + 1]
+        deltas = (loads > _LOAD_THRESHOLDS) * _LOAD_STEPS
+        self._add(slice(_ROWS["cpu"], _ROWS["disk"] + 1), deltas, mask,
+                  _UPPER_COLUMN[_ROWS["cpu"]:_ROWS["disk"] + 1])
+
+        # アラートは徐々に増加する傾向（更新後の値で判定）
+        loaded = mask & ((self.cpu > 80) | (self.memory > 80) | (self.disk > 80))
+        self.apply_effect("alerts", 1, loaded, upper=10)
+
+    def is_critical(self):
+        """危機的状態かどうかをエピソードごとに判定"""
+        return ((self.cpu >= 95) | (self.memory >= 95) | (self.disk >= 98)
+                | (self.services <= 1) | (self.sla_risk >= 90))
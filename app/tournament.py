@@ -0,0 +1,176 @@
+import os
+import zlib
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from app.simulator import InfraRiskSimulator
+
+# 1エピソード分の結果レコード
+TournamentRecord = namedtuple(
+    "TournamentRecord", ["policy", "scenario_id", "seed", "score", "turns", "critical"]
+)
+
+# ワーカープロセスごとに1度だけ作成するシミュレータとポリシー
+_worker = {}
+
+
+def random_policy(simulator, available_actions):
+    """提示されたアクションから一様に選択"""
+    if not available_actions:
+        return None
+    return simulator.rng.choice(available_actions)["id"]
+
+
+def greedy_policy(simulator, available_actions):
+    """リスク期待値が最大のアクションを選択"""
+    if not available_actions:
+        return None
+    engine = simulator.probability_engine
+    return max(available_actions, key=lambda action: engine.calculate_risk_expectation(
+        action, simulator.system_state))["id"]
+
+
+BUILTIN_POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+
+def resolve_policies(policies):
+    """ポリシー指定を {名前: 選択関数} の辞書に変換
+
+    policies: 名前（"random" / "greedy"）または callable(simulator, available_actions) の
+              リスト、もしくは {名前: 指定} の辞書。callableはアクションID（Noneで見送り）を返す
+    """
+    if isinstance(policies, dict):
+        items = policies.items()
+    else:
+        items = [(policy if isinstance(policy, str) else getattr(policy, "__name__", repr(policy)),
+                  policy) for policy in policies]
+
+    resolved = {}
+    for name, policy in items:
+        if isinstance(policy, str):
+            if policy not in BUILTIN_POLICIES:
+                raise ValueError(f"不明なポリシーです: {policy}")
+            policy = BUILTIN_POLICIES[policy]
+        resolved[name] = policy
+    return resolved
+
+
+def play_episode(simulator, policy, scenario_id, seed):
+    """1エピソードを実行して結果レコードの値を返す
+
+    シミュレータの乱数ストリームをシナリオとシードから初期化するため、
+    同じ組なら実行するプロセスによらず、全ポリシーで同じ乱数列から始まる。
+    戻り値: (スコア, ターン数, 危機的状態で終了したか)
+    """
+    simulator.rng.seed([seed, zlib.crc32(scenario_id.encode())])
+    simulator.start_scenario(scenario_id)
+    critical = False
+
+    while not simulator.game_over and simulator.turn < simulator.max_turns:
+        turn_result = simulator.next_turn()
+        if turn_result["game_over"]:
+            critical = "state" in turn_result
+            break
+
+        available_actions = simulator.get_available_actions()
+        action_id = policy(simulator, available_actions)
+        if action_id is None:
+            continue
+
+        action_result = simulator.take_action(action_id)
+        if action_result["game_over"]:
+            critical = True
+            break
+
+    return simulator.calculate_score(), simulator.turn, critical
+
+
+def _init_worker(scenarios_file, actions_file, policies):
+    """ワーカーの初期化（カタログの読み込みはプロセスごとに1度だけ）"""
+    _worker["simulator"] = InfraRiskSimulator(scenarios_file, actions_file, log_dir=None)
+    _worker["policies"] = policies
+
+
+def _run_task(policy_name, scenario_id, seeds):
+    """ワーカー内で1ポリシー×1シナリオ×複数シードを実行"""
+    simulator = _worker["simulator"]
+    policy = _worker["policies"][policy_name]
+    return [
+        TournamentRecord(policy_name, scenario_id, seed, *play_episode(simulator, policy,
+                                                                       scenario_id, seed))
+        for seed in seeds
+    ]
+
+
+def run_tournament(policies, scenario_ids=None, seeds=10, workers=None,
+                   scenarios_file="data/scenarios.csv", actions_file="data/actions.csv",
+                   chunk_size=32):
+    """ポリシー×シナリオ×シードの全組み合わせを並列に実行し、結果を順次返す
+
+    policies: resolve_policiesが受け付けるポリシー指定
+    scenario_ids: 対象シナリオID（省略時はシナリオファイルの全件）
+    seeds: シード数またはシードの列
+    workers: プロセス数（省略時はCPUコア数、1ならプロセスを使わずに実行）
+    chunk_size: 1タスクにまとめるシード数
+    戻り値: TournamentRecordを完了順に返すジェネレータ
+    """
+    policies = resolve_policies(policies)
+    if scenario_ids is None:
+        simulator = InfraRiskSimulator(scenarios_file, actions_file, log_dir=None)
+        scenario_ids = [scenario["id"] for scenario in simulator.event_manager.scenarios]
+    if isinstance(seeds, int):
+        seeds = range(seeds)
+    elif not isinstance(seeds, range):
+        seeds = list(seeds)
+    tasks = (
+        (name, scenario_id, seeds[start:start + chunk_size])
+        for name in policies
+        for scenario_id in scenario_ids
+        for start in range(0, len(seeds), chunk_size)
+    )
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(scenarios_file, actions_file, policies)
+        for task in tasks:
+            yield from _run_task(*task)
+        return
+
+    # 実行中・未取得のタスクをワーカー数の2倍までに抑え、結果を溜め込まない
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(scenarios_file, actions_file, policies)) as executor:
+        pending = set()
+        for task in tasks:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(_run_task, *task))
+        for future in as_completed(pending):
+            yield from future.result()
+
+
+def summarize_tournament(records):
+    """結果レコードをポリシー×シナリオごとに集計
+
+    戻り値: {(ポリシー名, シナリオID): {"episodes", "mean_score", "critical_rate", "mean_turns"}}
+    """
+    totals = {}
+    for record in records:
+        total = totals.setdefault((record.policy, record.scenario_id), [0, 0, 0, 0])
+        total[0] += 1
+        total[1] += record.score
+        total[2] += record.critical
+        total[3] += record.turns
+
+    return {
+        key: {
+            "episodes": count,
+            "mean_score": score / count,
+            "critical_rate": critical / count,
+            "mean_turns": turns / count,
+        }
+        for key, (count, score, critical, turns) in totals.items()
+    }
@@ -3,23 +3,279 @@ import sys
 import os
 import argparse
 import time
+import csv
+import json
+import numpy as np
 
 # パスの調整（実行ディレクトリに関わらず動作するように）
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.simulator import InfraRiskSimulator
 from app.report import ReportGenerator
+from app.tournament import TournamentRecord, run_tournament
+from app.analytics import LogAnalyzer
+from app.columnar_log import convert_log_dir
+from app.log_segments import SegmentStore, segment_dir_for
+from app.cohort_reports import COHORT_DIR, cohort_members, logged_sessions, render_cohort_reports
+from app.score_ranks import ScoreRanks
 from cli.display import CliDisplay
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='インフラリスク管理シミュレータ')
     parser.add_argument('--scenario', type=str, help='使用するシナリオID')
     parser.add_argument('--actions-file', type=str, default='data/actions.csv', help='アクションデータファイル')
     parser.add_argument('--scenarios-file', type=str, default='data/scenarios.csv', help='シナリオデータファイル')
-    return parser.parse_args()
+
+    # 非対話のバッチ実行
+    batch = parser.add_argument_group('バッチ実行')
+    batch.add_argument('--batch', action='store_true', help='画面表示なしでエピソードを一括実行')
+    batch.add_argument('--policy', type=str, default='greedy',
+                       help='ポリシー（random / greedy、カンマ区切りで複数指定可）')
+    batch.add_argument('--episodes', type=int, default=100, help='シナリオごとのエピソード数')
+    batch.add_argument('--scenarios', type=str, help='対象シナリオID（カンマ区切り、省略時は全件）')
+    batch.add_argument('--workers', type=int, help='ワーカープロセス数（省略時はCPUコア数）')
+    batch.add_argument('--seed', type=int, default=0, help='最初のエピソードのシード')
+    batch.add_argument('--output', type=str, help='エピソードごとの結果の出力先（.csv / .jsonl）')
+
+    # 蓄積したセッションログの集計（--workers・--outputも使う）
+    analytics = parser.add_argument_group('ログ集計')
+    analytics.add_argument('--analyze-logs', action='store_true',
+                           help='セッションログを集計する（前回以降に追記された分だけ読む）')
+    analytics.add_argument('--log-dir', type=str, default='data/logs', help='セッションログのディレクトリ')
+    analytics.add_argument('--log-index', type=str, default='data/reports/log_index.json',
+                           help='読み込み済みの位置と集計値を保存するインデックス')
+    analytics.add_argument('--convert-logs', type=str, metavar='DIR',
+                           help='--log-dirのJSONLログを列指向のバイナリ形式（.irl）に変換してDIRに保存')
+
+    # セッションごとのログファイルを日ごとのセグメントにまとめる（Webサーバの実行中でもよい）
+    segments = parser.add_argument_group('ログのセグメント化')
+    segments.add_argument('--compact-logs', action='store_true',
+                          help='更新の止まったセッションログを--log-dir/segmentsのセグメントにまとめる')
+    segments.add_argument('--idle-minutes', type=int, default=120,
+                          help='まとめる対象とする最終更新からの経過時間（セッションの有効期限以上）')
+    segments.add_argument('--segment-mb', type=int, default=64, help='1セグメントの上限サイズ')
+    segments.add_argument('--retention-days', type=int, help='セグメントの保存日数')
+    segments.add_argument('--max-segments-mb', type=int, help='セグメントの合計サイズの上限（古い順に削除）')
+
+    # 研修後に参加者全員のPDFレポートをセッションログから作成する（--log-dir・--workersも使う）
+    cohort = parser.add_argument_group('コホートのレポート')
+    cohort.add_argument('--cohort-reports', type=str, metavar='DIR',
+                        help='セッションごとのPDFレポートと結果一覧（index.csv）をDIRに作成')
+    cohort.add_argument('--cohort', type=str, help='対象のコホート名（Webで開始時に指定したもの）')
+    cohort.add_argument('--cohort-dir', type=str, default=COHORT_DIR, help='コホートの参加者一覧のディレクトリ')
+    cohort.add_argument('--session-prefix', type=str, default='',
+                        help='--cohortを省略した場合の対象セッションIDの接頭辞（例: 開始日の20240401）')
+
+    # 終了したプレイのスコア・生存ターン数の分布（レポートに同じシナリオの全プレイの中での順位を載せる）
+    ranks = parser.add_argument_group('順位')
+    ranks.add_argument('--score-ranks', type=str, default='data/reports/score_ranks.sqlite3',
+                       help='スコアの分布のファイル（Webサーバと共有する）')
+    ranks.add_argument('--merge-score-ranks', type=str, nargs='+', metavar='FILE',
+                       help='別ホストのスコアの分布のファイルを--score-ranksに取り込む')
+    return parser.parse_args(argv)
+
+
+def open_result_writer(file_path):
+    """結果の出力先を開き、(レコードを書き込む関数, ファイル) を返す"""
+    f = open(file_path, 'w', encoding='utf-8', newline='')
+    if file_path.endswith('.jsonl'):
+        return lambda record: f.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n"), f
+
+    writer = csv.writer(f)
+    writer.writerow(TournamentRecord._fields)
+    return writer.writerow, f
+
+
+class BatchScores:
+    """ポリシーごとのスコアの度数と危機的状態での終了数
+
+    スコアは範囲の限られた整数なので、レコードを保持せずに度数だけを数える
+    （エピソード数によらずメモリ使用量が一定）。
+    """
+
+    def __init__(self):
+        self.episodes = 0
+        self.policies = {}  # ポリシー名: {"counts": スコアごとの度数, "critical": 危機的状態での終了数}
+
+    def add(self, record):
+        self.episodes += 1
+        policy = self.policies.setdefault(record.policy, {"counts": {}, "critical": 0})
+        policy["counts"][record.score] = policy["counts"].get(record.score, 0) + 1
+        policy["critical"] += record.critical
+
+    @staticmethod
+    def percentiles(counts, qs):
+        """度数からnumpy.percentile（線形補間）と同じ値を求める"""
+        values = sorted(counts)
+        ends = np.cumsum([counts[value] for value in values])
+        n = ends[-1]
+
+        def nth(i):
+            return values[int(np.searchsorted(ends, i, side="right"))]
+
+        results = []
+        for q in qs:
+            position = q / 100 * (n - 1)
+            lower = int(np.floor(position))
+            low, high = nth(lower), nth(min(lower + 1, n - 1))
+            results.append(low + (high - low) * (position - lower))
+        return results
+
+
+def print_batch_summary(scores, elapsed):
+    """スループットとポリシーごとのスコア分布を表示"""
+    print(f"エピソード数: {scores.episodes}  経過時間: {elapsed:.2f}秒  "
+          f"スループット: {scores.episodes / max(elapsed, 1e-9):.1f} エピソード/秒")
+
+    print(f"{'ポリシー':<12}{'平均':>9}{'標準偏差':>9}{'最小':>7}{'p10':>7}{'中央値':>7}"
+          f"{'p90':>7}{'最大':>7}{'危機率':>8}")
+    for policy, totals in scores.policies.items():
+        counts = totals["counts"]
+        values = np.array(list(counts), dtype=float)
+        weights = np.array(list(counts.values()), dtype=float)
+        n = weights.sum()
+        mean = (values * weights).sum() / n
+        std = np.sqrt(((values - mean) ** 2 * weights).sum() / n)
+        p10, p50, p90 = BatchScores.percentiles(counts, [10, 50, 90])
+        print(f"{policy:<12}{mean:>9.1f}{std:>9.1f}{min(counts):>7}"
+              f"{p10:>7.0f}{p50:>7.0f}{p90:>7.0f}{max(counts):>7}{totals['critical'] / n:>8.1%}")
+
+
+def run_batch(args):
+    """バッチモード: 画面表示・ステップごとのログなしで全組み合わせを実行
+
+    レコードは保持せずに出力先へ順次書き込み、集計は度数だけを持つ。
+    """
+    policies = [policy.strip() for policy in args.policy.split(',') if policy.strip()]
+    scenario_ids = None
+    if args.scenarios:
+        scenario_ids = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    seeds = range(args.seed, args.seed + args.episodes)
+
+    write, output = open_result_writer(args.output) if args.output else (None, None)
+    scores = BatchScores()
+    start = time.perf_counter()
+    try:
+        for record in run_tournament(policies, scenario_ids, seeds, workers=args.workers,
+                                     scenarios_file=args.scenarios_file,
+                                     actions_file=args.actions_file):
+            scores.add(record)
+            if write:
+                write(record)
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print_batch_summary(scores, elapsed)
+    if args.output:
+        print(f"結果を保存しました: {args.output}")
+    return scores
+
+def print_log_summary(summary):
+    """ログ集計の結果を表示"""
+    print(f"読み込んだ行数: {summary['lines']}（読めなかった行: {summary['bad_lines']}）")
+
+    print(f"{'アクション':<10}{'試行':>7}{'実績':>8}{'予測':>8}{'差':>8}")
+    for action_id, row in summary["actions"].items():
+        print(f"{action_id:<10}{row['attempts']:>7}{row['success_rate']:>8.1%}"
+              f"{row['predicted_rate']:>8.1%}{row['difference']:>+8.1%}")
+
+    print(f"{'シナリオ':<10}{'件数':>7}{'危機':>7}{'完了':>7}{'中断':>7}{'平均':>9}"
+          f"{'p10':>7}{'中央値':>7}{'p90':>7}")
+    for scenario_id, row in summary["scenarios"].items():
+        outcomes, percentiles = row["outcomes"], row["score_percentiles"]
+        mean = "-" if row["score_mean"] is None else f"{row['score_mean']:.1f}"
+        print(f"{scenario_id:<10}{row['episodes']:>7}{outcomes.get('critical', 0):>7}"
+              f"{outcomes.get('completed', 0):>7}{outcomes.get('abandoned', 0):>7}{mean:>9}"
+              + "".join(f"{'-' if v is None else v:>7}" for v in percentiles.values()))
+
+    print("状態ごとのアクション選択（上位3件）")
+    for row in summary["choices"].values():
+        top = ", ".join(f"{action_id} {choice['share']:.0%}"
+                        for action_id, choice in list(row["actions"].items())[:3])
+        print(f"  {row['label']:<36}{top}")
+
+
+def run_log_analysis(args):
+    """ログ集計モード: 新しいログだけを読んで集計値を更新し、結果を表示"""
+    analyzer = LogAnalyzer(args.log_dir, args.log_index)
+    start = time.perf_counter()
+    files = analyzer.update(workers=args.workers or os.cpu_count())
+    print(f"読み込んだファイル: {files}件  経過時間: {time.perf_counter() - start:.2f}秒")
+
+    summary = analyzer.summary()
+    print_log_summary(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+    return summary
+
+def run_log_compaction(args):
+    """セグメント化モード: 古いセッションログをセグメントに移し、保存期間・容量を超えた分を削除"""
+    store = SegmentStore(segment_dir_for(args.log_dir),
+                         max_segment_bytes=args.segment_mb * 1024 * 1024)
+    moved = store.compact(args.log_dir, idle_seconds=args.idle_minutes * 60)
+    max_bytes = None if args.max_segments_mb is None else args.max_segments_mb * 1024 * 1024
+    removed = store.apply_retention(args.retention_days, max_bytes)
+    stats = store.stats()
+    print(f"セグメントに移したファイル: {moved}件  削除したセグメント: {removed}件")
+    print(f"セグメント: {stats['segments']}件 / {stats['bytes'] / (1024 * 1024):.1f} MiB / "
+          f"{stats['sessions']}セッション")
+    return stats
+
+def run_cohort_reports(args):
+    """コホートのレポートモード: 参加者のセッションログからPDFを並列に作成し、結果一覧を書き出す"""
+    if args.cohort:
+        session_ids = cohort_members(args.cohort, args.cohort_dir)
+    else:
+        session_ids = logged_sessions(args.log_dir, args.session_prefix)
+    start = time.perf_counter()
+    rows = render_cohort_reports(session_ids, args.log_dir, args.cohort_reports,
+                                 args.scenarios_file, args.actions_file,
+                                 workers=args.workers or os.cpu_count(),
+                                 ranks_file=args.score_ranks if os.path.exists(args.score_ranks) else None)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for row in rows if not row["pdf"])
+    print(f"セッション: {len(session_ids)}件  レポート: {len(rows) - failed}件  失敗: {failed}件  "
+          f"経過時間: {elapsed:.2f}秒")
+    print(f"結果一覧: {os.path.join(args.cohort_reports, 'index.csv')}")
+    return rows
+
+def run_merge_score_ranks(args):
+    """別ホストのスコアの分布を取り込む（取り込み済みのファイルは数えない）"""
+    ranks = ScoreRanks(args.score_ranks)
+    for path in args.merge_score_ranks:
+        try:
+            merged = ranks.merge(path)
+        except ValueError as e:
+            print(e)
+            continue
+        print(f"{'取り込みました' if merged else '取り込み済みです'}: {path}")
+    ranks.close()
 
 def main():
     args = parse_args()
+    if args.batch:
+        run_batch(args)
+        return
+    if args.compact_logs:
+        run_log_compaction(args)
+        return
+    if args.merge_score_ranks:
+        run_merge_score_ranks(args)
+        return
+    if args.cohort_reports:
+        run_cohort_reports(args)
+        return
+    if args.convert_logs:
+        converted = convert_log_dir(args.log_dir, args.convert_logs)
+        print(f"変換したファイル: {converted}件 → {args.convert_logs}")
+    if args.analyze_logs:
+        run_log_analysis(args)
+    if args.convert_logs or args.analyze_logs:
+        return
 
     # シミュレータの初期化
     simulator = InfraRiskSimulator(
@@ -82,8 +338,12 @@ def main():
     # ゲーム終了表示
     display.show_game_over(simulator.calculate_score())
 
+    # 終了したプレイをスコアの分布に加え、レポートに順位を載せる
+    ranks = ScoreRanks(args.score_ranks)
+    ranks.record_simulator(simulator)
+
     # レポート生成
-    report_generator = ReportGenerator(simulator)
+    report_generator = ReportGenerator(simulator, ranks=ranks)
 
     # テキストレポート表示
     display.show_message("\n===== 対応レポート =====")
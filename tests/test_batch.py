@@ -0,0 +1,124 @@
+import pytest
+import os
+import sys
+import numpy as np
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.batch import BatchSimulator, NO_ACTION, calculate_scores, greedy_policy
+from app.state import SystemStateBatch
+from app.probability import ProbabilityEngine
+
+class TestBatchSimulator:
+    """BatchSimulatorクラスのテスト"""
+
+    @pytest.fixture
+    def engine(self):
+        """テスト用バッチエンジン"""
+        return BatchSimulator()
+
+    @pytest.fixture
+    def random_states(self):
+        """ランダムな状態のバッチ"""
+        rng = np.random.default_rng(0)
+        n = 500
+        return SystemStateBatch(np.vstack([
+            rng.integers(0, 101, n), rng.integers(0, 101, n), rng.integers(0, 101, n),
+            rng.integers(0, 101, n), rng.integers(0, 8, n), rng.integers(0, 12, n),
+            rng.integers(0, 101, n)
+        ]))
+
+    def test_apply_action_matches_system_state(self, engine, random_states):
+        """アクション適用結果がSystemState.apply_actionと一致するかテスト"""
+        rng = np.random.default_rng(1)
+        n = len(random_states)
+        actions = rng.integers(0, len(engine.actions), n)
+        success = rng.random(n) < 0.5
+
+        batch_states = random_states.copy()
+        changes = engine.apply_action(batch_states, actions, success, np.ones(n, dtype=bool))
+
+        for i in range(n):
+            state = random_states.get_state(i)
+            expected_changes = state.apply_action(engine.actions[actions[i]], bool(success[i]))
+            assert state.get_state_dict() == batch_states.get_state(i).get_state_dict()
+            for field, change in expected_changes.items():
+                assert changes[field][i] == change
+
+    def test_default_failure_matches_system_state(self, engine, random_states):
+        """失敗時の影響が未定義のアクションもSystemState.apply_actionと一致するかテスト"""
+        engine.actions = [dict(action) for action in engine.actions]
+        for action in engine.actions[::2]:
+            action.pop("failure_effects", None)
+        engine._compile_actions()
+        n = len(random_states)
+        actions = np.arange(n) % len(engine.actions)
+        success = np.zeros(n, dtype=bool)
+
+        batch_states = random_states.copy()
+        engine.apply_action(batch_states, actions, success, np.ones(n, dtype=bool))
+
+        for i in range(n):
+            state = random_states.get_state(i)
+            state.apply_action(engine.actions[actions[i]], False)
+            assert state.get_state_dict() == batch_states.get_state(i).get_state_dict()
+
+    def test_greedy_picks_highest_expectation(self, engine, random_states):
+        """貪欲ポリシーが提示中でリスク期待値が最大（同値は番号の小さい）のアクションを選ぶかテスト"""
+        rng = np.random.default_rng(2)
+        offered = rng.random((len(random_states), len(engine.actions))) < 0.3
+        offered[:10] = False
+
+        choice = greedy_policy(engine, random_states, offered, 1, rng)
+
+        expectations = np.where(offered, engine.risk_expectations(random_states), -np.inf)
+        expected = np.where(offered.any(axis=1), expectations.argmax(axis=1), NO_ACTION)
+        assert (choice == expected).all()
+
+    def test_rates_and_expectations_match_engine(self, engine, random_states):
+        """成功確率と期待値がProbabilityEngineと一致するかテスト"""
+        rates = engine.success_rates(random_states)
+        expectations = engine.risk_expectations(random_states)
+
+        for i in range(0, len(random_states), 25):
+            state = random_states.get_state(i)
+            for a, action in enumerate(engine.actions):
+                assert rates[i, a] == pytest.approx(
+                    ProbabilityEngine.calculate_success_rate(action, state))
+                assert expectations[i, a] == pytest.approx(
+                    ProbabilityEngine.calculate_risk_expectation(action, state))
+
+    def test_run_without_actions_is_deterministic(self, engine):
+        """アクションなしのエピソードがシナリオ通りに推移するかテスト"""
+        no_action = lambda engine, states, offered, turn, rng: np.full(offered.shape[0], NO_ACTION)
+        result = engine.run("S005", 4, policy=no_action, seed=0)
+
+        # 自然変化とデフォルトイベントのみでターン7に危機的状態になる
+        assert list(result["turns"]) == [7, 7, 7, 7]
+        assert result["critical"].all()
+        assert list(result["scores"]) == [-10, -10, -10, -10]
+
+    def test_run_result_shapes(self, engine):
+        """実行結果の配列形状テスト"""
+        for policy in ["random", "greedy"]:
+            result = engine.run("S007", 1000, policy=policy, seed=0, chunk_size=300)
+            assert result["scores"].shape == (1000,)
+            assert result["critical"].dtype == bool
+            assert ((result["turns"] >= 1) & (result["turns"] <= 10)).all()
+
+    def test_run_is_reproducible(self, engine):
+        """同じシードで同じ結果になるかテスト"""
+        first = engine.run("S014", 500, seed=42)
+        second = engine.run("S014", 500, seed=42)
+        assert (first["scores"] == second["scores"]).all()
+
+    def test_calculate_scores(self):
+        """スコア計算がInfraRiskSimulatorと同じ式かテスト"""
+        states = SystemStateBatch(np.array([[50], [50], [50], [50], [4], [0], [20]]))
+        # 4*100 + 50 + (10-5)*30 - 20*5
+        assert calculate_scores(states, np.array([5]))[0] == 400 + 50 + 150 - 100
+
+    def test_unknown_scenario(self, engine):
+        """存在しないシナリオ指定時のエラーテスト"""
+        with pytest.raises(ValueError):
+            engine.run("S999", 10)
@@ -0,0 +1,156 @@
+import pytest
+import os
+import sys
+import json
+import pickle
+import numpy as np
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.catalog import (CatalogCache, ActionCatalog, Record,
+                         load_action_catalog, load_scenario_catalog)
+from app.actions import ActionManager
+from app.events import EventManager
+from app.simulator import InfraRiskSimulator
+from app.rng import RandomStream
+
+ACTIONS_CSV = """id,name,category,description,cpu_effect,memory_effect,disk_effect,network_effect,service_effect,alert_effect,base_success_rate,cooldown,skill_tag
+A001,サーバ再起動,システム操作,再起動,-30,-25,0,0,0,0,0.8,2,運用/Linux
+A002,ログローテーション実行,メンテナンス,ログ削除,0,0,-35,0,0,0,x,,運用/Linux
+"""
+
+
+class TestCatalog:
+    """カタログとキャッシュのテスト"""
+
+    @pytest.fixture
+    def actions_file(self, tmp_path):
+        file_path = tmp_path / "actions.csv"
+        file_path.write_text(ACTIONS_CSV, encoding="utf-8")
+        return str(file_path)
+
+    def test_record_is_read_only(self):
+        """レコードが変更できず、dictとして扱えるかテスト"""
+        record = Record({"id": "A001", "cpu_effect": -30})
+        with pytest.raises(TypeError):
+            record["cpu_effect"] = 0
+        with pytest.raises(TypeError):
+            record.update({"cpu_effect": 0})
+        with pytest.raises(TypeError):
+            del record["id"]
+
+        assert json.loads(json.dumps(record)) == {"id": "A001", "cpu_effect": -30}
+        assert pickle.loads(pickle.dumps(record)) == record
+        copy = dict(record)
+        copy["cpu_effect"] = 0
+        assert record["cpu_effect"] == -30
+
+    def test_typed_records_and_indexes(self, actions_file):
+        """型変換と索引のテスト"""
+        catalog = ActionCatalog.parse(actions_file).actions
+        first, second = catalog.get("A001"), catalog.get("A002")
+        assert first["cpu_effect"] == -30 and first["cooldown"] == 2
+        assert first["base_success_rate"] == 0.8
+        assert first["failure_effects"] == {}
+        # 不正・空の値は既定値
+        assert second["base_success_rate"] == 0.7
+        assert second["cooldown"] == 0
+
+        assert catalog.get("A999") is None
+        assert catalog.find("skill_tag", "運用/Linux") == (first, second)
+        assert catalog.find("category", "メンテナンス") == (second,)
+        assert catalog.find("category", "不明") == ()
+
+    def test_scenario_catalog(self):
+        """シナリオとイベントの分割と型変換のテスト"""
+        catalog = load_scenario_catalog("data/scenarios.csv")
+        scenario = catalog.scenarios.get("S007")
+        assert scenario["initial_cpu"] == 80
+        assert all(s["id"].startswith("S") for s in catalog.scenarios)
+        assert scenario in catalog.scenarios.find("difficulty", "NORMAL")
+
+    def test_cache_is_shared(self):
+        """同じファイルのカタログが共有されるかテスト"""
+        assert load_action_catalog("data/actions.csv") is load_action_catalog("data/actions.csv")
+        first = InfraRiskSimulator(log_dir=None)
+        second = InfraRiskSimulator(log_dir=None)
+        assert first.action_manager.actions is second.action_manager.actions
+        assert first.event_manager.catalog is second.event_manager.catalog
+        assert first.probability_engine.rate_table is second.probability_engine.rate_table
+
+    def test_cache_invalidation(self, actions_file):
+        """ファイル内容が変わったときだけ再解析するかテスト"""
+        cache = CatalogCache()
+        first = cache.load(actions_file, ActionCatalog)
+
+        # 内容が同じなら更新時刻が変わっても再解析しない
+        os.utime(actions_file, ns=(0, 0))
+        assert cache.load(actions_file, ActionCatalog) is first
+
+        with open(actions_file, "a", encoding="utf-8") as f:
+            f.write("A003,キャッシュクリア実行,パフォーマンス対応,クリア,-25,-30,0,-10,0,-1,0.9,1,Redis\n")
+        second = cache.load(actions_file, ActionCatalog)
+        assert second is not first
+        assert len(second.actions) == 3
+
+    def test_managers_use_catalog(self):
+        """マネージャのID検索と索引検索のテスト"""
+        actions = ActionManager()
+        assert actions.get_action_by_id("A013")["name"] == "コンテナサービス再起動"
+        assert actions.get_action_by_id("A999") is None
+        assert [a["id"] for a in actions.get_actions_by_skill_tag("AWS/ELB")] == ["A007"]
+        assert {a["id"] for a in actions.get_actions_by_category("セキュリティ対応")} == \
+            {"A004", "A009", "A012"}
+
+        events = EventManager()
+        assert events.get_scenario_by_id("S014")["initial_services"] == 4
+        assert events.get_scenario_by_id("S999") is None
+        assert [s["id"] for s in events.get_scenarios_by_category("DB障害")] == ["S002"]
+
+    def test_available_actions_are_copies(self):
+        """提示アクションへの成功確率の付与がカタログを変更しないかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=0)
+        simulator.start_scenario("S007")
+        for action in simulator.get_available_actions():
+            assert "calculated_success_rate" in action
+            assert "calculated_success_rate" not in simulator.action_manager.get_action_by_id(
+                action["id"])
+
+    def test_weighted_events(self, tmp_path):
+        """イベントの重み・シナリオごとの倍率による発生確率のテスト"""
+        file_path = tmp_path / "scenarios.csv"
+        file_path.write_text(
+            "id,name,category,description,initial_cpu,initial_memory,initial_disk,"
+            "initial_network,initial_services,cpu_effect,memory_effect,weight,event_weights\n"
+            "S001,Web,アプリ,説明,50,50,50,50,5,,,,DB:3\n"
+            "S002,DB,DB,説明,50,50,50,50,5,,,,\n"
+            "E001,CPU上昇,アプリ,説明,,,,,,10,0,2,\n"
+            "E002,メモリ上昇,DB,説明,,,,,,0,10,,\n"
+            "E003,発生しない,DB,説明,,,,,,5,5,0,\n",
+            encoding="utf-8")
+        events = EventManager(str(file_path), rng=RandomStream(0))
+        assert events.events[0]["cpu_effect"] == 10 and events.events[0]["weight"] == 2.0
+        assert events.events[1]["weight"] == 1.0
+        with pytest.raises(TypeError):
+            events.events[0]["cpu_effect"] = 0
+
+        web, db = events.get_scenario_by_id("S001"), events.get_scenario_by_id("S002")
+        assert web["event_weights"] == {"DB": 3.0}
+        assert events.event_probabilities(db).tolist() == pytest.approx([2 / 3, 1 / 3, 0])
+        assert events.event_probabilities(web).tolist() == pytest.approx([0.4, 0.6, 0])
+        assert events.catalog.event_table(web) is events.catalog.event_table(web)
+
+        indices = events.sample_event_indices(RandomStream(1), 100000, web)
+        assert np.bincount(indices, minlength=3)[2] == 0
+        assert (indices == 1).mean() == pytest.approx(0.6, abs=0.01)
+        drawn = [events.get_random_event(web)["id"] for _ in range(2000)]
+        assert "E003" not in drawn
+        assert drawn.count("E002") / len(drawn) == pytest.approx(0.6, abs=0.04)
+
+    def test_default_event_distribution(self):
+        """イベントがないときはデフォルトイベントのみになるかテスト"""
+        events = EventManager()
+        assert events.events == ()
+        assert events.event_probabilities().tolist() == [1.0]
+        assert events.sample_event_indices(RandomStream(0), 5).tolist() == [0] * 5
+        assert events.get_random_event()["id"] == "E000"
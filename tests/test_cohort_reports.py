@@ -0,0 +1,84 @@
+import pytest
+import os
+import sys
+import csv
+import json
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.catalog import load_action_catalog, load_scenario_catalog
+from app.cohort_reports import (cohort_members, logged_sessions, rebuild_summary,
+                                record_cohort_member, render_cohort_reports)
+from app.log_segments import SegmentStore, segment_dir_for
+from app.report import ReportGenerator
+from app.simulator import InfraRiskSimulator
+from app.tournament import greedy_policy, random_policy, play_episode
+
+
+def played_session(log_dir, scenario_id, seed, policy=greedy_policy, episodes=1):
+    simulator = InfraRiskSimulator(log_dir=log_dir, seed=seed)
+    for episode in range(episodes):
+        play_episode(simulator, policy, scenario_id, seed + episode)
+    simulator.close_log()
+    return simulator
+
+
+def read_entries(log_dir, session_id):
+    with open(os.path.join(log_dir, f"{session_id}.json"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestRebuildSummary:
+    """ログからのサマリー復元のテスト"""
+
+    @pytest.mark.parametrize("scenario_id,seed,policy", [
+        ("S001", 1, greedy_policy), ("S007", 2, random_policy), ("S014", 3, greedy_policy),
+        ("S003", 4, random_policy)])
+    def test_matches_live_summary(self, tmp_path, scenario_id, seed, policy):
+        """シミュレータから作ったサマリーと同じになるかテスト（最後のシナリオを使う）"""
+        simulator = played_session(str(tmp_path), scenario_id, seed, policy, episodes=2)
+        summary = rebuild_summary(read_entries(str(tmp_path), simulator.session_id),
+                                  load_scenario_catalog(), load_action_catalog())
+        assert summary == ReportGenerator(simulator).generate_summary()
+
+    def test_log_without_scenario(self):
+        """シナリオの開始がないログはNoneになるかテスト"""
+        assert rebuild_summary([None, {"type": "event", "turn": 1}],
+                               load_scenario_catalog(), load_action_catalog()) is None
+
+
+class TestCohortReports:
+    """コホートのレポート作成のテスト"""
+
+    def test_cohort_members(self, tmp_path):
+        """参加者の記録と読み込みのテスト"""
+        record_cohort_member("day-1", "s1", str(tmp_path))
+        record_cohort_member("day-1", "s2", str(tmp_path))
+        record_cohort_member("day-1", "s1", str(tmp_path))
+        assert cohort_members("day-1", str(tmp_path)) == ["s1", "s2"]
+        for name in ("../x", "", None):
+            with pytest.raises(ValueError):
+                record_cohort_member(name, "s1", str(tmp_path))
+
+    def test_render_cohort_reports(self, tmp_path):
+        """並列に作成したPDFと結果一覧のテスト（セグメントに移したログも対象）"""
+        log_dir, out_dir = tmp_path / "logs", tmp_path / "out"
+        log_dir.mkdir()
+        simulators = [played_session(str(log_dir), "S014", seed) for seed in range(5)]
+        (log_dir / "empty.json").write_text("壊れた行\n", encoding="utf-8")
+        store = SegmentStore(segment_dir_for(str(log_dir)))
+        store.compact(str(log_dir), idle_seconds=0)
+        store.close()
+        live = played_session(str(log_dir), "S001", 9)
+
+        session_ids = logged_sessions(str(log_dir))
+        assert len(session_ids) == 7
+        rows = render_cohort_reports(session_ids, str(log_dir), str(out_dir), workers=2, chunk_size=2)
+
+        expected = sorted(simulators + [live], key=lambda s: s.session_id)
+        assert [row["session_id"] for row in rows] == [s.session_id for s in expected]
+        assert [row["score"] for row in rows] == [s.calculate_score() for s in expected]
+        assert all((out_dir / row["pdf"]).stat().st_size > 0 for row in rows)
+        with open(out_dir / "index.csv", encoding="utf-8") as f:
+            assert [row["session_id"] for row in csv.DictReader(f)] == [s.session_id for s in expected]
+        assert not [p for p in os.listdir(out_dir) if p.endswith(".tmp")]
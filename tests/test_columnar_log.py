@@ -0,0 +1,83 @@
+import pytest
+import os
+import sys
+import json
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.columnar_log import RAW_LINE, ColumnarLog, convert_jsonl, convert_log_dir
+from app.simulator import InfraRiskSimulator
+from app.tournament import random_policy, play_episode
+
+
+class TestColumnarLog:
+    """列指向のセッションログのテスト"""
+
+    @pytest.fixture
+    def jsonl_file(self, tmp_path):
+        """シミュレータのログに形式の異なる行を加えたJSONLファイル"""
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        simulator = InfraRiskSimulator(log_dir=str(log_dir), seed=2)
+        for scenario_id in ("S001", "S014"):
+            play_episode(simulator, random_policy, scenario_id, 2)
+        simulator.close_log()
+        path = log_dir / f"{simulator.session_id}.json"
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            f.write('{"type": "test_event", "test_field": "test_value"}\n')
+            f.write('{"type":"event","turn":1}\n')
+            f.write("壊れた行\r\n")
+            f.write("\n")
+        return path
+
+    def test_lossless_round_trip(self, tmp_path, jsonl_file):
+        """元のJSONLと同じバイト列に戻せるかテスト"""
+        dst = tmp_path / "session.irl"
+        count = convert_jsonl(str(jsonl_file), str(dst))
+        original = jsonl_file.read_bytes()
+        assert count == original.count(b"\n")
+
+        with ColumnarLog(str(dst)) as log:
+            assert len(log) == count
+            assert (log.column("kind") == RAW_LINE).sum() == 4
+            log.to_jsonl(str(tmp_path / "restored.json"))
+        assert (tmp_path / "restored.json").read_bytes() == original
+        assert os.path.getsize(dst) < len(original)
+
+    def test_records_and_projection(self, tmp_path, jsonl_file):
+        """辞書への展開と、指定した項目だけの展開のテスト"""
+        dst = tmp_path / "session.irl"
+        convert_jsonl(str(jsonl_file), str(dst))
+        lines = jsonl_file.read_text(encoding="utf-8").split("\n")[:-1]
+        expected = []
+        for line in lines:
+            try:
+                expected.append(json.loads(line))
+            except ValueError:
+                expected.append(None)
+
+        log = ColumnarLog(str(dst))
+        assert list(log.records()) == expected
+        projected = list(log.records(["turn", "success"], start=1))
+        assert projected[0] == {k: v for k, v in expected[1].items() if k in ("type", "turn", "success")}
+        assert all(set(record) <= {"type", "turn", "success"}
+                   for record in projected if record is not None)
+
+        actions = log.column("kind") == 2
+        assert log.column("state")[actions].shape == (actions.sum(), 7)
+        assert log.column("success_rate")[actions].tolist() == \
+            [e["success_rate"] for e in expected if e and e.get("type") == "action" and "success_rate" in e]
+
+    def test_convert_log_dir(self, tmp_path, jsonl_file):
+        """新しいログだけを変換するかテスト"""
+        out_dir = tmp_path / "columnar"
+        assert convert_log_dir(str(jsonl_file.parent), str(out_dir)) == 1
+        assert convert_log_dir(str(jsonl_file.parent), str(out_dir)) == 0
+        assert [p.suffix for p in out_dir.iterdir()] == [".irl"]
+
+    def test_invalid_file(self, tmp_path):
+        """列指向のログでないファイルのエラーテスト"""
+        path = tmp_path / "x.irl"
+        path.write_bytes(b"{}" * 16)
+        with pytest.raises(ValueError):
+            ColumnarLog(str(path))
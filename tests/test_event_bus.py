@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import threading
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.event_bus import EventBus, PublishingLogSink, cohort_topic, format_sse, session_topic
+from app.simulator import InfraRiskSimulator
+
+
+class RecordingSink:
+    """書き込みを記録するテスト用シンク"""
+
+    def __init__(self):
+        self.lines = []
+        self.closed = []
+
+    def write(self, session_id, event_data):
+        self.lines.append((session_id, event_data["type"]))
+
+    def flush(self, session_id=None, wait=True):
+        pass
+
+    def close_session(self, session_id, wait=True):
+        self.closed.append(session_id)
+
+    def close(self):
+        pass
+
+
+class TestEventBus:
+    """EventBusクラスのテスト"""
+
+    def test_publish_to_matching_topics(self):
+        """購読したトピックのイベントだけを受け取るかテスト"""
+        bus = EventBus()
+        a = bus.subscribe(["session:a"])
+        room = bus.subscribe(["cohort:room"])
+
+        assert bus.publish(["session:a", "cohort:room"], {"type": "event"}) == 2
+        assert bus.publish(["session:b"], {"type": "event"}) == 0
+        assert a.get(timeout=0) == [("session:a", {"type": "event"})]
+        assert room.get(timeout=0) == [("cohort:room", {"type": "event"})]
+
+    def test_delivered_once_for_overlapping_topics(self):
+        """複数のトピックに一致しても1回だけ配信されるかテスト"""
+        bus = EventBus()
+        subscription = bus.subscribe(["session:a", "cohort:room"])
+        bus.publish(["session:a", "cohort:room"], {"type": "event"})
+        assert len(subscription.get(timeout=0)) == 1
+
+    def test_slow_consumer_drops_oldest(self):
+        """受信キューが満杯なら古いイベントを捨てて件数を通知するかテスト"""
+        bus = EventBus()
+        subscription = bus.subscribe(["t"], max_queue=3)
+        for i in range(10):
+            bus.publish(["t"], {"i": i})
+
+        items = subscription.get(timeout=0)
+        assert items[0] == (None, {"type": "dropped", "count": 7})
+        assert [event["i"] for _, event in items[1:]] == [7, 8, 9]
+        assert subscription.get(timeout=0) == []
+
+    def test_close_unsubscribes_and_wakes_waiter(self):
+        """close()で購読が解除され、待機中のget()が戻るかテスト"""
+        bus = EventBus()
+        subscription = bus.subscribe(["t"])
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(subscription.get(timeout=5)))
+        waiter.start()
+        subscription.close()
+        waiter.join(timeout=5)
+
+        assert result == [[]]
+        assert bus.publish(["t"], {}) == 0
+        assert bus.stats() == {"topics": 0, "subscriptions": 0}
+
+    def test_format_sse(self):
+        """Server-Sent Eventsの形式に変換されるかテスト"""
+        line = format_sse("session:a", {"type": "event", "turn": 1})
+        assert line.startswith("data: ") and line.endswith("\n\n")
+        assert json.loads(line[len("data: "):]) == {"type": "event", "turn": 1, "topic": "session:a"}
+
+
+class TestPublishingLogSink:
+    """PublishingLogSinkクラスのテスト"""
+
+    def test_simulator_events_are_published(self):
+        """シミュレータのイベントがセッションとコホートに配信されるかテスト"""
+        bus = EventBus()
+        inner = RecordingSink()
+        sink = PublishingLogSink(inner, bus)
+        simulator = InfraRiskSimulator(log_sink=sink, seed=0)
+        sink.set_cohort(simulator.session_id, "room")
+        room = bus.subscribe([cohort_topic("room")])
+        own = bus.subscribe([session_topic(simulator.session_id)])
+
+        simulator.start_scenario("S014")
+        simulator.next_turn()
+
+        events = [event for _, event in room.get(timeout=0)]
+        assert [event["type"] for event in events] == [event["type"] for event in simulator.history]
+        assert all(event["session_id"] == simulator.session_id for event in events)
+        assert len(own.get(timeout=0)) == len(events)
+        assert len(inner.lines) == len(events)
+        assert "session_id" not in simulator.history[0]
+
+    def test_close_session_forgets_cohort(self):
+        """セッションを閉じるとコホートへの配信が止まるかテスト"""
+        bus = EventBus()
+        sink = PublishingLogSink(None, bus)
+        sink.set_cohort("a", "room")
+        assert sink.topics("a") == ["session:a", "cohort:room"]
+        sink.close_session("a")
+        assert sink.topics("a") == ["session:a"]
+
+    def test_idle_cohort_expires(self):
+        """ttl秒配信のないセッションのコホートが削除されるかテスト"""
+        now = [0]
+        sink = PublishingLogSink(None, EventBus(), ttl=10, clock=lambda: now[0])
+        sink.set_cohort("a", "room")
+        sink.set_cohort("b", "room")
+        now[0] = 8
+        assert sink.topics("a") == ["session:a", "cohort:room"]
+        now[0] = 12
+        sink.set_cohort("c", "room")
+        assert list(sink._cohorts) == ["a", "c"]
+        now[0] = 30
+        assert sink.topics("a") == ["session:a"]
+        assert len(sink._cohorts) == 0
+
+    def test_cohort_survives_snapshot(self):
+        """スナップショットから復元したシミュレータのコホートを登録し直せるかテスト"""
+        bus = EventBus()
+        simulator = InfraRiskSimulator(log_dir=None, seed=0)
+        simulator.cohort = "room"
+        simulator.start_scenario("S014")
+
+        # 別のワーカー（別のシンク）で再開する
+        sink = PublishingLogSink(None, bus)
+        restored = InfraRiskSimulator.from_bytes(simulator.to_bytes(), log_sink=sink)
+        assert restored.cohort == "room"
+        sink.set_cohort(restored.session_id, restored.cohort)
+        room = bus.subscribe([cohort_topic("room")])
+        restored.next_turn()
+        assert len(room.get(timeout=0)) == 1
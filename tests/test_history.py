@@ -0,0 +1,67 @@
+import pytest
+import os
+import sys
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.actions import ActionManager
+from app.events import DEFAULT_EVENT, EventManager
+from app.history import RECORD, CompactHistory
+
+
+class TestCompactHistory:
+    """CompactHistoryクラスのテスト"""
+
+    @pytest.fixture
+    def catalogs(self):
+        return EventManager().catalog, ActionManager().catalog
+
+    @pytest.fixture
+    def events(self, catalogs):
+        scenario = catalogs[0].scenarios.records[0]
+        action = catalogs[1].actions.records[0]
+        return [
+            {"type": "scenario_start", "scenario_id": scenario["id"],
+             "scenario_name": scenario["name"], "description": scenario["description"],
+             "timestamp": "2024-04-01T10:00:00.123456"},
+            {"type": "event", "turn": 1, "event_id": DEFAULT_EVENT["id"],
+             "event_name": DEFAULT_EVENT["name"], "description": DEFAULT_EVENT["description"],
+             "effect": {"cpu": 10, "memory": 10},
+             "timestamp": "2024-04-01T10:00:01"},
+            {"type": "action", "turn": 1, "action_id": action["id"],
+             "action_name": action["name"], "success": True, "success_rate": 0.75,
+             "state_changes": {"cpu": -15}, "state_after": {"cpu": 25, "sla_risk": 3},
+             "timestamp": "2024-04-01T10:00:02.500000"},
+            {"type": "critical_state", "turn": 2, "state": {"services": 0},
+             "timestamp": "2024-04-01T10:00:03"},
+        ]
+
+    def test_round_trip(self, catalogs, events):
+        """追加したイベントが同じ辞書に展開されるかテスト"""
+        history = CompactHistory(*catalogs, events)
+        assert len(history) == 4
+        assert list(history) == events
+        assert history == events
+        assert history[-1] == events[-1]
+        assert history[1:3] == events[1:3]
+        assert len(history._data) == 4 * RECORD.size and history._raw == []
+
+    def test_raw_fallback(self, catalogs, events):
+        """記録できない形式のイベントはそのまま保持するかテスト"""
+        unusual = [
+            {"type": "note", "text": "メモ"},
+            dict(events[1], event_id="E999"),
+            dict(events[2], state_changes={"cpu": 1.5}),
+            dict(events[3], timestamp="2024-04-01T10:00:03+09:00"),
+        ]
+        history = CompactHistory(*catalogs, events[:1] + unusual)
+        assert list(history) == events[:1] + unusual
+        assert len(history._raw) == 4
+
+    def test_clear_and_index_error(self, catalogs, events):
+        """clearと範囲外参照のテスト"""
+        history = CompactHistory(*catalogs, events)
+        history.clear()
+        assert len(history) == 0 and history == []
+        with pytest.raises(IndexError):
+            history[0]
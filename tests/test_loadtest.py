@@ -0,0 +1,38 @@
+import pytest
+import os
+import sys
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+pytest.importorskip("flask")
+from web.loadtest import LoadStats, load_web_app, run_load_test
+
+
+class TestLoadTest:
+    """Web APIの負荷試験のテスト"""
+
+    @pytest.mark.parametrize("combined", [False, True])
+    def test_run_load_test(self, combined):
+        """仮想研修者が全セッションをエラーなくプレイするかテスト"""
+        web_app = load_web_app()
+        result = run_load_test(web_app, trainees=3, sessions=2, scenario_ids=["S001", "S014"],
+                               combined=combined, report=False)
+
+        assert result["errors"] == 0
+        assert result["endpoints"]["POST /api/start"]["requests"] == 6
+        assert result["stored_sessions_added"] >= 0
+        turn_endpoint = "POST /api/turn" if combined else "POST /api/next-turn"
+        assert result["endpoints"][turn_endpoint]["requests"] >= 6
+
+    def test_load_stats_percentiles(self):
+        """パーセンタイルとエラー数の集計テスト"""
+        stats = LoadStats()
+        for i in range(100):
+            stats.record("GET /", (i + 1) / 1000, ok=i != 0)
+        summary = stats.summary(elapsed=2.0)
+
+        row = summary["endpoints"]["GET /"]
+        assert row["requests"] == 100 and row["errors"] == 1
+        assert row["throughput"] == 50
+        assert row["p50_ms"] == pytest.approx(50.5)
+        assert row["p99_ms"] == pytest.approx(99.01)
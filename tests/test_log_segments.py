@@ -0,0 +1,147 @@
+import pytest
+import os
+import sys
+import json
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.analytics import LogAnalyzer
+from app.log_segments import SegmentStore, read_session_log, segment_dir_for
+from app.simulator import InfraRiskSimulator
+
+
+def write_session(log_dir, session_id, lines, mtime):
+    path = os.path.join(log_dir, f"{session_id}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestSegmentStore:
+    """SegmentStoreクラスのテスト"""
+
+    @pytest.fixture
+    def log_dir(self, tmp_path):
+        log_dir = tmp_path / "logs"
+        log_dir.mkdir()
+        return str(log_dir)
+
+    @pytest.fixture
+    def store(self, log_dir):
+        store = SegmentStore(segment_dir_for(log_dir), max_segment_bytes=200)
+        yield store
+        store.close()
+
+    def test_compact_and_random_access(self, log_dir, store):
+        """更新の止まったファイルだけを移し、セッション単位で読めるかテスト"""
+        contents = {}
+        for i in range(5):
+            path = write_session(log_dir, f"s{i}", [{"type": "event", "turn": t} for t in range(i + 1)],
+                                 mtime=1000 + i)
+            with open(path, "rb") as f:
+                contents[f"s{i}"] = f.read()
+        write_session(log_dir, "live", [{"type": "event", "turn": 1}], mtime=5000)
+
+        assert store.compact(log_dir, idle_seconds=100, now=5050) == 5
+        assert sorted(os.listdir(log_dir)) == ["live.json", "segments"]
+        for session_id, content in contents.items():
+            assert store.read_session(session_id) == content
+            assert read_session_log(log_dir, session_id) == content
+        assert read_session_log(log_dir, "live") == b'{"type": "event", "turn": 1}\n'
+        assert store.read_session("unknown") == b""
+
+        # 上限を超えたら次のセグメントに分ける
+        stats = store.stats()
+        assert stats["sessions"] == 5 and stats["segments"] > 1
+        assert all(os.path.getsize(os.path.join(store.segment_dir, segment)) <= 200
+                   for segment, _, _ in (store.locate(s)[0] for s in contents))
+
+        assert store.compact(log_dir, idle_seconds=100, now=5050) == 0
+
+    def test_session_written_again(self, log_dir, store):
+        """移した後に同じセッションのログが書かれた場合、続きとして読めるかテスト"""
+        write_session(log_dir, "s", [{"type": "event", "turn": 1}], mtime=1000)
+        store.compact(log_dir, idle_seconds=100, now=2000)
+        write_session(log_dir, "s", [{"type": "event", "turn": 2}], mtime=3000)
+        assert read_session_log(log_dir, "s").count(b"\n") == 2
+        store.compact(log_dir, idle_seconds=100, now=4000)
+        assert len(store.locate("s")) == 2
+        assert read_session_log(log_dir, "s") == \
+            b'{"type": "event", "turn": 1}\n{"type": "event", "turn": 2}\n'
+
+    def test_interrupted_run(self, log_dir, store):
+        """索引の更新前に止まった書きかけは切り詰め、登録済みのファイルは二重に登録しないかテスト"""
+        write_session(log_dir, "a", [{"type": "event", "turn": 1}], mtime=1000)
+        store.compact(log_dir, idle_seconds=100, now=2000)
+        segment = store.locate("a")[0][0]
+        with open(os.path.join(store.segment_dir, segment), "ab") as f:
+            f.write(b'{"type": "ev')
+
+        path = write_session(log_dir, "b", [{"type": "event", "turn": 2}], mtime=1000)
+        stat = os.stat(path)
+        store._connection().execute(
+            "INSERT INTO chunks (session_id, segment, offset, length, source_size, source_mtime_ns) "
+            "VALUES ('b', ?, 0, 0, ?, ?)", (segment, stat.st_size, stat.st_mtime_ns))
+        write_session(log_dir, "c", [{"type": "event", "turn": 3}], mtime=1000)
+
+        assert store.compact(log_dir, idle_seconds=100, now=2000) == 2
+        assert len(store.locate("b")) == 1
+        assert store.read_session("c") == b'{"type": "event", "turn": 3}\n'
+        assert os.path.getsize(os.path.join(store.segment_dir, segment)) == store.stats()["bytes"]
+
+    def test_retention(self, log_dir, store):
+        """保存期間と合計サイズの上限で古いセグメントから削除するかテスト"""
+        day = 86400
+        for i in range(4):
+            write_session(log_dir, f"d{i}", [{"type": "event", "turn": i}], mtime=day * (i + 1))
+        store.compact(log_dir, idle_seconds=0, now=day * 10)
+        assert store.stats()["segments"] == 4
+
+        assert store.apply_retention(retention_days=7, now=day * 9) == 1
+        assert store.read_session("d0") == b""
+        size = store.stats()["bytes"]
+        assert store.apply_retention(max_total_bytes=size - 1, now=day * 9) == 1
+        assert store.sessions() == ["d2", "d3"]
+        assert sorted(name for name in os.listdir(store.segment_dir) if name.endswith(".jsonl")) == \
+            sorted(store.locate(s)[0][0] for s in ("d2", "d3"))
+
+    def test_snapshot_history_after_compaction(self, log_dir):
+        """スナップショットから復元したシミュレータがセグメントから履歴を読むかテスト"""
+        simulator = InfraRiskSimulator(log_dir=log_dir, seed=3)
+        simulator.start_scenario("S014")
+        simulator.next_turn()
+        simulator.take_action(simulator.get_available_actions()[0]["id"])
+        simulator.close_log()
+        blob = simulator.to_bytes()
+
+        store = SegmentStore(segment_dir_for(log_dir))
+        assert store.compact(log_dir, idle_seconds=0) == 1
+        store.close()
+        restored = InfraRiskSimulator.from_bytes(blob, log_dir=log_dir)
+        assert restored.history == simulator.history
+
+    def test_analytics_after_compaction(self, tmp_path, log_dir, store):
+        """セグメントに移したログを集計で二重に数えず、読み残しも出ないかテスト"""
+        events = [{"type": "scenario_start", "scenario_id": "S001"},
+                  {"type": "action", "turn": 1, "action_id": "A001", "success": True,
+                   "success_rate": 0.5, "state_changes": {},
+                   "state_after": {"cpu": 50, "memory": 50, "disk": 50, "network": 50,
+                                   "services": 5, "alerts": 0, "sla_risk": 0}}]
+        write_session(log_dir, "a", events[:1], mtime=1000)
+        write_session(log_dir, "b", events, mtime=1000)
+        analyzer = LogAnalyzer(log_dir, str(tmp_path / "index.json"))
+        analyzer.update(now=1000)
+
+        with open(os.path.join(log_dir, "a.json"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(events[1]) + "\n")
+        os.utime(os.path.join(log_dir, "a.json"), (1000, 1000))
+        store.compact(log_dir, idle_seconds=0, now=2000)
+
+        resumed = LogAnalyzer(log_dir, str(tmp_path / "index.json"))
+        assert resumed.update(now=2000) == 2
+        summary = resumed.summary()
+        assert summary["actions"]["A001"]["attempts"] == 2
+        assert summary["scenarios"]["S001"]["outcomes"] == {"abandoned": 2}
+        assert resumed.update(now=2000) == 0
@@ -0,0 +1,96 @@
+import pytest
+import os
+import sys
+import json
+import datetime
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.log_writer import BufferedLogSink, new_session_id
+from app.simulator import InfraRiskSimulator
+from app.tournament import greedy_policy, play_episode
+
+
+def read_lines(file_path):
+    with open(file_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class TestBufferedLogSink:
+    """BufferedLogSinkクラスのテスト"""
+
+    @pytest.mark.parametrize("durability", ["none", "flush", "fsync"])
+    def test_write_and_flush(self, tmp_path, durability):
+        """書き込んだ順にセッションごとのファイルへ出力されるかテスト"""
+        sink = BufferedLogSink(str(tmp_path), durability=durability)
+        for i in range(100):
+            sink.write("a", {"i": i})
+            sink.write("b", {"i": -i})
+        sink.close()
+
+        assert [line["i"] for line in read_lines(tmp_path / "a.json")] == list(range(100))
+        assert [line["i"] for line in read_lines(tmp_path / "b.json")] == [-i for i in range(100)]
+
+    def test_flush_makes_lines_visible(self, tmp_path):
+        """flush後はファイルから読めるかテスト"""
+        sink = BufferedLogSink(str(tmp_path))
+        sink.write("s", {"type": "event"})
+        sink.flush("s")
+        assert read_lines(tmp_path / "s.json") == [{"type": "event"}]
+        sink.close()
+
+    def test_open_file_limit(self, tmp_path):
+        """開いたままのファイル数が上限を超えないかテスト"""
+        sink = BufferedLogSink(str(tmp_path), max_open_files=2)
+        for session in ["a", "b", "c", "a"]:
+            sink.write(session, {"session": session})
+            sink.flush()
+            assert len(sink._files) <= 2
+        sink.close_session("a")
+        assert "a" not in sink._files
+        sink.close()
+        assert len(read_lines(tmp_path / "a.json")) == 2
+
+    def test_small_queue(self, tmp_path):
+        """キューが小さくても全件書き込まれるかテスト"""
+        sink = BufferedLogSink(str(tmp_path), max_queue=4)
+        for i in range(500):
+            sink.write("s", {"i": i})
+        sink.close()
+        assert len(read_lines(tmp_path / "s.json")) == 500
+
+    def test_failed_batch_wakes_waiters(self, tmp_path, monkeypatch):
+        """書き込みスレッドで例外が起きても待っている呼び出し元が戻り、以降も書き込めるかテスト"""
+        sink = BufferedLogSink(str(tmp_path))
+        monkeypatch.setattr(sink, "_sync", lambda session_id=None: 1 / 0)
+        sink.write("a", {"i": 0})
+        sink.flush("a")
+        sink.close_session("a")
+        monkeypatch.undo()
+
+        sink.write("a", {"i": 1})
+        sink.flush("a")
+        assert read_lines(tmp_path / "a.json") == [{"i": 0}, {"i": 1}]
+        sink.close()
+
+    def test_invalid_durability(self, tmp_path):
+        """不明なdurability指定時のエラーテスト"""
+        with pytest.raises(ValueError):
+            BufferedLogSink(str(tmp_path), durability="always")
+
+    def test_session_ids_do_not_collide(self):
+        """同じ時刻に作成したセッションIDが衝突しないかテスト"""
+        now = datetime.datetime(2026, 1, 1, 12, 0, 0)
+        session_ids = {new_session_id(now) for _ in range(1000)}
+        assert len(session_ids) == 1000
+        assert all(s.startswith("20260101_120000_") for s in session_ids)
+
+    def test_simulator_flushes_on_game_over(self, tmp_path):
+        """シミュレータの終了時にログが書き出されるかテスト"""
+        sink = BufferedLogSink(str(tmp_path))
+        simulator = InfraRiskSimulator(log_sink=sink, seed=0)
+        play_episode(simulator, greedy_policy, "S014", 0)
+
+        lines = read_lines(tmp_path / f"{simulator.session_id}.json")
+        assert [line["type"] for line in lines] == [event["type"] for event in simulator.history]
+        sink.close()
@@ -0,0 +1,108 @@
+import pytest
+import os
+import sys
+import threading
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.metrics import ACTION_ROLLS, ACTIONS, TURNS, Counter, Histogram, Registry, timed
+from app.simulator import InfraRiskSimulator
+
+
+class TestMetrics:
+    """メトリクスのテスト"""
+
+    def test_counter_sums_threads(self):
+        """複数スレッドからの加算が合計されるかテスト"""
+        counter = Counter("requests_total", "リクエスト数", ("route",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc("/a")
+            counter.inc("/b", amount=5)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.values() == {("/a",): 4000, ("/b",): 20}
+
+    def test_finished_threads_folded(self):
+        """終了したスレッドの集計が合計に畳み込まれ、スレッドごとのdictが残らないかテスト"""
+        counter = Counter("requests_total", "リクエスト数")
+        histogram = Histogram("latency_seconds", "処理時間", buckets=(0.1, 1))
+
+        def work():
+            counter.inc()
+            histogram.observe(0.5)
+
+        for _ in range(50):
+            threads = [threading.Thread(target=work) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert counter.values() == {(): 500}
+        assert histogram.values() == {(): ([0, 500, 500], 250.0)}
+        assert len(counter._shards._shards) == 0
+        assert len(histogram._shards._shards) == 0
+
+    def test_histogram_buckets(self):
+        """バケットの累積度数・合計・件数のテスト"""
+        histogram = Histogram("latency_seconds", "処理時間", buckets=(0.1, 1))
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.observe(value)
+
+        assert histogram.values() == {(): ([2, 3, 4], 2.65)}
+        assert histogram.render() == [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_sum 2.65',
+            'latency_seconds_count 4',
+        ]
+
+    def test_timed_decorator(self):
+        """デコレータで実行時間が記録されるかテスト"""
+        histogram = Histogram("call_seconds", "処理時間")
+
+        @timed(histogram)
+        def fail():
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            fail()
+        with histogram.time():
+            pass
+        assert histogram.values()[()][0][-1] == 2
+
+    def test_registry_render(self):
+        """Prometheusのテキスト形式で出力されるかテスト"""
+        registry = Registry()
+        counter = registry.counter("rolls_total", "判定回数", ("action_id", "result"))
+        counter.inc('A"1', "success")
+        registry.callback("sessions_active", "セッション数", lambda: 3)
+        registry.callback("broken", "失敗する収集", lambda: 1 / 0)
+
+        text = registry.render()
+        assert "# TYPE rolls_total counter\n" in text
+        assert 'rolls_total{action_id="A\\"1",result="success"} 1\n' in text
+        assert "# TYPE sessions_active gauge\nsessions_active 3\n" in text
+        assert "broken" not in text
+
+    def test_simulator_counters(self):
+        """シミュレータのターン・アクション数が記録されるかテスト"""
+        turns, actions = sum(TURNS.values().values()), sum(ACTIONS.values().values())
+        simulator = InfraRiskSimulator(log_dir=None, seed=0)
+        simulator.start_scenario("S014")
+        simulator.next_turn()
+        action_id = simulator.get_available_actions()[0]["id"]
+        rolls = sum(v for k, v in ACTION_ROLLS.values().items() if k[0] == action_id)
+        simulator.take_action(action_id)
+
+        assert sum(TURNS.values().values()) == turns + 1
+        assert sum(ACTIONS.values().values()) == actions + 1
+        assert sum(v for k, v in ACTION_ROLLS.values().items() if k[0] == action_id) == rolls + 1
@@ -0,0 +1,64 @@
+import pytest
+import os
+import sys
+import gzip
+import json
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.payload_cache import PayloadCache, SerializedPayload
+
+
+def serialize(records):
+    return json.dumps(records).encode('utf-8')
+
+
+class TestSerializedPayload:
+    """SerializedPayloadクラスのテスト"""
+
+    @pytest.fixture
+    def payload(self):
+        return SerializedPayload(serialize([{"id": f"S{i:03d}", "name": "シナリオ"} for i in range(50)]))
+
+    def test_etag_is_stable(self, payload):
+        """同じ本文なら同じETagになるかテスト"""
+        assert SerializedPayload(payload.body).etag == payload.etag
+        assert SerializedPayload(payload.body + b" ").etag != payload.etag
+
+    def test_gzip_variant(self, payload):
+        """gzipを受け付ける場合は圧縮版を返すかテスト"""
+        encoding, data, etag = payload.variant(["gzip"])
+        assert encoding == "gzip"
+        assert gzip.decompress(data) == payload.body
+        assert etag == f"{payload.etag}-gzip" and etag in payload.etags
+
+    def test_identity_variant(self, payload):
+        """圧縮を受け付けない場合は元の本文を返すかテスト"""
+        assert payload.variant([]) == (None, payload.body, payload.etag)
+
+    def test_small_body_is_not_compressed(self):
+        """圧縮で小さくならない本文はそのまま返すかテスト"""
+        payload = SerializedPayload(b"[]")
+        assert payload.variant(["gzip", "br"])[0] is None
+
+
+class TestPayloadCache:
+    """PayloadCacheクラスのテスト"""
+
+    def test_reuses_until_source_changes(self):
+        """元データが同じオブジェクトの間は再シリアライズしないかテスト"""
+        calls = []
+        cache = PayloadCache()
+        records = [{"id": "A001"}]
+
+        def counting(source):
+            calls.append(source)
+            return serialize(source)
+
+        first = cache.get("actions", records, counting)
+        assert cache.get("actions", records, counting) is first
+        assert len(calls) == 1
+
+        changed = cache.get("actions", [{"id": "A002"}], counting)
+        assert changed is not first and changed.etag != first.etag
+        assert len(calls) == 2
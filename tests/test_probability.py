@@ -6,8 +6,9 @@ import random
 
 # テスト対象モジュールのインポート
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app.probability import ProbabilityEngine
-from app.state import SystemState
+import numpy as np
+from app.probability import ProbabilityEngine, SuccessRateTable, rate_bucket, RATE_BUCKET_COUNT
+from app.state import SystemState, SystemStateBatch
 
 class TestProbabilityEngine:
     """ProbabilityEngineクラスのテスト"""
@@ -205,6 +206,13 @@ class TestProbabilityEngine:
         # 成功率0.4なら失敗するはず
         assert engine.roll_success(0.4) == False
 
+    def test_roll_success_with_rng(self):
+        """乱数源を渡した成功判定と、クラスからの呼び出しのテスト"""
+        rng = random.Random(0)
+        expected = random.Random(0).random() < 0.5
+        assert ProbabilityEngine.roll_success(0.5, rng) == expected
+        assert ProbabilityEngine.roll_success(1.0) == True
+
     def test_calculate_risk_expectation(self, engine, default_state):
         """リスク期待値計算テスト"""
         # CPU改善アクション
@@ -304,4 +312,67 @@ class TestProbabilityEngine:
         risky_expectation = engine.calculate_risk_expectation(risky_action, default_state)
 
         # 失敗ペナルティが大きいアクションの方が期待値が低いはず
-        assert normal_expectation > risky_expectation
\ No newline at end of file
+        assert normal_expectation > risky_expectation
+
+class TestSuccessRateTable:
+    """事前計算モードの成功率表のテスト"""
+
+    @pytest.fixture
+    def actions(self):
+        """補正条件を網羅するアクション"""
+        return [
+            {"id": "A001", "name": "サーバ再起動", "category": "システム操作", "base_success_rate": 0.8},
+            {"id": "A002", "name": "アプリ再起動", "category": "アプリケーション障害", "base_success_rate": 0.75},
+            {"id": "A003", "name": "ディスク容量確保", "category": "ストレージ", "base_success_rate": 0.9},
+            {"id": "A004", "name": "障害報告", "category": "一般", "base_success_rate": 1.0,
+             "cpu_effect": -20, "service_effect": 1},
+        ]
+
+    @pytest.fixture
+    def grid_states(self):
+        """各閾値の前後を含む状態の組み合わせ"""
+        states = []
+        for cpu in (39, 40, 80, 81):
+            for memory in (85, 86):
+                for disk in (90, 91):
+                    for services in (2, 3):
+                        for alerts in (7, 8):
+                            state = SystemState()
+                            state.cpu, state.memory, state.disk = cpu, memory, disk
+                            state.services, state.alerts = services, alerts
+                            states.append(state)
+        return states
+
+    def test_compiled_rate_matches_calculation(self, actions, grid_states):
+        """事前計算モードの成功率が通常計算と一致するかテスト"""
+        engine = ProbabilityEngine(actions)
+        for state in grid_states:
+            assert 0 <= rate_bucket(state) < RATE_BUCKET_COUNT
+            for action in actions:
+                assert engine.success_rate(action, state) == \
+                    ProbabilityEngine.calculate_success_rate(action, state)
+
+    def test_compiled_unknown_action_falls_back(self, actions, grid_states):
+        """表にないアクションは通常計算になるかテスト"""
+        engine = ProbabilityEngine(actions)
+        action = {"id": "A999", "name": "未登録", "category": "システム操作", "base_success_rate": 0.5}
+        for state in grid_states:
+            assert engine.success_rate(action, state) == \
+                ProbabilityEngine.calculate_success_rate(action, state)
+
+    def test_vectorized_rates(self, actions, grid_states):
+        """状態バッチに対する一括評価テスト"""
+        table = SuccessRateTable(actions)
+        batch = SystemStateBatch.from_states(grid_states)
+        rates = table.rates(batch)
+        expectations = table.expectations(batch)
+        chosen = np.arange(len(grid_states)) % len(actions)
+        picked = table.rates(batch, chosen)
+
+        assert rates.shape == (len(grid_states), len(actions))
+        for i, state in enumerate(grid_states):
+            for a, action in enumerate(actions):
+                assert rates[i, a] == ProbabilityEngine.calculate_success_rate(action, state)
+                assert expectations[i, a] == pytest.approx(
+                    ProbabilityEngine.calculate_risk_expectation(action, state))
+            assert picked[i] == rates[i, chosen[i]]
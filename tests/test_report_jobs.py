@@ -0,0 +1,105 @@
+import pytest
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.report import ReportGenerator
+from app.report_jobs import CACHE_PREFIX, DONE, FAILED, QueueFullError, ReportJobQueue, report_key
+from app.simulator import InfraRiskSimulator
+from app.tournament import greedy_policy, play_episode
+
+
+def finished_simulator(scenario_id="S014", seed=0):
+    simulator = InfraRiskSimulator(log_dir=None)
+    play_episode(simulator, greedy_policy, scenario_id, seed)
+    return simulator
+
+
+class TestReportJobQueue:
+    """ReportJobQueueクラスのテスト"""
+
+    @pytest.fixture
+    def jobs(self, tmp_path):
+        """スレッドで実行するジョブキュー"""
+        queue = ReportJobQueue(report_dir=str(tmp_path), executor=ThreadPoolExecutor(2))
+        yield queue
+        queue.shutdown()
+
+    def wait(self, jobs, job_id):
+        jobs.shutdown()
+        return jobs.status(job_id)
+
+    def test_submit_creates_pdf(self, jobs, tmp_path):
+        """ジョブ完了後にPDFが作成されるかテスト"""
+        job_id = jobs.submit(finished_simulator())
+        status = self.wait(jobs, job_id)
+        assert status["status"] == DONE
+        assert (tmp_path / status["filename"]).exists()
+        assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+    def test_same_result_is_served_from_cache(self, tmp_path):
+        """同じ内容のレポートは再作成しないかテスト"""
+        calls = []
+        executor = ThreadPoolExecutor(1)
+        jobs = ReportJobQueue(report_dir=str(tmp_path), executor=executor)
+        submit = executor.submit
+        executor.submit = lambda *args: calls.append(args) or submit(*args)
+
+        first = jobs.submit(finished_simulator(seed=1))
+        assert jobs.submit(finished_simulator(seed=1)) == first
+        executor.shutdown()
+        assert jobs.submit(finished_simulator(seed=1)) == first
+        assert len(calls) == 1
+
+    def test_queue_full(self, tmp_path):
+        """待機数の上限を超えるとエラーになるかテスト"""
+        gate = threading.Event()
+        executor = ThreadPoolExecutor(1)
+        executor.submit(gate.wait)
+        jobs = ReportJobQueue(report_dir=str(tmp_path), max_pending=1, executor=executor)
+        jobs.submit(finished_simulator("S014"))
+        with pytest.raises(QueueFullError):
+            jobs.submit(finished_simulator("S007"))
+        gate.set()
+        jobs.shutdown()
+
+    def test_failed_job(self, jobs, monkeypatch):
+        """PDF作成に失敗したジョブがfailedになるかテスト"""
+        def partial_pdf(summary, improvement_tips, pdf_path):
+            open(pdf_path, "wb").close()
+            return None
+
+        monkeypatch.setattr(ReportGenerator, "render_pdf", staticmethod(partial_pdf))
+        job_id = jobs.submit(finished_simulator())
+        assert self.wait(jobs, job_id)["status"] == FAILED
+        assert os.listdir(jobs.report_dir) == []
+
+    def test_key_ignores_ranking(self):
+        """順位が変わっても同じプレイは同じキーになるかテスト"""
+        summary = {"score": 100, "ranking": {"score": {"count": 3, "top_percent": 50.0}}}
+        other = dict(summary, ranking={"score": {"count": 4, "top_percent": 25.0}})
+        assert report_key(summary, []) == report_key(other, [])
+        assert report_key(summary, []) != report_key(dict(summary, score=90), [])
+
+    def test_unknown_job(self, jobs):
+        """存在しないジョブはNoneになるかテスト"""
+        assert jobs.status("0" * 32) is None
+
+    def test_evict_oldest(self, tmp_path):
+        """合計サイズを超えたら古いレポートから削除するかテスト"""
+        jobs = ReportJobQueue(report_dir=str(tmp_path), max_bytes=250)
+        for i, name in enumerate(["a", "b", "c"]):
+            path = tmp_path / f"{CACHE_PREFIX}{name}.pdf"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (i, i))
+        (tmp_path / "other.txt").write_bytes(b"x" * 1000)
+        # CLIが書いたレポートはキャッシュのものではないので残す
+        (tmp_path / "infra_report_cli.pdf").write_bytes(b"x" * 1000)
+        os.utime(tmp_path / "infra_report_cli.pdf", (0, 0))
+
+        assert jobs.evict() == 1
+        assert sorted(os.listdir(tmp_path)) == [
+            "infra_report_cli.pdf", "other.txt", f"{CACHE_PREFIX}b.pdf", f"{CACHE_PREFIX}c.pdf"]
@@ -0,0 +1,129 @@
+import pytest
+import os
+import sys
+import numpy as np
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.rng import AliasTable, RandomStream
+from app.simulator import InfraRiskSimulator
+from app.tournament import greedy_policy, play_episode
+
+class TestRandomStream:
+    """RandomStreamクラスのテスト"""
+
+    def test_same_seed_same_sequence(self):
+        """同じシード・streamで同じ乱数列になるかテスト"""
+        first = RandomStream(42, stream=3)
+        second = RandomStream(42, stream=3)
+        assert [first.random() for _ in range(2000)] == [second.random() for _ in range(2000)]
+
+    def test_scalar_draws_follow_blocks(self):
+        """スカラー乱数がまとめて生成した乱数列と一致するかテスト"""
+        scalar = RandomStream(7, block_size=16)
+        block = RandomStream(7, block_size=16)
+        assert [scalar.random() for _ in range(40)] == list(block.random(48)[:40])
+
+    def test_substreams_are_jumped(self):
+        """部分ストリームがPCG64.jumpedの位置から始まるかテスト"""
+        stream = RandomStream(5)
+        substream = stream.substream(2)
+        expected = np.random.Generator(np.random.PCG64(5).jumped(2)).random(10)
+        assert np.array_equal(substream.random(10), expected)
+        assert not np.array_equal(stream.random(10), expected)
+
+    def test_reseed(self):
+        """再シードで乱数列が最初からになるかテスト"""
+        stream = RandomStream(1)
+        first = [stream.random() for _ in range(5)]
+        stream.seed(1)
+        assert [stream.random() for _ in range(5)] == first
+
+    def test_trim_keeps_sequence(self):
+        """バッファを解放しても乱数列が変わらないかテスト"""
+        trimmed = RandomStream(9, block_size=16)
+        plain = RandomStream(9, block_size=16)
+        values = []
+        for _ in range(10):
+            values.append(trimmed.random())
+            trimmed.trim()
+            assert len(trimmed._block) == 0
+        assert values == [plain.random() for _ in range(10)]
+
+        # ジェネレータを直接使った後は巻き戻さない
+        trimmed.random()
+        trimmed.integers(0, 10)
+        trimmed.trim()
+        plain.random()
+        plain.integers(0, 10)
+        assert trimmed.random() == plain.random()
+
+    def test_choice_and_sample(self):
+        """choice・sampleの範囲と重複なしのテスト"""
+        stream = RandomStream(0)
+        items = list(range(10))
+        assert all(stream.choice(items) in items for _ in range(100))
+
+        for _ in range(100):
+            sample = stream.sample(items, 5)
+            assert len(set(sample)) == 5
+            assert set(sample) <= set(items)
+        assert sorted(stream.sample(items, 10)) == items
+
+        with pytest.raises(IndexError):
+            stream.choice([])
+        with pytest.raises(ValueError):
+            stream.sample(items, 11)
+
+    def test_simulators_with_same_seed(self):
+        """同じシードのシミュレータが同じ結果になるかテスト"""
+        results = []
+        for _ in range(2):
+            simulator = InfraRiskSimulator(log_dir=None, seed=123)
+            simulator.start_scenario()
+            simulator.next_turn()
+            results.append((simulator.current_scenario["id"],
+                            [a["id"] for a in simulator.get_available_actions()]))
+        assert results[0] == results[1]
+
+    def test_streams_are_independent(self):
+        """別のシミュレータの乱数消費が結果に影響しないかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None)
+        other = InfraRiskSimulator(log_dir=None)
+        first = play_episode(simulator, greedy_policy, "S014", 11)
+        other.rng.random(1000)
+        play_episode(other, greedy_policy, "S007", 2)
+        assert play_episode(simulator, greedy_policy, "S014", 11) == first
+
+
+class TestAliasTable:
+    """AliasTableクラスのテスト"""
+
+    def test_distribution(self):
+        """標本の頻度が重みに比例するかテスト"""
+        weights = [1, 0, 3, 6]
+        table = AliasTable(weights)
+        assert table.probabilities.tolist() == [0.1, 0.0, 0.3, 0.6]
+
+        counts = np.bincount(table.sample_indices(RandomStream(0), 200000), minlength=4)
+        assert counts[1] == 0
+        assert np.allclose(counts / counts.sum(), table.probabilities, atol=0.005)
+
+        stream = RandomStream(1)
+        scalar = np.bincount([table.sample(stream) for _ in range(50000)], minlength=4)
+        assert scalar[1] == 0
+        assert np.allclose(scalar / scalar.sum(), table.probabilities, atol=0.01)
+
+    def test_scalar_matches_block(self):
+        """スカラー標本と配列標本が同じ乱数列から同じ結果になるかテスト"""
+        table = AliasTable([5, 1, 2, 2, 7])
+        scalar = RandomStream(3)
+        block = RandomStream(3)
+        expected = table.sample_indices(block.generator, 100)
+        assert [table.sample(scalar) for _ in range(100)] == expected.tolist()
+
+    def test_invalid_weights(self):
+        """不正な重みのエラーテスト"""
+        for weights in [[], [0, 0], [1, -1]]:
+            with pytest.raises(ValueError):
+                AliasTable(weights)
@@ -0,0 +1,118 @@
+import pytest
+import os
+import sys
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.cohort_reports import render_session_report
+from app.report import ReportGenerator
+from app.score_ranks import ScoreRanks
+from app.simulator import InfraRiskSimulator
+from app.tournament import greedy_policy, play_episode
+
+
+class TestScoreRanks:
+    """ScoreRanksクラスのテスト"""
+
+    @pytest.fixture
+    def ranks(self, tmp_path):
+        ranks = ScoreRanks(str(tmp_path / "ranks.sqlite3"), refresh_seconds=0)
+        yield ranks
+        ranks.close()
+
+    def test_rank(self, ranks):
+        """以上・未満の割合と件数のテスト"""
+        assert ranks.rank("S014", "score", 100) is None
+        for score in (100, 200, 200, 300):
+            ranks.record("S014", score, 5)
+        ranks.record("S001", 900, 10)
+
+        assert ranks.rank("S014", "score", 200) == {"count": 4, "top_percent": 75.0, "percentile": 25.0}
+        assert ranks.rank("S014", "score", 250)["top_percent"] == 25.0
+        assert ranks.rank("S014", "score", 50)["top_percent"] == 100.0
+        assert ranks.rank("S014", "score", 900)["top_percent"] == 0.0
+        assert ranks.ranks("S014", 300, 5) == {
+            "score": {"count": 4, "top_percent": 25.0, "percentile": 75.0},
+            "turns": {"count": 4, "top_percent": 100.0, "percentile": 0.0}}
+        assert ranks.distribution("S014", "score") == {100: 1, 200: 2, 300: 1}
+
+    def test_record_once(self, ranks):
+        """同じプレイは一度だけ記録し、終了前のシナリオは記録しないかテスト"""
+        assert ranks.record("S014", 100, 5, key="a:0")
+        assert not ranks.record("S014", 100, 5, key="a:0")
+
+        simulator = InfraRiskSimulator(log_dir=None, seed=1)
+        simulator.start_scenario("S014")
+        assert not ranks.record_simulator(simulator)
+        play_episode(simulator, greedy_policy, "S014", 1)
+        assert ranks.record_simulator(simulator)
+        assert not ranks.record_simulator(simulator)
+        assert ranks.rank("S014", "score", 0)["count"] == 2
+
+    def test_record_final_score(self, ranks):
+        """最終ターンのアクションまで終えたプレイが、そのままの状態のスコアで記録されるかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=3)
+        simulator.start_scenario("S014")
+        simulator.max_turns = 2
+        # CLIのゲームループと同じ進め方
+        while not simulator.game_over and simulator.turn < simulator.max_turns:
+            assert not ranks.record_simulator(simulator)
+            if simulator.next_turn()["game_over"]:
+                break
+            simulator.take_action(simulator.get_available_actions()[0]["id"])
+        assert not simulator.game_over and simulator.turn == simulator.max_turns
+        score = simulator.calculate_score()
+        assert ranks.record_simulator(simulator)
+
+        # 記録しても状態は進まない
+        assert simulator.turn == simulator.max_turns and not simulator.game_over
+        assert ranks.distribution("S014", "score") == {score: 1}
+        assert ranks.distribution("S014", "turns") == {2: 1}
+
+    def test_shared_file(self, tmp_path, ranks):
+        """同じファイルを使う別のインスタンス（別プロセス）の記録が反映されるかテスト"""
+        other = ScoreRanks(ranks.path)
+        ranks.record("S002", 100, 3)
+        other.record("S002", 300, 7)
+        assert ranks.rank("S002", "score", 300)["count"] == 2
+        other.close()
+
+    def test_merge(self, tmp_path, ranks):
+        """別ホストのファイルの取り込みと、二重に数える取り込みの拒否のテスト"""
+        ranks.record("S003", 100, 3)
+        host2 = ScoreRanks(str(tmp_path / "host2.sqlite3"))
+        host2.record("S003", 100, 3, key="b:0")
+        host2.record("S003", 400, 9)
+        host2.close()
+
+        assert ranks.merge(str(tmp_path / "host2.sqlite3"))
+        assert not ranks.merge(str(tmp_path / "host2.sqlite3"))
+        assert not ranks.merge(ranks.path)
+        assert ranks.distribution("S003", "score") == {100: 2, 400: 1}
+        assert not ranks.record("S003", 100, 3, key="b:0")
+
+        # 取り込み済みの件数を含むファイルは取り込めない
+        host3 = ScoreRanks(str(tmp_path / "host3.sqlite3"))
+        host3.merge(str(tmp_path / "host2.sqlite3"))
+        host3.close()
+        with pytest.raises(ValueError):
+            ranks.merge(str(tmp_path / "host3.sqlite3"))
+
+    def test_reports_show_rank(self, tmp_path, ranks):
+        """テキストレポートとコホートの結果一覧に順位が載るかテスト"""
+        simulator = InfraRiskSimulator(log_dir=str(tmp_path), seed=2)
+        play_episode(simulator, greedy_policy, "S014", 2)
+        simulator.close_log()
+        for score in (-1000, 5000):
+            ranks.record("S014", score, 1)
+        ranks.record_simulator(simulator)
+
+        report = ReportGenerator(simulator, ranks=ranks).generate_text_report()
+        assert "スコア: S014で上位66.7%（3件中）" in report
+        assert "生存ターン数: S014で上位" in report
+        assert "上位" not in ReportGenerator(simulator).generate_text_report()
+
+        row = render_session_report(simulator.session_id, str(tmp_path), str(tmp_path),
+                                    ranks_file=ranks.path)
+        assert row["score_top_percent"] == 66.7
+        assert (tmp_path / row["pdf"]).exists()
@@ -0,0 +1,161 @@
+import pytest
+import os
+import sys
+import time
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.session_store import MemorySessionBackend, SQLiteSessionBackend, SessionStore
+from app.simulator import InfraRiskSimulator
+
+
+class FakeClock:
+    """テスト用の時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore:
+    """SessionStoreクラスのテスト"""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def evicted(self):
+        return []
+
+    @pytest.fixture
+    def store(self, clock, evicted):
+        """削除スレッドなしのストア"""
+        return SessionStore(ttl=10, capacity=3, reap_interval=None, clock=clock,
+                            on_evict=lambda key, value: evicted.append(key))
+
+    def test_get_and_put(self, store):
+        """保存と取得のテスト"""
+        store.put("a", 1)
+        assert store.get("a") == 1
+        assert store.get("b") is None
+        assert "a" in store and "b" not in store
+        assert len(store) == 1
+
+    def test_capacity_evicts_least_recently_used(self, store, evicted):
+        """容量超過時に最も使われていないセッションを削除するかテスト"""
+        for key in ["a", "b", "c"]:
+            store.put(key, key)
+        store.get("a")
+        store.put("d", "d")
+
+        assert evicted == ["b"]
+        assert store.get("b") is None
+        assert store.get("a") == "a"
+        assert store.stats()["evicted"] == 1
+
+    def test_ttl_expiry(self, store, clock, evicted):
+        """最後のアクセスからTTL経過で期限切れになるかテスト"""
+        store.put("a", 1)
+        store.put("b", 2)
+        clock.now = 8
+        store.get("a")  # 期限を延ばす
+
+        clock.now = 12
+        assert store.reap() == 1
+        assert evicted == ["b"]
+        assert store.get("a", touch=False) == 1
+
+        clock.now = 18
+        assert store.get("a") is None
+        assert evicted == ["b", "a"]
+        assert store.stats()["expired"] == 2
+
+    def test_pop_and_replace(self, store, evicted):
+        """削除と置き換え時にon_evictが呼ばれるかテスト"""
+        store.put("a", 1)
+        store.put("a", 2)
+        assert evicted == ["a"]
+        assert store.pop("a") == 2
+        assert store.pop("a") is None
+        assert evicted == ["a", "a"]
+        assert store.stats()["removed"] == 1
+
+    def test_stats(self, store):
+        """統計のテスト"""
+        store.put("a", 1)
+        store.get("a")
+        store.get("x")
+        stats = store.stats()
+        assert stats["size"] == 1 and stats["capacity"] == 3
+        assert stats["hits"] == 1 and stats["misses"] == 1
+
+    def test_heap_does_not_grow_unbounded(self, clock):
+        """同じキーを何度保存してもヒープが肥大化しないかテスト"""
+        store = SessionStore(ttl=10, capacity=100, reap_interval=None, clock=clock)
+        for i in range(1000):
+            clock.now = i * 0.1
+            store.put("a", i)
+            store.reap()
+        assert len(store._expiry_heap) < 200
+
+    def test_background_reaper(self, evicted):
+        """バックグラウンドスレッドが期限切れを削除するかテスト"""
+        store = SessionStore(ttl=0.01, reap_interval=0.01,
+                             on_evict=lambda key, value: evicted.append(key))
+        store.put("a", 1)
+        deadline = time.monotonic() + 2
+        while not evicted and time.monotonic() < deadline:
+            time.sleep(0.01)
+        store.close()
+        assert evicted == ["a"]
+        assert len(store) == 0
+
+
+class TestSessionBackends:
+    """セッションバックエンドのテスト"""
+
+    def test_memory_backend(self):
+        """メモリバックエンドが同じオブジェクトを返すかテスト"""
+        backend = MemorySessionBackend(SessionStore(reap_interval=None))
+        simulator = InfraRiskSimulator(log_dir=None)
+        backend.save("a", simulator)
+        assert backend.load("a") is simulator
+        backend.delete("a")
+        assert backend.load("a") is None
+
+    def test_sqlite_backend_shared_between_instances(self, tmp_path):
+        """別のバックエンドインスタンス（別ワーカー相当）から続きを実行できるかテスト"""
+        path = str(tmp_path / "sessions.sqlite3")
+        first, second = SQLiteSessionBackend(path), SQLiteSessionBackend(path)
+
+        simulator = InfraRiskSimulator(log_dir=None, seed=3)
+        simulator.start_scenario("S014")
+        simulator.next_turn()
+        first.save("s", simulator)
+
+        restored = second.load("s")
+        assert restored.system_state.get_state_dict() == simulator.system_state.get_state_dict()
+        assert restored.next_turn() == simulator.next_turn()
+        assert second.stats()["size"] == 1
+
+        second.delete("s")
+        assert first.load("s") is None
+        assert first.load(None) is None
+
+    def test_sqlite_backend_ttl(self, tmp_path):
+        """期限切れのセッションを読み込まず、purgeで削除するかテスト"""
+        clock = FakeClock()
+        backend = SQLiteSessionBackend(str(tmp_path / "sessions.sqlite3"), ttl=10,
+                                       purge_interval=1000, clock=clock)
+        backend.save("s", InfraRiskSimulator(log_dir=None))
+        clock.now = 11
+        assert backend.load("s") is None
+        assert backend.purge() == 1
+        assert backend.stats()["size"] == 0
+
+        backend.save("t", InfraRiskSimulator(log_dir=None))
+        backend.delete("t")
+        assert backend.stats() == {"size": 0, "bytes": 0, "expired": 1, "evicted": 0, "removed": 1}
@@ -0,0 +1,100 @@
+import pytest
+import os
+import sys
+import json
+import zlib
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.report import ReportGenerator
+from app.session_summary import SessionSummary
+from app.simulator import SNAPSHOT_HEADER, InfraRiskSimulator
+from app.tournament import greedy_policy, play_episode
+
+
+class TestSessionSummary:
+    """SessionSummaryクラスのテスト"""
+
+    def test_observe(self):
+        """アクション・イベント・状態・スコアが集計されるかテスト"""
+        summary = SessionSummary()
+        summary.observe({"type": "scenario_start"}, {"cpu": 50, "sla_risk": 10}, 500)
+        summary.observe({"type": "event", "turn": 1}, {"cpu": 90, "sla_risk": 30}, 400)
+        summary.observe({"type": "action", "turn": 1, "action_id": "A001", "action_name": "再起動",
+                         "success": True}, {"cpu": 40, "sla_risk": 20}, 450, "システム操作")
+        summary.observe({"type": "action", "turn": 2, "action_id": "A001", "action_name": "再起動",
+                         "success": False}, None, None, "システム操作")
+
+        assert (summary.action_count, summary.success_count, summary.event_count) == (2, 1, 1)
+        assert summary.success_rate == 0.5
+        assert summary.by_action == {"A001": [2, 1]}
+        assert summary.by_category == {"システム操作": [2, 1]}
+        assert summary.state_min == {"cpu": 40, "sla_risk": 10}
+        assert summary.state_max == {"cpu": 90, "sla_risk": 30}
+        assert summary.scores == [[0, 500], [1, 400], [1, 450]]
+        assert [a["turn"] for a in summary.actions_taken] == [1, 2]
+
+        restored = SessionSummary.from_dict(json.loads(json.dumps(summary.to_dict())))
+        assert restored.snapshot() == summary.snapshot()
+
+
+class TestSimulatorSummary:
+    """シミュレータの集計値のテスト"""
+
+    def played(self, compact=False, log_dir=None, seed=5):
+        simulator = InfraRiskSimulator(log_dir=log_dir, compact=compact, seed=seed)
+        play_episode(simulator, greedy_policy, "S014", seed)
+        return simulator
+
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_matches_history(self, compact):
+        """集計値が履歴を走査した結果と一致するかテスト"""
+        simulator = self.played(compact)
+        actions = [e for e in simulator.history if e["type"] == "action"]
+        summary = simulator.running_summary
+        assert summary.action_count == len(actions) > 0
+        assert summary.success_count == sum(1 for e in actions if e["success"])
+        assert summary.event_count == sum(1 for e in simulator.history if e["type"] == "event")
+        assert summary.actions_taken == [
+            {"turn": e["turn"], "action": e["action_name"], "success": e["success"]} for e in actions]
+        assert sum(counts[0] for counts in summary.by_category.values()) == len(actions)
+        assert len(summary.scores) == len(simulator.history)
+        for e in actions:
+            for field, value in e["state_after"].items():
+                assert summary.state_min[field] <= value <= summary.state_max[field]
+
+        simulator.start_scenario("S001")
+        assert simulator.running_summary.action_count == 0
+        assert len(simulator.running_summary.scores) == 1
+
+    def test_report_summary(self):
+        """レポートのサマリーが集計値から作られるかテスト"""
+        simulator = self.played()
+        summary = ReportGenerator(simulator).generate_summary()
+        assert summary["score"] == simulator.calculate_score()
+        assert summary["action_count"] == len(summary["actions_taken"])
+        assert summary["score_history"] == simulator.running_summary.scores
+        assert summary["actions_taken"] is not simulator.running_summary.actions_taken
+
+    def test_snapshot_keeps_summary(self, tmp_path):
+        """スナップショットから復元しても集計値が残り、履歴はログを読まずに戻るかテスト"""
+        simulator = self.played(log_dir=str(tmp_path), seed=6)
+        restored = InfraRiskSimulator.from_bytes(simulator.to_bytes(), log_dir=str(tmp_path / "missing"))
+        assert restored.running_summary.snapshot() == simulator.running_summary.snapshot()
+        assert restored.history == simulator.history
+
+    def test_snapshot_without_summary(self):
+        """集計値のない古いスナップショットでは履歴から作り直すかテスト"""
+        simulator = self.played(seed=7)
+        data = simulator.to_bytes()
+        header = SNAPSHOT_HEADER.unpack_from(data)
+        payload = json.loads(zlib.decompress(data[SNAPSHOT_HEADER.size:]))
+        del payload["summary"]
+        body = zlib.compress(json.dumps(payload).encode("utf-8"))
+        data = SNAPSHOT_HEADER.pack(*header[:-1], len(body)) + body
+
+        restored = InfraRiskSimulator.from_bytes(data, log_dir=None)
+        expected = simulator.running_summary
+        assert restored.running_summary.actions_taken == expected.actions_taken
+        assert restored.running_summary.by_category == expected.by_category
+        assert restored.running_summary.scores == []
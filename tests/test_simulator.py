@@ -146,7 +146,7 @@ class TestInfraRiskSimulator:
         assert result["game_over"] == True
         assert "message" in result
 
-    def test_next_turn_game_over_by_critical_state(self, simulator):
+    def test_next_turn_game_over_by_critical_state(self, simulator, monkeypatch):
         """危機的状態でのゲーム終了テスト"""
         # 事前準備：シナリオ開始
         mock_scenario = {"id": "S001", "name": "Test", "initial_cpu": 50, "initial_memory": 50,
@@ -155,7 +155,7 @@ class TestInfraRiskSimulator:
         simulator.start_scenario("S001")
 
         # 危機的状態を設定
-        simulator.system_state.is_critical = MagicMock(return_value=True)
+        monkeypatch.setattr(SystemState, "is_critical", MagicMock(return_value=True))
 
         # イベントの設定
         mock_event = {"id": "E001", "name": "Critical Event", "description": "Critical event"}
@@ -179,7 +179,7 @@ class TestInfraRiskSimulator:
         simulator.action_manager.get_available_actions = MagicMock(return_value=mock_actions)
 
         # 成功確率計算のモック
-        simulator.probability_engine.calculate_success_rate = MagicMock(return_value=0.75)
+        simulator.probability_engine.success_rate = MagicMock(return_value=0.75)
 
         # 利用可能なアクション取得
         result = simulator.get_available_actions()
@@ -191,7 +191,7 @@ class TestInfraRiskSimulator:
         assert "calculated_success_rate" in result[0]
         assert result[0]["calculated_success_rate"] == 0.75
 
-    def test_take_action_success(self, simulator):
+    def test_take_action_success(self, simulator, monkeypatch):
         """アクション実行成功のテスト"""
         # 事前準備：シナリオ開始
         mock_scenario = {"id": "S001", "name": "Test", "initial_cpu": 50, "initial_memory": 50,
@@ -210,13 +210,13 @@ class TestInfraRiskSimulator:
         simulator.action_manager.get_action_by_id = MagicMock(return_value=mock_action)
 
         # 成功確率と判定のモック
-        simulator.probability_engine.calculate_success_rate = MagicMock(return_value=0.8)
+        simulator.probability_engine.success_rate = MagicMock(return_value=0.8)
         simulator.probability_engine.roll_success = MagicMock(return_value=True)
 
         # 状態変化のモック
         state_changes = {"cpu": -20, "memory": -10}
-        simulator.system_state.apply_action = MagicMock(return_value=state_changes)
-        simulator.system_state.is_critical = MagicMock(return_value=False)
+        monkeypatch.setattr(SystemState, "apply_action", MagicMock(return_value=state_changes))
+        monkeypatch.setattr(SystemState, "is_critical", MagicMock(return_value=False))
 
         # アクション実行
         result = simulator.take_action("A001")
@@ -228,7 +228,7 @@ class TestInfraRiskSimulator:
         assert "state" in result
         assert result["game_over"] == False
 
-    def test_take_action_failure(self, simulator):
+    def test_take_action_failure(self, simulator, monkeypatch):
         """アクション実行失敗のテスト"""
         # 事前準備：シナリオ開始
         mock_scenario = {"id": "S001", "name": "Test", "initial_cpu": 50, "initial_memory": 50,
@@ -247,13 +247,13 @@ class TestInfraRiskSimulator:
         simulator.action_manager.get_action_by_id = MagicMock(return_value=mock_action)
 
         # 成功確率と判定のモック（失敗）
-        simulator.probability_engine.calculate_success_rate = MagicMock(return_value=0.8)
+        simulator.probability_engine.success_rate = MagicMock(return_value=0.8)
         simulator.probability_engine.roll_success = MagicMock(return_value=False)
 
         # 状態変化のモック
         state_changes = {"sla_risk": 15, "alerts": 1}
-        simulator.system_state.apply_action = MagicMock(return_value=state_changes)
-        simulator.system_state.is_critical = MagicMock(return_value=False)
+        monkeypatch.setattr(SystemState, "apply_action", MagicMock(return_value=state_changes))
+        monkeypatch.setattr(SystemState, "is_critical", MagicMock(return_value=False))
 
         # アクション実行
         result = simulator.take_action("A001")
@@ -265,7 +265,7 @@ class TestInfraRiskSimulator:
         assert "state" in result
         assert result["game_over"] == False
 
-    def test_take_action_critical(self, simulator):
+    def test_take_action_critical(self, simulator, monkeypatch):
         """アクション実行後に危機的状態になるテスト"""
         # 事前準備：シナリオ開始
         mock_scenario = {"id": "S001", "name": "Test", "initial_cpu": 50, "initial_memory": 50,
@@ -278,13 +278,13 @@ class TestInfraRiskSimulator:
         simulator.action_manager.get_action_by_id = MagicMock(return_value=mock_action)
 
         # 成功確率と判定のモック
-        simulator.probability_engine.calculate_success_rate = MagicMock(return_value=0.5)
+        simulator.probability_engine.success_rate = MagicMock(return_value=0.5)
         simulator.probability_engine.roll_success = MagicMock(return_value=True)
 
         # 状態変化のモック（危機的状態に）
         state_changes = {"cpu": 50}  # CPU 100%に
-        simulator.system_state.apply_action = MagicMock(return_value=state_changes)
-        simulator.system_state.is_critical = MagicMock(return_value=True)
+        monkeypatch.setattr(SystemState, "apply_action", MagicMock(return_value=state_changes))
+        monkeypatch.setattr(SystemState, "is_critical", MagicMock(return_value=True))
 
         # アクション実行
         result = simulator.take_action("A001")
@@ -351,4 +351,152 @@ class TestInfraRiskSimulator:
         assert summary["turn_count"] == 3
         assert summary["score"] == 450
         assert summary["game_over"] == False
-        assert "final_state" in summary
\ No newline at end of file
+        assert "final_state" in summary
+
+class TestCombinedTurn:
+    """ターン進行とアクション実行をまとめたAPIのテスト"""
+
+    def test_next_turn_with_actions(self):
+        """ターン結果と成功確率付きのアクション一覧を返すかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=5)
+        reference = InfraRiskSimulator(log_dir=None, seed=5)
+        simulator.start_scenario("S014")
+        reference.start_scenario("S014")
+
+        result = simulator.next_turn_with_actions()
+        expected = reference.next_turn()
+        expected["actions"] = reference.get_available_actions()
+        assert result == expected
+        assert all("calculated_success_rate" in a for a in result["actions"])
+
+    def test_take_action_and_advance(self):
+        """アクション実行と次のターンを続けて処理するかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=5)
+        reference = InfraRiskSimulator(log_dir=None, seed=5)
+        for sim in (simulator, reference):
+            sim.start_scenario("S014")
+            sim.next_turn()
+
+        action_id = simulator.get_available_actions()[0]["id"]
+        assert reference.get_available_actions()[0]["id"] == action_id
+        result = simulator.take_action_and_advance(action_id)
+        assert result["action_result"] == reference.take_action(action_id)
+        if not reference.game_over:
+            assert result["next_turn"] == reference.next_turn_with_actions()
+
+    def test_take_action_and_advance_unknown_action(self):
+        """存在しないアクションではターンを進めないかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=5)
+        simulator.start_scenario("S014")
+        simulator.next_turn()
+        result = simulator.take_action_and_advance("UNKNOWN")
+        assert result["action_result"]["success"] is False
+        assert "next_turn" not in result
+        assert simulator.turn == 1
+
+
+class TestSimulatorSnapshot:
+    """シミュレータのスナップショット（to_bytes / from_bytes）のテスト"""
+
+    def play(self, simulator, turns):
+        """ターンを進めてアクションを実行"""
+        results = []
+        for _ in range(turns):
+            turn_result = simulator.next_turn()
+            if turn_result["game_over"]:
+                break
+            actions = simulator.get_available_actions()
+            results.append((turn_result["state"], [a["id"] for a in actions]))
+            results.append(simulator.take_action(actions[0]["id"])["state"])
+        return results
+
+    def test_restored_simulator_continues_identically(self):
+        """復元したシミュレータが元と同じ乱数列で進むかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=7)
+        simulator.start_scenario("S014")
+        self.play(simulator, 2)
+
+        blob = simulator.to_bytes()
+        restored = InfraRiskSimulator.from_bytes(blob, log_dir=None)
+        assert restored.session_id == simulator.session_id
+        assert restored.turn == simulator.turn
+        assert restored.current_event is simulator.current_event or \
+            restored.current_event == simulator.current_event
+        assert restored.action_manager.cooldowns == simulator.action_manager.cooldowns
+        assert restored.history == simulator.history
+
+        assert self.play(restored, 5) == self.play(simulator, 5)
+        assert restored.calculate_score() == simulator.calculate_score()
+
+    def test_history_in_snapshot(self, tmp_path):
+        """現在のシナリオの履歴がスナップショットに含まれ、ログを読まずに復元されるかテスト"""
+        simulator = InfraRiskSimulator(log_dir=str(tmp_path), seed=1)
+        simulator.start_scenario("S007")
+        self.play(simulator, 1)
+        simulator.start_scenario("S014")  # 2回目のシナリオの履歴のみ復元される
+        self.play(simulator, 2)
+        blob = simulator.to_bytes()
+        assert len(blob) < 2048
+
+        restored = InfraRiskSimulator.from_bytes(blob, log_dir=str(tmp_path / "missing"))
+        assert restored.history == simulator.history
+        assert restored.history[0]["scenario_id"] == "S014"
+
+    def test_snapshot_does_not_wait_for_log(self, tmp_path, monkeypatch):
+        """保存・復元のどちらでもログの書き込み完了を待たないかテスト"""
+        simulator = InfraRiskSimulator(log_dir=str(tmp_path), seed=1)
+        simulator.start_scenario("S014")
+        self.play(simulator, 2)
+        sink = simulator.log_sink
+        waits = []
+        flush = sink.flush
+        monkeypatch.setattr(sink, "flush", lambda session_id=None, wait=True:
+                            waits.append(wait) or flush(session_id, wait=wait))
+
+        blob = simulator.to_bytes()
+        restored = InfraRiskSimulator.from_bytes(blob, log_sink=sink)
+        assert restored.history == simulator.history
+        assert waits == [False]
+
+    def test_invalid_blob(self):
+        """スナップショットでないバイト列のエラーテスト"""
+        with pytest.raises(ValueError):
+            InfraRiskSimulator.from_bytes(b"XXX" + bytes(64), log_dir=None)
+
+
+class TestCompactSimulator:
+    """コンパクトモードのシミュレータのテスト"""
+
+    def play(self, simulator):
+        simulator.start_scenario("S014")
+        results = []
+        while True:
+            turn_result = simulator.next_turn()
+            if turn_result["game_over"]:
+                break
+            actions = simulator.get_available_actions()
+            results.append((turn_result["event"], [a["id"] for a in actions]))
+            result = simulator.take_action(actions[-1]["id"])
+            results.append((result["success"], result["state"]))
+            if result["game_over"]:
+                break
+        return results
+
+    def test_same_results_as_normal_mode(self):
+        """通常モードと同じ乱数列・履歴になるかテスト"""
+        compact = InfraRiskSimulator(log_dir=None, seed=5, compact=True)
+        normal = InfraRiskSimulator(log_dir=None, seed=5)
+        assert self.play(compact) == self.play(normal)
+        without_time = lambda history: [{k: v for k, v in e.items() if k != "timestamp"} for e in history]
+        assert without_time(compact.history) == without_time(normal.history)
+        assert compact.calculate_score() == normal.calculate_score()
+        assert len(compact.rng._block) == 0
+
+    def test_snapshot_restore(self):
+        """コンパクトモードで復元して続きを同じようにプレイできるかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None, seed=3, compact=True)
+        simulator.start_scenario("S007")
+        simulator.next_turn()
+        restored = InfraRiskSimulator.from_bytes(simulator.to_bytes(), log_dir=None, compact=True)
+        assert restored.history == simulator.history
+        assert restored.next_turn() == simulator.next_turn()
@@ -0,0 +1,122 @@
+import pytest
+import os
+import sys
+from types import SimpleNamespace
+import numpy as np
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.solver import PolicySolver, OptimalPolicy, REGION_STARTS, offer_weights, _round_value
+from app.probability import ProbabilityEngine
+from app.state import SystemState
+
+class TestPolicySolver:
+    """PolicySolverクラスのテスト"""
+
+    @pytest.fixture
+    def solver(self):
+        """短いホライズンの厳密ソルバ"""
+        return PolicySolver(resolution=1, max_turns=3)
+
+    @pytest.fixture
+    def policy(self, solver):
+        return solver.solve("S014")
+
+    def test_offer_weights(self):
+        """提示アクションの最良順位の分布テスト"""
+        weights = offer_weights(4, 2)
+        assert weights[0].sum() == 0
+        for k in range(1, 5):
+            assert weights[k].sum() == pytest.approx(1.0)
+        # 1件以下しかなければ必ず最良が提示される
+        assert weights[1, 0] == 1.0
+        # 4件から2件: 最良が含まれる確率は 1 - C(3,2)/C(4,2)
+        assert weights[4, 0] == pytest.approx(0.5)
+        assert weights[4, 3] == 0
+
+    def test_rounding_keeps_thresholds(self):
+        """近似の丸めが成功率・危機判定の閾値をまたがないかテスト"""
+        cpu = np.arange(0, 101)
+        rounded = _round_value(cpu, 10, REGION_STARTS[0])
+        for start in REGION_STARTS[0]:
+            assert ((cpu >= start) == (rounded >= start)).all()
+        assert list(_round_value(np.array([84, 94, 96, 33]), 10, REGION_STARTS[0])) == [81, 90, 100, 30]
+        assert _round_value(84, 1, REGION_STARTS[0]) == 84
+
+    def test_state_key_holds_large_values(self, policy):
+        """127を超える値も溢れずにキーになるかテスト"""
+        state = SystemState()
+        state.sla_risk = 200
+        _, row = policy.state_key(1, state, {})
+        assert np.frombuffer(row, dtype=np.int16)[5] == 200
+
+    def test_immediate_critical_scenario(self, solver):
+        """初回ターンで危機的状態になるシナリオの価値テスト"""
+        policy = solver.solve("S001")
+        assert len(policy) == 0
+        # cpu 85+3+10 で危機的状態: 5*100 + (10-1)*30 - (10+5+5)*5
+        assert policy.value == 500 + 270 - 100
+
+    def test_value_beats_heuristic_policies(self, solver, policy):
+        """最適方策の期待スコアが既存ポリシーの平均以上かテスト"""
+        for name in ["random", "greedy"]:
+            result = solver.engine.run("S014", 20000, policy=name, seed=0, max_turns=3)
+            assert policy.value >= result["scores"].mean() - 5
+
+    def test_action_values_and_best_action(self, solver, policy):
+        """状態からの行動価値の参照と最善アクションの選択テスト"""
+        state = solver.engine.initial_states(
+            solver.engine.event_manager.get_scenario_by_id("S014"), 1)
+        state.natural_progression()
+        state.apply_event(solver.engine.event_effects[:1])
+        system_state = state.get_state(0)
+
+        values = policy.action_values(1, system_state, {})
+        assert values is not None
+        assert set(values) == set(solver.engine.action_ids) | {"skip"}
+
+        offered = [{"id": "A002"}, {"id": "A006"}, {"id": "A020"}]
+        simulator = SimpleNamespace(turn=1, system_state=system_state,
+                                    action_manager=SimpleNamespace(cooldowns={}),
+                                    probability_engine=ProbabilityEngine())
+        best = policy.best_action(simulator, offered)
+        best_value = values[best] if best else values["skip"]
+        assert best_value == max([values[a["id"]] for a in offered] + [values["skip"]])
+
+    def test_unknown_state_falls_back(self, policy):
+        """表にない状態ではリスク期待値が最大の候補を選ぶかテスト"""
+        assert policy.action_values(2, SystemState(), {"A019": 4}) is None
+        simulator = SimpleNamespace(turn=2, system_state=SystemState(),
+                                    action_manager=SimpleNamespace(cooldowns={"A019": 4}),
+                                    probability_engine=ProbabilityEngine())
+        actions = [
+            {"id": "A002", "service_effect": 0, "base_success_rate": 0.95},
+            {"id": "A011", "service_effect": 1, "base_success_rate": 0.9},
+        ]
+        assert policy.best_action(simulator, actions) == "A011"
+
+    def test_save_and_load(self, policy, tmp_path):
+        """方策表の保存と読み込みテスト"""
+        file_path = tmp_path / "policy.npz"
+        policy.save(file_path)
+        loaded = OptimalPolicy.load(file_path)
+
+        assert loaded.scenario_id == "S014"
+        assert loaded.action_ids == policy.action_ids
+        assert loaded.resolution == 1
+        assert loaded.value == pytest.approx(policy.value)
+        assert len(loaded) == len(policy)
+        for turn, (keys, q_values, skip_values) in policy.layers.items():
+            assert (loaded.layers[turn][0] == keys).all()
+            assert np.array_equal(loaded.layers[turn][1], q_values)
+            assert np.array_equal(loaded.layers[turn][2], skip_values)
+
+    def test_node_limit(self):
+        """ノード数の上限超過時のエラーテスト"""
+        with pytest.raises(ValueError):
+            PolicySolver(max_turns=3, max_nodes=10).solve("S014")
+
+    def test_unknown_scenario(self, solver):
+        """存在しないシナリオ指定時のエラーテスト"""
+        with pytest.raises(ValueError):
+            solver.solve("S999")
@@ -0,0 +1,95 @@
+import pytest
+import os
+import sys
+import numpy as np
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.state import SystemState, SystemStateBatch, STATE_FIELDS
+
+class TestSystemState:
+    """SystemStateクラスのテスト"""
+
+    @pytest.fixture
+    def state(self):
+        """テスト用のシステム状態"""
+        return SystemState()
+
+    def test_apply_event_clamps_and_reports_changes(self, state):
+        """イベント適用時の範囲丸めと変化量テスト"""
+        state.cpu = 95
+        state.services = 1
+        changes = state.apply_event({"cpu_effect": 10, "service_effect": -3, "sla_risk_effect": 5})
+
+        assert state.cpu == 100
+        assert state.services == 0
+        assert changes == {"cpu": 5, "services": -1, "sla_risk": 5}
+
+    def test_apply_action_failure_default(self, state):
+        """failure_effects未定義のアクション失敗時の影響テスト"""
+        state.alerts = 10
+        changes = state.apply_action({"cpu_effect": -20}, success=False)
+
+        assert changes == {"sla_risk": 15, "cpu": 10, "alerts": 0}
+
+    def test_apply_action_failure_effects(self, state):
+        """failure_effects定義済みアクション失敗時の影響テスト"""
+        action = {"cpu_effect": -20, "failure_effects": {"cpu_effect": 30, "service_effect": -1}}
+        changes = state.apply_action(action, success=False)
+
+        assert changes == {"sla_risk": 15, "cpu": 30, "services": -1}
+        assert state.alerts == 0
+
+
+class TestSystemStateBatch:
+    """SystemStateBatchクラスのテスト"""
+
+    @pytest.fixture
+    def values(self):
+        """ランダムな状態配列 (フィールド数, N)"""
+        rng = np.random.default_rng(0)
+        n = 400
+        return np.vstack([rng.integers(0, 101, n) for _ in range(4)]
+                         + [rng.integers(0, 8, n), rng.integers(0, 14, n), rng.integers(0, 101, n)])
+
+    def test_natural_progression_and_critical(self, values):
+        """自然変化と危機判定がSystemStateと一致するかテスト"""
+        batch = SystemStateBatch(values)
+        mask = np.arange(batch.values.shape[1]) % 3 != 0
+        critical = batch.is_critical()
+        batch.natural_progression(mask)
+
+        for i in range(values.shape[1]):
+            state = SystemStateBatch(values).get_state(i)
+            assert critical[i] == state.is_critical()
+            if mask[i]:
+                state.natural_progression()
+            assert batch.get_state(i).get_state_dict() == state.get_state_dict()
+
+    def test_apply_event_changes(self, values):
+        """イベント適用の変化量配列テスト"""
+        batch = SystemStateBatch(values)
+        n = len(batch)
+        event = {"cpu_effect": 15, "memory_effect": -10, "disk_effect": 0, "network_effect": 5,
+                 "service_effect": -2, "alert_effect": 1, "sla_risk_effect": 20}
+        effects = np.tile([15, -10, 0, 5, -2, 1, 20], (n, 1))
+        mask = np.arange(n) % 2 == 0
+        changes = batch.apply_event(effects, mask)
+
+        for i in range(n):
+            state = SystemStateBatch(values).get_state(i)
+            expected = state.apply_event(event) if mask[i] else {}
+            for field in STATE_FIELDS:
+                assert changes[field][i] == expected.get(field, 0)
+            assert batch.get_state(i).get_state_dict() == state.get_state_dict()
+
+    def test_from_states_roundtrip(self):
+        """SystemStateリストとの相互変換テスト"""
+        states = [SystemState(), SystemState()]
+        states[1].cpu = 90
+        states[1].alerts = 4
+        batch = SystemStateBatch.from_states(states)
+
+        assert len(batch) == 2
+        assert list(batch.cpu) == [50, 90]
+        assert batch.get_state(1).get_state_dict() == states[1].get_state_dict()
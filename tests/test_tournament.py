@@ -0,0 +1,96 @@
+import pytest
+import os
+import sys
+
+# テスト対象モジュールのインポート
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from app.simulator import InfraRiskSimulator
+from app.tournament import (TournamentRecord, greedy_policy, play_episode, resolve_policies,
+                            run_tournament, summarize_tournament)
+from cli.main import BatchScores
+
+
+def skip_policy(simulator, available_actions):
+    """常に見送るテスト用ポリシー"""
+    return None
+
+
+class TestTournament:
+    """トーナメントランナーのテスト"""
+
+    def test_resolve_policies(self):
+        """ポリシー指定の解決テスト"""
+        policies = resolve_policies(["random", "greedy", skip_policy])
+        assert list(policies) == ["random", "greedy", "skip_policy"]
+        assert policies["greedy"] is greedy_policy
+        assert resolve_policies({"noop": skip_policy}) == {"noop": skip_policy}
+
+        with pytest.raises(ValueError):
+            resolve_policies(["unknown"])
+
+    def test_play_episode_without_actions(self):
+        """アクションなしのエピソードがシナリオ通りに推移するかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None)
+        # 自然変化とデフォルトイベントのみでターン7に危機的状態になる
+        assert play_episode(simulator, skip_policy, "S005", 0) == (-10, 7, True)
+
+    def test_play_episode_reuses_simulator(self):
+        """シミュレータを再利用しても同じシードで同じ結果になるかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None)
+        first = play_episode(simulator, greedy_policy, "S014", 3)
+        play_episode(simulator, greedy_policy, "S007", 4)
+        assert play_episode(simulator, greedy_policy, "S014", 3) == first
+        assert simulator.history  # 履歴はメモリ上には残る
+
+    def test_no_log_files(self, tmp_path):
+        """log_dir=Noneのときログファイルを書き込まないかテスト"""
+        simulator = InfraRiskSimulator(log_dir=None)
+        play_episode(simulator, greedy_policy, "S014", 0)
+
+        simulator = InfraRiskSimulator(log_dir=str(tmp_path))
+        play_episode(simulator, greedy_policy, "S014", 0)
+        assert len(os.listdir(tmp_path)) == 1
+
+    def test_parallel_matches_serial(self):
+        """プロセス並列と逐次実行の結果が一致するかテスト"""
+        args = (["random", "greedy", skip_policy], ["S002", "S014"], 5)
+        serial = sorted(run_tournament(*args, workers=1))
+        parallel = sorted(run_tournament(*args, workers=2, chunk_size=2))
+
+        assert len(serial) == 3 * 2 * 5
+        assert serial == parallel
+        assert all(isinstance(record, TournamentRecord) for record in parallel)
+
+    def test_all_scenarios_by_default(self):
+        """シナリオ省略時に全シナリオを実行するかテスト"""
+        records = list(run_tournament([skip_policy], seeds=[0], workers=1))
+        scenario_ids = [s["id"] for s in InfraRiskSimulator(log_dir=None).event_manager.scenarios]
+        assert sorted(record.scenario_id for record in records) == sorted(scenario_ids)
+
+    def test_summarize_tournament(self):
+        """集計結果のテスト"""
+        records = [
+            TournamentRecord("greedy", "S001", 0, 300, 5, True),
+            TournamentRecord("greedy", "S001", 1, 500, 10, False),
+            TournamentRecord("random", "S001", 0, 100, 2, True),
+        ]
+        summary = summarize_tournament(records)
+        assert summary[("greedy", "S001")] == {
+            "episodes": 2, "mean_score": 400, "critical_rate": 0.5, "mean_turns": 7.5
+        }
+        assert summary[("random", "S001")]["critical_rate"] == 1.0
+
+    def test_batch_scores(self):
+        """度数から求めた分位点がnumpy.percentileと一致するかテスト"""
+        scores = BatchScores()
+        records = list(run_tournament(["random"], ["S002"], 40, workers=1))
+        for record in records:
+            scores.add(record)
+
+        totals = scores.policies["random"]
+        values = [record.score for record in records]
+        assert scores.episodes == 40
+        assert totals["critical"] == sum(record.critical for record in records)
+        assert BatchScores.percentiles(totals["counts"], [0, 10, 50, 90, 100]) == \
+            pytest.approx(np.percentile(values, [0, 10, 50, 90, 100]))
@@ -1,23 +1,145 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, Response, stream_with_context, g
 import sys
 import os
 import json
 import uuid
 import datetime
+import sqlite3
+import time
 
 # パスの調整（実行ディレクトリに関わらず動作するように）
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.simulator import InfraRiskSimulator
+from app.events import EventManager
+from app.actions import ActionManager
+from app.event_bus import EventBus, PublishingLogSink, cohort_topic, format_sse, session_topic
+from app.log_writer import get_log_sink
+from app.session_store import MemorySessionBackend, SQLiteSessionBackend, SessionStore
 from app.report import ReportGenerator
+from app.report_jobs import QueueFullError, ReportJobQueue
+from app.cohort_reports import record_cohort_member
+from app.score_ranks import ScoreRanks
+from app.payload_cache import PayloadCache
+from app.metrics import registry
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev_key_for_simulator')
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(hours=2)
 
-# シミュレータのインスタンスを保持する辞書
-simulators = {}
+# シミュレータのイベントをログに書き込みつつ、/api/stream の購読者に配信する
+live_events = EventBus()
+live_log_sink = PublishingLogSink(get_log_sink("data/logs"), live_events,
+                                  ttl=app.config['PERMANENT_SESSION_LIFETIME'].total_seconds())
+
+# COMPACT_SESSIONS=1 なら履歴をバイナリレコードで持つコンパクトモードのシミュレータを使う
+COMPACT_SESSIONS = os.environ.get('COMPACT_SESSIONS') == '1'
+
+def load_simulator(data):
+    """スナップショットからシミュレータを復元し、コホートへの配信を登録し直す
+
+    別のワーカーで作られたセッションでも、スナップショットのコホートに配信を続ける。
+    """
+    simulator = InfraRiskSimulator.from_bytes(data, log_sink=live_log_sink, compact=COMPACT_SESSIONS)
+    live_log_sink.set_cohort(simulator.session_id, simulator.cohort)
+    return simulator
+
+def create_session_backend():
+    """シミュレータを保持するセッションバックエンドを作成
+
+    SESSION_BACKEND=sqlite ならSESSION_DBのSQLiteファイルに保存し、複数ワーカーで共有できる。
+    既定はプロセス内のセッションストア（最後のアクセスから2時間で期限切れ、
+    MAX_SESSIONSを超えたら最も古いセッションから削除）。
+    """
+    ttl = app.config['PERMANENT_SESSION_LIFETIME'].total_seconds()
+    if os.environ.get('SESSION_BACKEND') == 'sqlite':
+        return SQLiteSessionBackend(
+            os.environ.get('SESSION_DB', 'data/sessions.sqlite3'), ttl=ttl, loads=load_simulator
+        )
+    return MemorySessionBackend(SessionStore(
+        ttl=ttl,
+        capacity=int(os.environ.get('MAX_SESSIONS', 10000)),
+        on_evict=lambda session_id, simulator: simulator.close_log()
+    ))
+
+
+simulators = create_session_backend()
+
+# PDFレポートの作成ジョブ（REPORT_WORKERS個のワーカープロセス、キャッシュはREPORT_CACHE_MB以内）
+report_jobs = ReportJobQueue(
+    max_workers=int(os.environ.get('REPORT_WORKERS', 2)),
+    max_bytes=int(os.environ.get('REPORT_CACHE_MB', 200)) * 1024 * 1024
+)
+
+# シナリオごとのスコア・生存ターン数の分布（終了したプレイを記録し、レポートに順位を載せる）
+score_ranks = ScoreRanks(os.environ.get('SCORE_RANKS_DB', 'data/reports/score_ranks.sqlite3'))
+
+def record_finished(simulator):
+    """シナリオが終了していればスコアの分布に加える（同じプレイは一度だけ）"""
+    try:
+        score_ranks.record_simulator(simulator)
+    except sqlite3.Error as e:
+        print(f"スコアの分布の記録に失敗しました: {e}")
+
+# カタログ系エンドポイントのシリアライズ済み応答（カタログが変わったときだけ作り直す）
+catalog_payloads = PayloadCache()
+CATALOG_CACHE_CONTROL = f"public, max-age={int(os.environ.get('CATALOG_MAX_AGE', 300))}"
+
+def catalog_response(key, records):
+    """シリアライズ済みのカタログを返す（ETagによる304、gzip/brの圧縮版に対応）"""
+    payload = catalog_payloads.get(key, records, lambda r: app.json.dumps(r).encode('utf-8'))
+    headers = {'Cache-Control': CATALOG_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+
+    accepted = [encoding for encoding in ('br', 'gzip') if request.accept_encodings[encoding]]
+    encoding, body, etag = payload.variant(accepted)
+    if any(request.if_none_match.contains(tag) for tag in payload.etags):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(body, mimetype='application/json', headers=headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    return response
+
+def pdf_url(report_status):
+    """完了したジョブのダウンロードURL（未完了ならNone）"""
+    if report_status and report_status.get("filename"):
+        return f"/reports/{report_status['filename']}"
+    return None
+
+# リクエストのメトリクス（ルートはURLルールのパターンで集計する）
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "ルートごとのリクエスト処理時間", ("route", "method"))
+REQUESTS = registry.counter(
+    "http_requests_total", "ルート・ステータスごとのリクエスト数", ("route", "method", "status"))
+registry.callback("sessions_active", "保持中のセッション数",
+                  lambda: simulators.stats().get("size"))
+registry.callback("sessions_removed_total", "期限切れ・容量超過で削除したセッション数",
+                  lambda: {(reason,): simulators.stats().get(reason) for reason in ("expired", "evicted")},
+                  kind="counter", labelnames=("reason",))
+registry.callback("stream_subscriptions", "イベント配信の購読数",
+                  lambda: live_events.stats()["subscriptions"])
+registry.callback("report_jobs_pending", "待機・実行中のPDFレポート作成ジョブ数",
+                  lambda: report_jobs.stats()["pending"])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method)
+        REQUESTS.inc(route, request.method, str(response.status_code))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheusのテキスト形式でメトリクスを出力"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/')
 def index():
@@ -30,10 +152,13 @@ def index():
 @app.route('/api/scenarios', methods=['GET'])
 def get_scenarios():
     """利用可能なシナリオ一覧を取得"""
-    # 一時的なシミュレータインスタンスからシナリオ一覧を取得
-    temp_simulator = InfraRiskSimulator()
-    scenarios = temp_simulator.event_manager.scenarios
-    return jsonify(scenarios)
+    # 共有カタログからシナリオ一覧を取得（シミュレータは作らない）
+    return catalog_response('scenarios', EventManager().scenarios)
+
+@app.route('/api/actions/catalog', methods=['GET'])
+def get_action_catalog():
+    """全アクションの一覧を取得"""
+    return catalog_response('actions', ActionManager().actions)
 
 @app.route('/api/start', methods=['POST'])
 def start_scenario():
@@ -45,90 +170,164 @@ def start_scenario():
     data = request.get_json()
     scenario_id = data.get('scenario_id')
 
-    # 新しいシミュレータインスタンス作成
-    simulator = InfraRiskSimulator()
+    # 新しいシミュレータインスタンス作成（コホート指定時はそのトピックにも配信）
+    simulator = InfraRiskSimulator(log_sink=live_log_sink, compact=COMPACT_SESSIONS)
+    simulator.cohort = data.get('cohort') or None
+    live_log_sink.set_cohort(simulator.session_id, simulator.cohort)
+    if data.get('cohort'):
+        # 研修後にコホート単位でレポートを作成できるよう参加者として記録する
+        try:
+            record_cohort_member(data['cohort'], simulator.session_id)
+        except (OSError, ValueError) as e:
+            print(f"コホートの記録に失敗しました: {e}")
 
     # シナリオ開始
     scenario = simulator.start_scenario(scenario_id)
 
     # シミュレータをセッションIDで保存
-    simulators[session_id] = simulator
+    simulators.save(session_id, simulator)
 
     return jsonify({
         "success": True,
         "scenario": scenario,
         "state": simulator.system_state.get_state_dict(),
-        "turn": simulator.turn
+        "turn": simulator.turn,
+        "stream_id": simulator.session_id
     })
 
 @app.route('/api/next-turn', methods=['POST'])
 def next_turn():
     """次のターンに進む"""
-    session_id = session.get('session_id')
-    if not session_id or session_id not in simulators:
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
         return jsonify({"error": "セッションが無効か期限切れです"}), 400
 
-    simulator = simulators[session_id]
     turn_result = simulator.next_turn()
+    simulators.save(session.get('session_id'), simulator)
+    record_finished(simulator)
 
     return jsonify(turn_result)
 
 @app.route('/api/actions', methods=['GET'])
 def get_actions():
     """利用可能なアクションを取得"""
-    session_id = session.get('session_id')
-    if not session_id or session_id not in simulators:
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
         return jsonify({"error": "セッションが無効か期限切れです"}), 400
 
-    simulator = simulators[session_id]
     actions = simulator.get_available_actions()
+    simulators.save(session.get('session_id'), simulator)
 
     return jsonify(actions)
 
 @app.route('/api/take-action', methods=['POST'])
 def take_action():
     """アクションを実行"""
-    session_id = session.get('session_id')
-    if not session_id or session_id not in simulators:
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
         return jsonify({"error": "セッションが無効か期限切れです"}), 400
 
     data = request.get_json()
     action_id = data.get('action_id')
 
-    simulator = simulators[session_id]
     result = simulator.take_action(action_id)
+    simulators.save(session.get('session_id'), simulator)
+    record_finished(simulator)
+
+    return jsonify(result)
+
+@app.route('/api/turn', methods=['POST'])
+def turn():
+    """次のターンに進み、イベント・状態・選択可能なアクションを1回で返す"""
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
+        return jsonify({"error": "セッションが無効か期限切れです"}), 400
+
+    turn_result = simulator.next_turn_with_actions()
+    simulators.save(session.get('session_id'), simulator)
+    record_finished(simulator)
+
+    return jsonify(turn_result)
+
+@app.route('/api/act', methods=['POST'])
+def act():
+    """アクションを実行し、次のターンまでまとめて進める"""
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
+        return jsonify({"error": "セッションが無効か期限切れです"}), 400
+
+    data = request.get_json()
+    action_id = data.get('action_id')
+
+    result = simulator.take_action_and_advance(action_id)
+    simulators.save(session.get('session_id'), simulator)
+    record_finished(simulator)
 
     return jsonify(result)
 
 @app.route('/api/report', methods=['GET'])
 def get_report():
     """結果レポートを取得"""
-    session_id = session.get('session_id')
-    if not session_id or session_id not in simulators:
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
         return jsonify({"error": "セッションが無効か期限切れです"}), 400
 
-    simulator = simulators[session_id]
-    report_generator = ReportGenerator(simulator)
+    record_finished(simulator)
+    report_generator = ReportGenerator(simulator, ranks=score_ranks)
 
     # テキストレポート生成
     text_report = report_generator.generate_text_report()
 
-    # PDFレポート生成
-    pdf_filename = f"infra_report_{simulator.session_id}"
-    pdf_path = report_generator.generate_pdf(pdf_filename)
-
-    # 相対パスに変換
-    if pdf_path:
-        pdf_url = f"/reports/{os.path.basename(pdf_path)}"
-    else:
-        pdf_url = None
+    # PDFレポートはジョブとして作成し、/api/report-status で完了を確認する
+    try:
+        report_status = report_jobs.status(report_jobs.submit(simulator, ranks=score_ranks))
+    except QueueFullError as e:
+        report_status = {"status": "failed", "error": str(e)}
 
     return jsonify({
         "text_report": text_report,
-        "pdf_url": pdf_url,
-        "score": simulator.calculate_score()
+        "report_job": report_status,
+        "pdf_url": pdf_url(report_status),
+        "score": simulator.calculate_score(),
+        "ranking": score_ranks.ranks(simulator.current_scenario["id"], simulator.calculate_score(),
+                                     min(simulator.turn, simulator.max_turns))
     })
 
+@app.route('/api/ranks/<scenario_id>', methods=['GET'])
+def get_ranks(scenario_id):
+    """シナリオの全プレイの中でのスコア・生存ターン数の順位（?score=&turns=）"""
+    try:
+        score = int(request.args['score'])
+        turns = int(request.args.get('turns', 0))
+    except (KeyError, ValueError):
+        return jsonify({"error": "score（と turns）を整数で指定してください"}), 400
+    return jsonify(score_ranks.ranks(scenario_id, score, turns))
+
+@app.route('/api/summary', methods=['GET'])
+def get_summary():
+    """現在のシナリオの集計値（アクション数・成功率・状態の最小/最大・スコアの推移）を取得
+
+    シミュレータがイベントの記録ごとに更新した値を返すため、頻繁に呼んでも履歴は走査しない。
+    """
+    simulator = simulators.load(session.get('session_id'))
+    if simulator is None:
+        return jsonify({"error": "セッションが無効か期限切れです"}), 400
+
+    return jsonify(dict(
+        simulator.running_summary.snapshot(),
+        turn=simulator.turn,
+        game_over=simulator.game_over,
+        score=simulator.calculate_score()
+    ))
+
+@app.route('/api/report-status/<job_id>', methods=['GET'])
+def get_report_status(job_id):
+    """PDFレポート作成ジョブの状態を取得"""
+    report_status = report_jobs.status(job_id)
+    if report_status is None:
+        return jsonify({"error": "ジョブが見つかりません"}), 404
+    return jsonify(dict(report_status, pdf_url=pdf_url(report_status)))
+
 @app.route('/reports/<path:filename>')
 def download_report(filename):
     """レポートのダウンロード"""
@@ -139,25 +338,45 @@ def download_report(filename):
 def clean_session():
     """セッションクリーンアップ"""
     session_id = session.get('session_id')
-    if session_id and session_id in simulators:
-        del simulators[session_id]
+    if session_id:
+        simulators.delete(session_id)
     session.clear()
     return jsonify({"success": True})
 
-# 古いセッションの定期的なクリーンアップ (実際の実装ではバックグラウンドタスクが望ましい)
-@app.before_request
-def cleanup_old_sessions():
-    current_time = datetime.datetime.now()
-    sessions_to_remove = []
-
-    for sess_id, simulator in simulators.items():
-        # 2時間以上前のセッションをクリーンアップ
-        created_time = datetime.datetime.strptime(simulator.session_id, "%Y%m%d_%H%M%S")
-        if (current_time - created_time).total_seconds() > 7200:
-            sessions_to_remove.append(sess_id)
-
-    for sess_id in sessions_to_remove:
-        del simulators[sess_id]
+@app.route('/api/session-stats', methods=['GET'])
+def session_stats():
+    """セッションストアの件数・削除数の統計"""
+    return jsonify(dict(simulators.stats(), streams=live_events.stats()))
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """シミュレータのイベントをServer-Sent Eventsで配信
+
+    ?session=<stream_id> でセッション単位、?cohort=<名前> でコホート単位に購読する（複数指定可）。
+    受信が追いつかない購読者には古いイベントを捨てて type=dropped を送る。
+    """
+    topics = [session_topic(s) for s in request.args.getlist('session')]
+    topics += [cohort_topic(c) for c in request.args.getlist('cohort')]
+    if not topics:
+        return jsonify({"error": "session または cohort を指定してください"}), 400
+
+    subscription = live_events.subscribe(topics, max_queue=int(os.environ.get('STREAM_QUEUE', 256)))
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                items = subscription.get(timeout=15)
+                if not items:
+                    # 接続維持のためのコメント行
+                    yield ": keep-alive\n\n"
+                for topic, event in items:
+                    yield format_sse(topic, event)
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
     # ディレクトリ作成
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""Web APIの負荷試験
+
+K人の仮想研修者が並行してセッションを最後までプレイし（開始 → ターン進行 → アクション一覧 →
+アクション実行 → レポート）、エンドポイントごとのスループットとp50/p95/p99レイテンシ、
+セッションストアのメモリ増加を表示する。すべてローカルで完結する。
+
+    $ python web/loadtest.py --trainees 50 --sessions 3 --think-time 0.2
+    $ python web/loadtest.py --mode http --trainees 200 --output data/reports/loadtest.json
+"""
+import sys
+import os
+import argparse
+import http.cookiejar
+import importlib
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+
+# パスの調整（実行ディレクトリに関わらず動作するように）
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Web APIの負荷試験')
+    parser.add_argument('--trainees', type=int, default=20, help='同時にプレイする仮想研修者の数')
+    parser.add_argument('--sessions', type=int, default=3, help='研修者ごとにプレイするセッション数')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='リクエスト間の平均待ち時間（秒、指数分布）')
+    parser.add_argument('--scenarios', type=str, help='対象シナリオID（カンマ区切り、省略時は全件）')
+    parser.add_argument('--mode', choices=['client', 'http'], default='client',
+                        help='client: Flaskのテストクライアント / http: 127.0.0.1でサーバを起動')
+    parser.add_argument('--combined', action='store_true',
+                        help='ターン進行とアクション実行をまとめたAPI（/api/turn, /api/act）を使う')
+    parser.add_argument('--no-report', action='store_true', help='セッション終了時のレポート取得を省く')
+    parser.add_argument('--seed', type=int, default=0, help='シナリオ選択と待ち時間の乱数シード')
+    parser.add_argument('--output', type=str, help='結果のJSONの出力先')
+    return parser.parse_args(argv)
+
+
+def memory_usage():
+    """プロセスの常駐メモリ（バイト、取得できなければNone）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+
+class TestClientSession:
+    """Flaskのテストクライアントで1人分のCookieを保持してリクエストする"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpSession:
+    """ローカルのHTTPサーバに1人分のCookieを保持してリクエストする"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        try:
+            return status, json.loads(content)
+        except ValueError:
+            return status, None
+
+
+class LoadStats:
+    """エンドポイントごとのレイテンシとエラー数を集計する"""
+
+    def __init__(self):
+        self.latencies = {}  # エンドポイント: 秒のリスト
+        self.errors = {}  # エンドポイント: エラー数
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput": total / elapsed,
+            "endpoints": endpoints,
+        }
+
+
+class VirtualTrainee:
+    """1人分の研修者としてセッションをプレイする"""
+
+    def __init__(self, session, stats, scenario_ids, think_time=0.0, combined=False,
+                 report=True, seed=None):
+        self.session = session
+        self.stats = stats
+        self.scenario_ids = scenario_ids
+        self.think_time = think_time
+        self.combined = combined
+        self.report = report
+        self.rng = random.Random(seed)
+
+    def call(self, endpoint, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            status, data = self.session.request(method, path, body)
+        except Exception:
+            status, data = None, None
+        self.stats.record(endpoint, time.perf_counter() - started, status == 200)
+        return data if status == 200 else None
+
+    def think(self):
+        if self.think_time > 0:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+
+    def play(self, sessions):
+        for _ in range(sessions):
+            self.call("GET /", "GET", "/")
+            self.play_session()
+
+    def play_session(self):
+        started = self.call("POST /api/start", "POST", "/api/start",
+                            {"scenario_id": self.rng.choice(self.scenario_ids)})
+        if not started:
+            return
+        if self.combined:
+            self.play_combined()
+        else:
+            self.play_turns()
+        if self.report:
+            self.think()
+            self.call("GET /api/report", "GET", "/api/report")
+
+    def play_turns(self):
+        while True:
+            self.think()
+            turn = self.call("POST /api/next-turn", "POST", "/api/next-turn")
+            if not turn or turn.get("game_over"):
+                return
+            actions = self.call("GET /api/actions", "GET", "/api/actions")
+            if not actions:
+                return
+            self.think()
+            result = self.call("POST /api/take-action", "POST", "/api/take-action",
+                               {"action_id": self.rng.choice(actions)["id"]})
+            if not result or result.get("game_over"):
+                return
+
+    def play_combined(self):
+        self.think()
+        turn = self.call("POST /api/turn", "POST", "/api/turn")
+        while turn and not turn.get("game_over") and turn.get("actions"):
+            self.think()
+            result = self.call("POST /api/act", "POST", "/api/act",
+                               {"action_id": self.rng.choice(turn["actions"])["id"]})
+            turn = result and result.get("next_turn")
+
+
+def load_web_app():
+    """web/app.py のモジュールを読み込む"""
+    return importlib.import_module('web.app')
+
+
+def run_load_test(web_app, trainees=20, sessions=3, think_time=0.0, scenario_ids=None,
+                  mode='client', combined=False, report=True, seed=0):
+    """負荷試験を実行し、集計結果を返す"""
+    if not scenario_ids:
+        scenario_ids = [s["id"] for s in web_app.EventManager().scenarios]
+
+    server = None
+    if mode == 'http':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, web_app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        new_session = lambda: HttpSession(base_url)
+    else:
+        new_session = lambda: TestClientSession(web_app.app)
+
+    stats = LoadStats()
+    sessions_before = web_app.simulators.stats()["size"]
+    memory_before = memory_usage()
+
+    players = [
+        VirtualTrainee(new_session(), stats, scenario_ids, think_time, combined, report, seed + i)
+        for i in range(trainees)
+    ]
+    threads = [threading.Thread(target=player.play, args=(sessions,)) for player in players]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    memory_after = memory_usage()
+    sessions_after = web_app.simulators.stats()["size"]
+    if server is not None:
+        server.shutdown()
+
+    result = stats.summary(elapsed)
+    result.update({
+        "trainees": trainees,
+        "sessions_per_trainee": sessions,
+        "think_time": think_time,
+        "mode": mode,
+        "elapsed": elapsed,
+        "stored_sessions": sessions_after,
+        "stored_sessions_added": sessions_after - sessions_before,
+        "memory_growth": None if memory_before is None else memory_after - memory_before,
+    })
+    return result
+
+
+def print_load_summary(result):
+    """負荷試験の結果を表で表示"""
+    print(f"研修者 {result['trainees']}人 × {result['sessions_per_trainee']}セッション "
+          f"({result['mode']}, 待ち時間 {result['think_time']}秒): {result['elapsed']:.2f}秒")
+    print(f"{'エンドポイント':<24}{'件数':>8}{'エラー':>8}{'件/秒':>10}"
+          f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for endpoint, row in result["endpoints"].items():
+        print(f"{endpoint:<24}{row['requests']:>8}{row['errors']:>8}{row['throughput']:>10.1f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+    print(f"合計: {result['requests']}件, エラー {result['errors']}件, "
+          f"{result['throughput']:.1f}件/秒")
+
+    print(f"保持中のセッション: {result['stored_sessions']} (+{result['stored_sessions_added']})")
+    if result["memory_growth"] is not None:
+        growth = result["memory_growth"] / (1024 * 1024)
+        per_session = result["memory_growth"] / max(1, result["stored_sessions_added"]) / 1024
+        print(f"メモリ増加: {growth:.1f} MiB（セッションあたり {per_session:.1f} KiB）")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    web_app = load_web_app()
+    scenario_ids = args.scenarios.split(',') if args.scenarios else None
+
+    result = run_load_test(web_app, trainees=args.trainees, sessions=args.sessions,
+                           think_time=args.think_time, scenario_ids=scenario_ids,
+                           mode=args.mode, combined=args.combined, report=not args.no_report,
+                           seed=args.seed)
+    print_load_summary(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())